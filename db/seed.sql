@@ -74,8 +74,14 @@ create table if not exists public.sources (
     strikethroughs float8 [] not null default '{}',
     latitude float8,
     longitude float8,
+    progress float8,
     created_at timestamp with time zone not null default now()
 );
+-- Percent complete of the current status, written by the ingest pipeline
+alter table
+    public.sources
+add
+    column if not exists progress float8;
 alter table
     public.sources enable row level security;
 do
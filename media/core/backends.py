@@ -0,0 +1,449 @@
+import os
+import uuid
+import shutil
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import BinaryIO, Dict, List, Optional, Union
+from urllib.parse import quote
+
+DEFAULT_CONTENT_TYPE = "application/octet-stream"
+# Supabase and S3 both take at most 1000 keys per delete request
+DELETE_BATCH = 1000
+# Suffix of files LocalStorage is still writing; never listed
+_PARTIAL = ".partial"
+
+
+class StorageError(Exception):
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+
+class StorageBackend:
+    """
+    Object storage for artifacts, addressed by bucket and object path
+    ({profile_id}/{video_id}/...). Writes overwrite (upsert). Failures raise
+    StorageError, with an HTTP-like status where there is one, so callers
+    can tell retryable errors (5xx, 408, 429) from permanent ones.
+    """
+
+    # Origin substituted for {supabase_url} in HLS_BASE_URL_TEMPLATE
+    endpoint = ""
+
+    def put(
+        self,
+        bucket: str,
+        path: str,
+        data: Union[Path, bytes],
+        content_type: str = DEFAULT_CONTENT_TYPE,
+        cache_control: Optional[str] = None,
+    ):
+        """Store bytes, or the contents of a local file."""
+        raise NotImplementedError
+
+    def put_stream(
+        self,
+        bucket: str,
+        path: str,
+        stream: BinaryIO,
+        content_type: str = DEFAULT_CONTENT_TYPE,
+        cache_control: Optional[str] = None,
+    ):
+        """Store what a binary file object yields until EOF."""
+        raise NotImplementedError
+
+    def get(self, bucket: str, path: str) -> bytes:
+        raise NotImplementedError
+
+    def list(self, bucket: str, prefix: str = "", recursive: bool = True) -> List[str]:
+        """
+        Paths of every object under prefix, or with recursive=False the paths
+        of its direct children (objects and folders).
+        """
+        raise NotImplementedError
+
+    def delete(self, bucket: str, paths: List[str]):
+        raise NotImplementedError
+
+    def copy(self, bucket: str, src_path: str, dst_path: str):
+        """Server-side copy within a bucket."""
+        raise NotImplementedError
+
+    def public_url(self, bucket: str, path: str) -> str:
+        raise NotImplementedError
+
+
+class SupabaseStorage(StorageBackend):
+    """Supabase Storage through a (pooled) supabase client."""
+
+    def __init__(self, client):
+        self.client = client
+        self.endpoint = str(client.supabase_url).rstrip("/")
+        # One proxy per bucket, so uploads reuse its keep-alive connections
+        self._buckets: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, name: str):
+        with self._lock:
+            if name not in self._buckets:
+                self._buckets[name] = self.client.storage.from_(name)
+            return self._buckets[name]
+
+    @staticmethod
+    def _options(content_type: str, cache_control: Optional[str]) -> Dict[str, str]:
+        options = {"content-type": content_type, "upsert": "true"}
+        if cache_control is not None:
+            options["cache-control"] = cache_control
+        return options
+
+    def put(
+        self,
+        bucket,
+        path,
+        data,
+        content_type=DEFAULT_CONTENT_TYPE,
+        cache_control=None,
+    ):
+        if isinstance(data, (str, Path)):
+            with open(data, "rb") as f:
+                return self.put_stream(bucket, path, f, content_type, cache_control)
+        options = self._options(content_type, cache_control)
+        return self.bucket(bucket).upload(path, data, file_options=options)
+
+    def put_stream(
+        self,
+        bucket,
+        path,
+        stream,
+        content_type=DEFAULT_CONTENT_TYPE,
+        cache_control=None,
+    ):
+        options = self._options(content_type, cache_control)
+        return self.bucket(bucket).upload(path, stream, file_options=options)
+
+    def get(self, bucket, path):
+        return self.bucket(bucket).download(path)
+
+    def _children(self, bucket: str, prefix: str, limit: int = 1000) -> List[Dict]:
+        items, offset = [], 0
+        while True:
+            page = self.bucket(bucket).list(
+                prefix, options={"limit": limit, "offset": offset}
+            )
+            items.extend(page or [])
+            if not page or len(page) < limit:
+                return items
+            offset += limit
+
+    def list(self, bucket, prefix="", recursive=True):
+        prefix = prefix.strip("/")
+        join = (lambda name: f"{prefix}/{name}") if prefix else (lambda name: name)
+        if not recursive:
+            return [join(item["name"]) for item in self._children(bucket, prefix)]
+
+        files = []
+        folders = [prefix]
+        while folders:
+            folder = folders.pop()
+            for item in self._children(bucket, folder):
+                path = f"{folder}/{item['name']}" if folder else item["name"]
+                # Folders have no metadata; the placeholder keeping an empty
+                # folder alive is an object like any other
+                if (
+                    item.get("metadata") is None
+                    and item["name"] != ".emptyFolderPlaceholder"
+                ):
+                    folders.append(path)
+                else:
+                    files.append(path)
+        return files
+
+    def delete(self, bucket, paths):
+        paths = list(paths)
+        for i in range(0, len(paths), DELETE_BATCH):
+            self.bucket(bucket).remove(paths[i : i + DELETE_BATCH])
+
+    def copy(self, bucket, src_path, dst_path):
+        self.bucket(bucket).copy(src_path, dst_path)
+
+    def public_url(self, bucket, path):
+        return self.bucket(bucket).get_public_url(path)
+
+
+class LocalStorage(StorageBackend):
+    """
+    Buckets as directories under root ({root}/{bucket}/{path}), e.g. to keep
+    artifacts on the encode host or to test without a network. Writes go to
+    a temporary file renamed into place, so readers never see partial
+    objects. With hardlinks, storing a local file and copying an object
+    link the existing inode instead of copying bytes (falling back to a
+    copy across filesystems). public_url is {public_url}/{bucket}/{path}
+    when a base URL is set (e.g. a static file server in front of root),
+    otherwise a file:// URL.
+    """
+
+    def __init__(
+        self, root: Union[str, Path], public_url: str = "", hardlinks: bool = True
+    ):
+        self.root = Path(root).resolve()
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.hardlinks = hardlinks
+        self.endpoint = public_url.rstrip("/") if public_url else self.root.as_uri()
+
+    def _path(self, bucket: str, path: str) -> Path:
+        base = self.root / bucket
+        target = (base / path.strip("/")).resolve()
+        if target != base and base not in target.parents:
+            raise StorageError(f"Path {path!r} escapes bucket {bucket!r}", 400)
+        return target
+
+    @contextmanager
+    def _replacing(self, target: Path):
+        """Yields a temporary path that replaces target once written."""
+        target.parent.mkdir(parents=True, exist_ok=True)
+        temp = target.with_name(f".{target.name}.{uuid.uuid4().hex}{_PARTIAL}")
+        try:
+            yield temp
+            os.replace(temp, target)
+        finally:
+            if temp.exists():
+                temp.unlink()
+
+    def _link_or_copy(self, source: Path, target: Path):
+        with self._replacing(target) as temp:
+            if self.hardlinks:
+                try:
+                    os.link(source, temp)
+                    return
+                except OSError:
+                    # Other filesystem, or links not supported
+                    pass
+            shutil.copyfile(source, temp)
+
+    def put(
+        self,
+        bucket,
+        path,
+        data,
+        content_type=DEFAULT_CONTENT_TYPE,
+        cache_control=None,
+    ):
+        target = self._path(bucket, path)
+        if isinstance(data, (str, Path)):
+            self._link_or_copy(Path(data), target)
+            return
+        with self._replacing(target) as temp:
+            temp.write_bytes(data)
+
+    def put_stream(
+        self,
+        bucket,
+        path,
+        stream,
+        content_type=DEFAULT_CONTENT_TYPE,
+        cache_control=None,
+    ):
+        with self._replacing(self._path(bucket, path)) as temp:
+            with open(temp, "wb") as f:
+                shutil.copyfileobj(stream, f, 1024 * 1024)
+
+    def get(self, bucket, path):
+        try:
+            return self._path(bucket, path).read_bytes()
+        except FileNotFoundError:
+            raise StorageError(f"Object not found: {bucket}/{path}", 404)
+
+    def list(self, bucket, prefix="", recursive=True):
+        base = self.root / bucket
+        folder = self._path(bucket, prefix)
+        if not folder.is_dir():
+            return []
+        entries = folder.rglob("*") if recursive else folder.iterdir()
+        return sorted(
+            entry.relative_to(base).as_posix()
+            for entry in entries
+            if not entry.name.endswith(_PARTIAL) and (entry.is_file() or not recursive)
+        )
+
+    def delete(self, bucket, paths):
+        base = self.root / bucket
+        for path in paths:
+            target = self._path(bucket, path)
+            target.unlink(missing_ok=True)
+            # Drop folders left empty, like object stores do
+            parent = target.parent
+            while parent != base and base in parent.parents:
+                try:
+                    parent.rmdir()
+                except OSError:
+                    break
+                parent = parent.parent
+
+    def copy(self, bucket, src_path, dst_path):
+        source = self._path(bucket, src_path)
+        if not source.is_file():
+            raise StorageError(f"Object not found: {bucket}/{src_path}", 404)
+        self._link_or_copy(source, self._path(bucket, dst_path))
+
+    def public_url(self, bucket, path):
+        if self.endpoint.startswith("file:"):
+            return self._path(bucket, path).as_uri()
+        return f"{self.endpoint}/{bucket}/{quote(path)}"
+
+
+class S3Storage(StorageBackend):
+    """
+    S3 or an S3-compatible server (MinIO, R2, ...) through boto3, with
+    path-style addressing. Local files go up with boto3's managed transfer
+    (multipart, read from disk in parts). public_url is
+    {public_url}/{bucket}/{path}, defaulting to the endpoint.
+    """
+
+    def __init__(
+        self,
+        endpoint_url: str = "",
+        access_key: str = "",
+        secret_key: str = "",
+        region: str = "us-east-1",
+        public_url: str = "",
+        max_connections: int = 32,
+    ):
+        import boto3
+        from botocore.config import Config
+        from botocore.exceptions import BotoCoreError, ClientError
+
+        self._errors_caught = (BotoCoreError, ClientError)
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url or None,
+            aws_access_key_id=access_key or None,
+            aws_secret_access_key=secret_key or None,
+            region_name=region or None,
+            config=Config(
+                max_pool_connections=max_connections,
+                s3={"addressing_style": "path"},
+            ),
+        )
+        origin = endpoint_url or f"https://s3.{region}.amazonaws.com"
+        self.endpoint = (public_url or origin).rstrip("/")
+
+    @contextmanager
+    def _errors(self, what: str):
+        try:
+            yield
+        except self._errors_caught as e:
+            response = getattr(e, "response", None) or {}
+            status = response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+            raise StorageError(f"{what}: {e}", status) from e
+
+    @staticmethod
+    def _extra(content_type: str, cache_control: Optional[str]) -> Dict[str, str]:
+        extra = {"ContentType": content_type}
+        if cache_control is not None:
+            extra["CacheControl"] = cache_control
+        return extra
+
+    def put(
+        self,
+        bucket,
+        path,
+        data,
+        content_type=DEFAULT_CONTENT_TYPE,
+        cache_control=None,
+    ):
+        extra = self._extra(content_type, cache_control)
+        with self._errors(f"put {bucket}/{path}"):
+            if isinstance(data, (str, Path)):
+                self.client.upload_file(str(data), bucket, path, ExtraArgs=extra)
+            else:
+                self.client.put_object(Bucket=bucket, Key=path, Body=data, **extra)
+
+    def put_stream(
+        self,
+        bucket,
+        path,
+        stream,
+        content_type=DEFAULT_CONTENT_TYPE,
+        cache_control=None,
+    ):
+        extra = self._extra(content_type, cache_control)
+        with self._errors(f"put {bucket}/{path}"):
+            self.client.upload_fileobj(stream, bucket, path, ExtraArgs=extra)
+
+    def get(self, bucket, path):
+        with self._errors(f"get {bucket}/{path}"):
+            return self.client.get_object(Bucket=bucket, Key=path)["Body"].read()
+
+    def list(self, bucket, prefix="", recursive=True):
+        prefix = prefix.strip("/")
+        params = {"Bucket": bucket, "Prefix": f"{prefix}/" if prefix else ""}
+        if not recursive:
+            params["Delimiter"] = "/"
+        paths = []
+        with self._errors(f"list {bucket}/{prefix}"):
+            for page in self.client.get_paginator("list_objects_v2").paginate(**params):
+                for item in page.get("CommonPrefixes", []):
+                    paths.append(item["Prefix"].rstrip("/"))
+                for item in page.get("Contents", []):
+                    # Skip folder markers some tools create ("a/b/")
+                    if not item["Key"].endswith("/"):
+                        paths.append(item["Key"])
+        return sorted(paths)
+
+    def delete(self, bucket, paths):
+        paths = list(paths)
+        for i in range(0, len(paths), DELETE_BATCH):
+            batch = [{"Key": path} for path in paths[i : i + DELETE_BATCH]]
+            with self._errors(f"delete from {bucket}"):
+                response = self.client.delete_objects(
+                    Bucket=bucket, Delete={"Objects": batch, "Quiet": True}
+                )
+            if response.get("Errors"):
+                error = response["Errors"][0]
+                raise StorageError(
+                    f"delete {bucket}/{error['Key']}: {error.get('Message')}"
+                )
+
+    def copy(self, bucket, src_path, dst_path):
+        with self._errors(f"copy {bucket}/{src_path}"):
+            self.client.copy({"Bucket": bucket, "Key": src_path}, bucket, dst_path)
+
+    def public_url(self, bucket, path):
+        return f"{self.endpoint}/{bucket}/{quote(path)}"
+
+
+def get_storage_backend(config: dict = None, supabase=None) -> StorageBackend:
+    """
+    The backend STORAGE_BACKEND selects: "supabase" (default; the given or
+    the process-wide client), "local" (STORAGE_LOCAL_ROOT) or "s3"
+    (S3_ENDPOINT_URL and credentials). STORAGE_PUBLIC_URL is the base of
+    public URLs for local and S3 storage.
+    """
+    config = config or {}
+    kind = (config.get("STORAGE_BACKEND") or "supabase").lower()
+    public_url = config.get("STORAGE_PUBLIC_URL") or ""
+    if kind == "supabase":
+        if supabase is None:
+            from .db import get_supabase_client
+
+            supabase = get_supabase_client()
+        if supabase is None:
+            raise StorageError("Supabase configuration missing")
+        return SupabaseStorage(supabase)
+    if kind == "local":
+        return LocalStorage(
+            config.get("STORAGE_LOCAL_ROOT") or "storage",
+            public_url,
+            hardlinks=config.get("STORAGE_HARDLINKS", True),
+        )
+    if kind == "s3":
+        return S3Storage(
+            config.get("S3_ENDPOINT_URL") or "",
+            config.get("S3_ACCESS_KEY_ID") or "",
+            config.get("S3_SECRET_ACCESS_KEY") or "",
+            config.get("S3_REGION") or "us-east-1",
+            public_url,
+            int(config.get("UPLOAD_WORKERS") or 8) * 2,
+        )
+    raise ValueError(f"Unknown STORAGE_BACKEND {kind!r} (supabase, local or s3)")
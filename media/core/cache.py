@@ -0,0 +1,180 @@
+import time
+import json
+import hashlib
+import sqlite3
+import logging
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional, Dict, Any
+from urllib.parse import urlparse
+
+from .backends import StorageBackend
+from .storage import copy_storage_prefix
+from .youtube import extract_video_id
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS artifacts (
+    key TEXT PRIMARY KEY,
+    storage_prefix TEXT NOT NULL,
+    metadata TEXT NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS cache_stats (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+_YOUTUBE_HOSTS = {"youtube.com", "m.youtube.com", "music.youtube.com", "youtu.be"}
+
+
+def url_cache_key(url: str) -> Optional[str]:
+    """Canonical identity of a remote source, e.g. 'url:youtube:dQw4w9WgXcQ'."""
+    video_id = extract_video_id(url)
+    if not video_id:
+        return None
+    host = (urlparse(url).hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+    site = "youtube" if host in _YOUTUBE_HOSTS or not host else host
+    return f"url:{site}:{video_id}"
+
+
+def file_cache_key(sha256_hex: str) -> str:
+    """Canonical identity of an uploaded file, from its content hash."""
+    return f"sha256:{sha256_hex}"
+
+
+def sha256_file(path: Path, chunk_size: int = 1024 * 1024) -> str:
+    """Streaming SHA-256 of a local file."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ArtifactCache:
+    """
+    Index from canonical source identity to the storage prefix of a completed
+    ingest, shared across profiles. Hit/miss counters live alongside it.
+    """
+
+    def __init__(self, db_path: str = "artifacts.sqlite3"):
+        self.db_path = str(db_path)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT * FROM artifacts WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        entry = dict(row)
+        entry["metadata"] = json.loads(entry["metadata"])
+        return entry
+
+    def store(self, key: str, storage_prefix: str, metadata: Dict[str, Any] = None):
+        """Register (or replace) the artifacts of a completed ingest."""
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO artifacts (key, storage_prefix, metadata, created_at) VALUES (?, ?, ?, ?)",
+                (key, storage_prefix, json.dumps(metadata or {}), time.time()),
+            )
+
+    def evict(self, key: str):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM artifacts WHERE key = ?", (key,))
+
+    def _count(self, name: str):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO cache_stats (name, value) VALUES (?, 1) "
+                "ON CONFLICT(name) DO UPDATE SET value = value + 1",
+                (name,),
+            )
+
+    def record_hit(self, key: str):
+        self._count("hits")
+        with self._connect() as conn:
+            conn.execute("UPDATE artifacts SET hits = hits + 1 WHERE key = ?", (key,))
+
+    def record_miss(self):
+        self._count("misses")
+
+    def stats(self) -> Dict[str, int]:
+        with self._connect() as conn:
+            rows = conn.execute("SELECT name, value FROM cache_stats").fetchall()
+            entries = conn.execute("SELECT COUNT(*) FROM artifacts").fetchone()[0]
+        stats = {"hits": 0, "misses": 0}
+        stats.update({r["name"]: r["value"] for r in rows})
+        stats["entries"] = entries
+        return stats
+
+
+def restore_from_cache(
+    storage: StorageBackend,
+    cache: ArtifactCache,
+    bucket_name: str,
+    key: str,
+    storage_prefix: str,
+) -> Optional[Dict[str, Any]]:
+    """
+    Copy the cached artifacts for `key` to `storage_prefix` on the server side.
+    Returns the cached metadata on a hit, or None (and counts a miss) if there
+    is no usable entry or any artifact fails to copy; the entry is then
+    evicted and the partial copy removed, so the caller ingests in full.
+    """
+    entry = cache.lookup(key)
+    if entry and entry["storage_prefix"] != storage_prefix:
+        # The original source may have been deleted since it was cached
+        if not storage.list(bucket_name, f"{entry['storage_prefix']}/hls"):
+            logging.info(f"Cached artifacts for {key} are gone, evicting")
+            cache.evict(key)
+            entry = None
+    else:
+        entry = None
+
+    if not entry:
+        cache.record_miss()
+        return None
+
+    logging.info(
+        f"Artifact cache hit for {key}: copying from {entry['storage_prefix']}"
+    )
+    copied, failed = copy_storage_prefix(
+        storage, bucket_name, entry["storage_prefix"], storage_prefix
+    )
+    # The early thumbnail may already exist at the destination
+    failed.pop(f"{entry['storage_prefix']}/thumbnail.png", None)
+    if failed:
+        for src_path, error in failed.items():
+            logging.warning(f"Failed to copy cached {src_path}: {error}")
+        # A partial copy must not be completed, nor look uploaded to the
+        # incremental uploader of the full ingest that follows
+        copied = [p for p in copied if p != f"{storage_prefix}/thumbnail.png"]
+        try:
+            if copied:
+                storage.delete(bucket_name, copied)
+        except Exception as e:
+            logging.warning(f"Could not remove partially copied artifacts: {e}")
+        cache.evict(key)
+        cache.record_miss()
+        return None
+
+    logging.info(f"Copied {len(copied)} cached artifacts to {storage_prefix}")
+    cache.record_hit(key)
+    return entry["metadata"]
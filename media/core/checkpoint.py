@@ -0,0 +1,107 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+MANIFEST_NAME = "stages.json"
+
+
+def fingerprint(value: Any) -> Any:
+    """
+    Cheap identity for a stage input/output value.
+    Paths are identified by size and mtime (summed over files for directories)
+    rather than content, so multi-GB videos are not re-read on every retry.
+    """
+    if isinstance(value, (str, Path)) and value and os.path.exists(value):
+        path = Path(value)
+        if path.is_dir():
+            files = [p for p in path.rglob("*") if p.is_file()]
+            return {
+                "dir": str(path),
+                "files": len(files),
+                "size": sum(p.stat().st_size for p in files),
+                "mtime_ns": max((p.stat().st_mtime_ns for p in files), default=0),
+            }
+        stat = path.stat()
+        return {"file": str(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    return value
+
+
+def _hash(data: Any) -> str:
+    encoded = json.dumps(data, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+class StageManifest:
+    """
+    On-disk record of completed pipeline stages for one working directory.
+
+    Each entry stores the stage's input key, its outputs and how long it took.
+    A stage's key is derived from the keys of the stages that produced its
+    inputs (or from the fingerprint of initial inputs such as the source
+    video), so a stage stays valid even if an upstream scratch file like
+    audio.wav has to be regenerated.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        if self.path.exists():
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self.entries = json.load(f)
+            except Exception as e:
+                logging.warning(f"Ignoring unreadable stage manifest {self.path}: {e}")
+
+    def stage_key(self, name: str, inputs: Dict[str, Any], keys: Dict[str, str]) -> str:
+        """Key for running `name` on `inputs`; `keys` maps upstream artifacts to their keys."""
+        return _hash(
+            {
+                "stage": name,
+                "inputs": {
+                    k: keys[k] if k in keys else fingerprint(v)
+                    for k, v in sorted(inputs.items())
+                },
+            }
+        )
+
+    @staticmethod
+    def output_key(stage_key: str, output: str) -> str:
+        return _hash([stage_key, output])
+
+    def lookup(self, name: str, key: str) -> Optional[Dict[str, Any]]:
+        """Return the recorded outputs if the stage ran with this key and its files are intact."""
+        entry = self.entries.get(name)
+        if not entry or entry.get("key") != key:
+            return None
+        for output, recorded in entry.get("fingerprints", {}).items():
+            if fingerprint(entry["outputs"][output]) != recorded:
+                return None
+        return entry["outputs"]
+
+    def record(self, name: str, key: str, outputs: Dict[str, Any], duration: float):
+        fingerprints = {}
+        for output, value in outputs.items():
+            fp = fingerprint(value)
+            if fp is not value:
+                fingerprints[output] = fp
+        with self._lock:
+            self.entries[name] = {
+                "key": key,
+                "outputs": outputs,
+                "fingerprints": fingerprints,
+                "duration": round(duration, 3),
+                "completed_at": time.time(),
+            }
+            self._save()
+
+    def _save(self):
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, default=str)
+        os.replace(tmp, self.path)
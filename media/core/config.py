@@ -4,6 +4,14 @@ from dotenv import load_dotenv
 from pathlib import Path
 
 
+def env_flag(name: str, default: bool = False) -> bool:
+    """Read a boolean environment variable (1/true/yes)."""
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes")
+
+
 def load_config(args=None):
     """
     Load environment variables based on CLI arguments or default to .env.
@@ -35,12 +43,89 @@ def load_config(args=None):
     else:
         print(f"Warning: Configuration file {env_file} not found.")
 
-    return {
+    config = {
         "SUPABASE_URL": os.getenv("SUPABASE_URL"),
         "SUPABASE_KEY": os.getenv("SUPABASE_SERVICE_ROLE_KEY"),
         "YOUTUBE_API_KEY": os.getenv("YOUTUBE_API_KEY"),
+        # Max concurrent stages per ingest (HLS, audio, transcription, ...)
+        "PIPELINE_WORKERS": int(os.getenv("PIPELINE_WORKERS", "4")),
+        # "multipass" (separate ffmpeg runs) or "singlepass" (one decode)
+        "PROCESSING_MODE": os.getenv("PROCESSING_MODE", "multipass"),
+        # "wav" (extract audio.wav first) or "stream" (pipe PCM, no WAV on disk)
+        "AUDIO_MODE": os.getenv("AUDIO_MODE", "wav"),
+        # Durable job queue used by the API server
+        "JOB_DB_PATH": os.getenv("JOB_DB_PATH", "jobs.sqlite3"),
+        "JOB_WORKERS": int(os.getenv("JOB_WORKERS", "2")),
+        # Minimum seconds between sources row writes after a status change,
+        # and between writes that only move the progress percentage
+        "STATUS_INTERVAL": float(os.getenv("STATUS_INTERVAL", "1.0")),
+        "PROGRESS_INTERVAL": float(os.getenv("PROGRESS_INTERVAL", "5.0")),
+        # Job events for /jobs/{id}/events: kept per job (SQLite and the API's
+        # ring buffer), and minimum seconds between progress events per task
+        "EVENT_HISTORY": int(os.getenv("EVENT_HISTORY", "256")),
+        "EVENT_INTERVAL": float(os.getenv("EVENT_INTERVAL", "0.5")),
+        # Largest accepted /process/file or /process/stream upload (0: no limit)
+        "MAX_UPLOAD_BYTES": int(os.getenv("MAX_UPLOAD_BYTES", str(16 * 1024**3))),
+        # "spawn", or "fork" to share a preloaded Vosk model copy-on-write
+        "JOB_START_METHOD": os.getenv("JOB_START_METHOD", "spawn"),
+        # Keep temp_videos/{profile}/{uuid} after a failure so a retry resumes
+        "KEEP_WORK_DIR_ON_FAILURE": env_flag("KEEP_WORK_DIR_ON_FAILURE"),
+        # Vosk model, loaded once per worker process
+        "VOSK_MODEL_PATH": os.getenv("VOSK_MODEL_PATH", "model"),
+        "VOSK_PRELOAD": env_flag("VOSK_PRELOAD"),
+        "VOSK_RECOGNIZERS": int(os.getenv("VOSK_RECOGNIZERS", "2")),
+        # >1 splits long WAV transcriptions at silences across processes
+        "TRANSCRIBE_WORKERS": int(os.getenv("TRANSCRIBE_WORKERS", "1")),
+        # ABR rendition heights, e.g. "1080,720,480,360,audio" (empty: one
+        # rendition at source resolution)
+        "HLS_LADDER": os.getenv("HLS_LADDER", ""),
+        # Stream-copy H.264/AAC sources to HLS instead of re-encoding
+        "HLS_REMUX": env_flag("HLS_REMUX", True),
+        # Base URL written into playlists, e.g. "https://cdn.example.com/{prefix}/hls"
+        # ({supabase_url}, {bucket}, {prefix}, {profile_id}, {video_id}; empty:
+        # the bucket's public URL)
+        "HLS_BASE_URL_TEMPLATE": os.getenv("HLS_BASE_URL_TEMPLATE", ""),
+        # Upload segments and an EVENT playlist while the HLS encode runs
+        "HLS_PROGRESSIVE": env_flag("HLS_PROGRESSIVE"),
+        # >1 encodes long sources (single rendition, multipass) in parallel
+        # keyframe-aligned chunks
+        "HLS_CHUNK_WORKERS": int(os.getenv("HLS_CHUNK_WORKERS", "1")),
+        # Buckets in wave.json / wave_minmax.json
+        "WAVEFORM_BUCKETS": int(os.getenv("WAVEFORM_BUCKETS", "10000")),
+        # Concurrent artifact uploads and retries per file (jittered backoff)
+        "UPLOAD_WORKERS": int(os.getenv("UPLOAD_WORKERS", "8")),
+        "UPLOAD_RETRIES": int(os.getenv("UPLOAD_RETRIES", "3")),
+        # Diff against the prefix's manifest.json and send only changed files
+        "UPLOAD_INCREMENTAL": env_flag("UPLOAD_INCREMENTAL", True),
+        # Files this large (bytes) use resumable chunked uploads (0 disables);
+        # Supabase requires 6 MB chunks
+        "RESUMABLE_UPLOAD_THRESHOLD": int(
+            os.getenv("RESUMABLE_UPLOAD_THRESHOLD", str(64 * 1024 * 1024))
+        ),
+        "UPLOAD_CHUNK_SIZE": int(os.getenv("UPLOAD_CHUNK_SIZE", str(6 * 1024 * 1024))),
+        # Where artifacts are stored: "supabase" (Storage), "local" (files
+        # under STORAGE_LOCAL_ROOT) or "s3" (S3 or MinIO at S3_ENDPOINT_URL)
+        "STORAGE_BACKEND": os.getenv("STORAGE_BACKEND", "supabase"),
+        "STORAGE_LOCAL_ROOT": os.getenv("STORAGE_LOCAL_ROOT", "storage"),
+        # Hardlink local files into STORAGE_LOCAL_ROOT instead of copying them
+        "STORAGE_HARDLINKS": env_flag("STORAGE_HARDLINKS", True),
+        # Base of public URLs for local and S3 storage (CDN, static file server)
+        "STORAGE_PUBLIC_URL": os.getenv("STORAGE_PUBLIC_URL", ""),
+        "S3_ENDPOINT_URL": os.getenv("S3_ENDPOINT_URL", ""),
+        "S3_ACCESS_KEY_ID": os.getenv("S3_ACCESS_KEY_ID", ""),
+        "S3_SECRET_ACCESS_KEY": os.getenv("S3_SECRET_ACCESS_KEY", ""),
+        "S3_REGION": os.getenv("S3_REGION", "us-east-1"),
+        # Cross-profile artifact cache index (empty disables reuse)
+        "ARTIFACT_CACHE_DB_PATH": os.getenv(
+            "ARTIFACT_CACHE_DB_PATH", "artifacts.sqlite3"
+        ),
     }
 
+    if args and getattr(args, "keep_work_dir", False):
+        config["KEEP_WORK_DIR_ON_FAILURE"] = True
+
+    return config
+
 
 def add_common_args(parser):
     """Add common arguments (DEV, PROD, dry-run, GPS) to an argparse parser."""
@@ -52,3 +137,12 @@ def add_common_args(parser):
     )
     parser.add_argument("--lat", type=float, help="Latitude for the source")
     parser.add_argument("--lng", type=float, help="Longitude for the source")
+    parser.add_argument(
+        "--video-id",
+        help="Reuse an existing source id, resuming from its kept working dir",
+    )
+    parser.add_argument(
+        "--keep-work-dir",
+        action="store_true",
+        help="Keep the working dir on failure so a retry can resume",
+    )
@@ -1,14 +1,35 @@
 import os
 import logging
-from supabase import create_client, Client
-from typing import Optional, Dict, Any
+import threading
+import weakref
+import httpx
+from supabase import (
+    create_client,
+    acreate_client,
+    Client,
+    AsyncClient,
+    ClientOptions,
+    AsyncClientOptions,
+)
+from typing import Optional, Dict, Any, Tuple
 
 # Table and Bucket names
 TABLE_SOURCES = "sources"
 BUCKET_SOURCES = "sources"
 
+# Process-wide clients, one per (kind, url, key); all of a client's
+# PostgREST and Storage requests go through its one keep-alive httpx pool
+_lock = threading.Lock()
+_clients: Dict[Tuple[str, str, str], Any] = {}
+_clients_pid = os.getpid()
+_connections = {"sync": weakref.WeakSet(), "async": weakref.WeakSet()}
+_stats = {
+    kind: {"clients": 0, "requests": 0, "connections": 0, "reused": 0}
+    for kind in ("sync", "async")
+}
 
-def get_supabase_client() -> Optional[Client]:
+
+def _credentials() -> Optional[Tuple[str, str]]:
     url = os.getenv("SUPABASE_URL")
     key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
     if not url or not key:
@@ -17,8 +38,107 @@ def get_supabase_client() -> Optional[Client]:
     # Ensure URL ends with a trailing slash to avoid storage client warnings
     if not url.endswith("/"):
         url += "/"
+    return url, key
+
+
+def _pool_options() -> Dict[str, Any]:
+    """httpx pool limits and timeouts (SUPABASE_POOL_* / SUPABASE_TIMEOUT)."""
+    return {
+        "limits": httpx.Limits(
+            max_connections=int(os.getenv("SUPABASE_POOL_CONNECTIONS", "32")),
+            max_keepalive_connections=int(os.getenv("SUPABASE_POOL_KEEPALIVE", "16")),
+            keepalive_expiry=float(os.getenv("SUPABASE_POOL_KEEPALIVE_EXPIRY", "60")),
+        ),
+        "timeout": httpx.Timeout(
+            float(os.getenv("SUPABASE_TIMEOUT", "120")),
+            connect=float(os.getenv("SUPABASE_CONNECT_TIMEOUT", "10")),
+        ),
+        "follow_redirects": True,
+    }
+
+
+def _observe(kind: str, response: httpx.Response):
+    """Count a request and whether it opened a connection or reused one."""
+    stream = response.extensions.get("network_stream")
+    with _lock:
+        stats = _stats[kind]
+        stats["requests"] += 1
+        if stream is None:
+            return
+        if stream in _connections[kind]:
+            stats["reused"] += 1
+        else:
+            stats["connections"] += 1
+            _connections[kind].add(stream)
+
+
+async def _observe_async(response: httpx.Response):
+    _observe("async", response)
+
+
+def _registry() -> Dict[Tuple[str, str, str], Any]:
+    # Pooled sockets must not be shared with a forked child
+    global _clients_pid
+    if _clients_pid != os.getpid():
+        _clients.clear()
+        _clients_pid = os.getpid()
+    return _clients
+
+
+def get_supabase_client() -> Optional[Client]:
+    """
+    The process-wide Supabase client. Repeat calls return the same client,
+    so requests reuse pooled keep-alive connections instead of paying a new
+    TLS handshake each time.
+    """
+    credentials = _credentials()
+    if not credentials:
+        return None
+    url, key = credentials
+    with _lock:
+        clients = _registry()
+        client = clients.get(("sync", url, key))
+        if client is None:
+            http_client = httpx.Client(
+                event_hooks={"response": [lambda r: _observe("sync", r)]},
+                **_pool_options(),
+            )
+            client = create_client(
+                url, key, options=ClientOptions(httpx_client=http_client)
+            )
+            clients[("sync", url, key)] = client
+            _stats["sync"]["clients"] += 1
+    return client
+
+
+async def get_async_supabase_client() -> Optional[AsyncClient]:
+    """get_supabase_client for async code (FastAPI handlers)."""
+    credentials = _credentials()
+    if not credentials:
+        return None
+    url, key = credentials
+    clients = _registry()
+    client = clients.get(("async", url, key))
+    if client is None:
+        http_client = httpx.AsyncClient(
+            event_hooks={"response": [_observe_async]}, **_pool_options()
+        )
+        client = await acreate_client(
+            url, key, options=AsyncClientOptions(httpx_client=http_client)
+        )
+        # Another coroutine may have created one meanwhile
+        with _lock:
+            if ("async", url, key) not in clients:
+                clients[("async", url, key)] = client
+                _stats["async"]["clients"] += 1
+            client = clients[("async", url, key)]
+    return client
 
-    return create_client(url, key)
+
+def client_stats() -> Dict[str, Dict[str, int]]:
+    """Request and connection counters of this process's pooled clients."""
+    with _lock:
+        return {kind: dict(stats) for kind, stats in _stats.items()}
 
 
 def ensure_profile_exists(supabase: Client, profile_id: str):
@@ -31,16 +151,20 @@ def ensure_profile_exists(supabase: Client, profile_id: str):
             # In production, profiles should usually exist via Auth
             print(f"Creating placeholder profile for {profile_id}")
             supabase.table("profiles").insert(
-                {
-                    "id": profile_id,
-                    "username": f"user_{profile_id[:8]}",
-                    "full_name": "Auto Generated",
-                }
+                _placeholder_profile(profile_id)
             ).execute()
     except Exception as e:
         print(f"Warning: Could not ensure profile exists: {e}")
 
 
+def _placeholder_profile(profile_id: str) -> Dict[str, Any]:
+    return {
+        "id": profile_id,
+        "username": f"user_{profile_id[:8]}",
+        "full_name": "Auto Generated",
+    }
+
+
 def create_source_record(
     supabase: Client,
     video_id: str,
@@ -68,6 +192,56 @@ def create_source_record(
     return supabase.table(TABLE_SOURCES).insert(data).execute()
 
 
+# Async variants for the FastAPI handlers (get_async_supabase_client)
+
+
+async def async_ensure_profile_exists(supabase: AsyncClient, profile_id: str):
+    try:
+        res = (
+            await supabase.table("profiles").select("id").eq("id", profile_id).execute()
+        )
+        if not res.data:
+            print(f"Creating placeholder profile for {profile_id}")
+            await (
+                supabase.table("profiles")
+                .insert(_placeholder_profile(profile_id))
+                .execute()
+            )
+    except Exception as e:
+        print(f"Warning: Could not ensure profile exists: {e}")
+
+
+async def async_create_source_record(
+    supabase: AsyncClient,
+    video_id: str,
+    profile_id: str,
+    title: str,
+    description: str = "",
+    status: str = "pending",
+    lat: float = None,
+    lng: float = None,
+):
+    data = {
+        "id": video_id,
+        "title": title,
+        "description": description,
+        "profile_id": profile_id,
+        "status": status,
+        "latitude": lat,
+        "longitude": lng,
+    }
+    return await supabase.table(TABLE_SOURCES).insert(data).execute()
+
+
+async def async_update_source_status(supabase: AsyncClient, video_id: str, status: str):
+    return (
+        await supabase.table(TABLE_SOURCES)
+        .update({"status": status})
+        .eq("id", video_id)
+        .execute()
+    )
+
+
 def create_higherkey_for_source(
     supabase: Client,
     video_id: str,
@@ -0,0 +1,250 @@
+import json
+import time
+import asyncio
+import logging
+import sqlite3
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+# Events kept per job, in SQLite after the job ends and in each API
+# process's ring buffer
+DEFAULT_HISTORY = 256
+# Jobs whose ring buffers an API process keeps in memory
+DEFAULT_JOBS = 1000
+
+# Job state events ({"status": ...}); "queued" starts an attempt, "done"
+# and "failed" end a job's stream
+JOB_EVENT = "job"
+TERMINAL_JOB_STATES = ("done", "failed")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS job_events (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id TEXT NOT NULL,
+    type TEXT NOT NULL,
+    data TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS job_events_job_seq ON job_events (job_id, seq);
+"""
+
+
+class EventLog:
+    """
+    Job events (stage transitions, progress) in the job queue's SQLite
+    database, so worker processes can publish what the API process streams.
+    Events are numbered by a global, increasing seq. Publishing never raises:
+    events are best-effort and must not fail a job.
+    """
+
+    def __init__(self, db_path: str = "jobs.sqlite3"):
+        self.db_path = str(db_path)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        event = dict(row)
+        event["data"] = json.loads(event["data"])
+        return event
+
+    def publish(self, job_id: str, type: str, data: Dict[str, Any]):
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT INTO job_events (job_id, type, data, created_at) VALUES (?, ?, ?, ?)",
+                    (job_id, type, json.dumps(data), time.time()),
+                )
+        except Exception as e:
+            logging.warning(f"Could not publish {type} event for {job_id}: {e}")
+
+    def publisher(self, job_id: str) -> Callable[[str, Dict[str, Any]], None]:
+        """publish() bound to one job, as passed to the pipeline."""
+        return lambda type, data: self.publish(job_id, type, data)
+
+    def after(self, seq: int, limit: int = 1000) -> List[Dict[str, Any]]:
+        """Events of all jobs with a seq above `seq`, oldest first."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT * FROM job_events WHERE seq > ? ORDER BY seq LIMIT ?",
+                (seq, limit),
+            ).fetchall()
+        return [self._to_dict(r) for r in rows]
+
+    def history(
+        self, job_id: str, limit: int = DEFAULT_HISTORY
+    ) -> List[Dict[str, Any]]:
+        """The job's latest `limit` events, oldest first."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT * FROM job_events WHERE job_id = ? ORDER BY seq DESC LIMIT ?",
+                (job_id, limit),
+            ).fetchall()
+        return [self._to_dict(r) for r in reversed(rows)]
+
+    def last_seq(self) -> int:
+        with self._connect() as conn:
+            row = conn.execute("SELECT MAX(seq) AS seq FROM job_events").fetchone()
+        return row["seq"] or 0
+
+    def trim(self, job_id: str, keep: int = DEFAULT_HISTORY):
+        """Drop all but the job's latest `keep` events (called when it ends)."""
+        with self._connect() as conn:
+            conn.execute(
+                """
+                DELETE FROM job_events WHERE job_id = ? AND seq <= (
+                    SELECT seq FROM job_events WHERE job_id = ?
+                    ORDER BY seq DESC LIMIT 1 OFFSET ?
+                )
+                """,
+                (job_id, job_id, keep),
+            )
+
+
+def is_terminal(event: Dict[str, Any]) -> bool:
+    return (
+        event["type"] == JOB_EVENT
+        and event["data"].get("status") in TERMINAL_JOB_STATES
+    )
+
+
+def current_attempt(events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """The events from the job's last "queued" event on (a retry's own)."""
+    for i in range(len(events) - 1, -1, -1):
+        event = events[i]
+        if event["type"] == JOB_EVENT and event["data"].get("status") == "queued":
+            return events[i:]
+    return events
+
+
+class EventHub:
+    """
+    Fans job events out to subscribers inside one API process.
+
+    A single task tails the EventLog and appends each event to its job's
+    ring buffer (the last `history` events, for up to `max_jobs` jobs) and to
+    every subscriber's queue. A subscriber first gets the buffered events it
+    has not seen (read from SQLite if the job is not buffered, e.g. after a
+    restart), then live ones, so late subscribers catch up.
+    """
+
+    def __init__(
+        self,
+        log: EventLog,
+        history: int = DEFAULT_HISTORY,
+        max_jobs: int = DEFAULT_JOBS,
+        poll_interval: float = 0.25,
+    ):
+        self.log = log
+        self.history = history
+        self.max_jobs = max_jobs
+        self.poll_interval = poll_interval
+        self.seq = 0
+        self._rings: "OrderedDict[str, deque]" = OrderedDict()
+        self._subscribers: Dict[str, List[asyncio.Queue]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        self.seq = await asyncio.to_thread(self.log.last_seq)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def _run(self):
+        while True:
+            try:
+                events = await asyncio.to_thread(self.log.after, self.seq)
+            except Exception as e:
+                logging.warning(f"Reading job events failed: {e}")
+                events = []
+            for event in events:
+                self._dispatch(event)
+            if len(events) < 1000:
+                await asyncio.sleep(self.poll_interval)
+
+    def _ring(self, job_id: str) -> deque:
+        ring = self._rings.get(job_id)
+        if ring is None:
+            ring = self._rings[job_id] = deque(maxlen=self.history)
+            while len(self._rings) > self.max_jobs:
+                self._rings.popitem(last=False)
+        else:
+            self._rings.move_to_end(job_id)
+        return ring
+
+    def _dispatch(self, event: Dict[str, Any]):
+        self.seq = event["seq"]
+        self._ring(event["job_id"]).append(event)
+        for queue in self._subscribers.get(event["job_id"], ()):
+            queue.put_nowait(event)
+
+    async def subscribe(
+        self, job_id: str, after: int = 0, heartbeat: float = 15.0
+    ) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        """
+        Events of one job with a seq above `after`, until the job ends. Yields
+        None after `heartbeat` idle seconds, so the caller can keep the
+        connection alive and check on the job.
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        self._subscribers.setdefault(job_id, []).append(queue)
+        try:
+            # Registered before reading the backlog, so nothing falls between.
+            # A ring that doesn't start at the job's start (it was running
+            # before this process) is incomplete; SQLite has the rest.
+            ring = self._rings.get(job_id)
+            if ring and (ring[0]["type"] == JOB_EVENT or len(ring) == ring.maxlen):
+                backlog = list(ring)
+            else:
+                backlog = await asyncio.to_thread(
+                    self.log.history, job_id, self.history
+                )
+            for event in current_attempt(backlog):
+                if event["seq"] > after:
+                    after = event["seq"]
+                    yield event
+                    if is_terminal(event):
+                        return
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                if event["seq"] <= after:
+                    continue
+                after = event["seq"]
+                yield event
+                if is_terminal(event):
+                    return
+        finally:
+            self._subscribers[job_id].remove(queue)
+            if not self._subscribers[job_id]:
+                del self._subscribers[job_id]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "seq": self.seq,
+            "buffered_jobs": len(self._rings),
+            "subscribers": sum(len(q) for q in self._subscribers.values()),
+        }
+
+
+def format_sse(event: Dict[str, Any]) -> str:
+    """One server-sent event; the seq is the id clients resume from."""
+    data = {**event["data"], "at": event["created_at"]}
+    return f"id: {event['seq']}\nevent: {event['type']}\ndata: {json.dumps(data)}\n\n"
@@ -0,0 +1,239 @@
+import time
+import logging
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from .checkpoint import StageManifest
+
+
+class StageFallback(Exception):
+    """
+    Raised by a stage that fell back to a substitute result (e.g. blank
+    subtitles when Vosk fails). The result is passed downstream as usual but
+    not checkpointed, so a retry runs the stage, and those using its outputs,
+    again.
+    """
+
+    def __init__(self, result: Any, reason: str = ""):
+        super().__init__(reason)
+        self.result = result
+
+
+@dataclass
+class Stage:
+    """A unit of pipeline work with declared input and output artifacts."""
+
+    name: str
+    func: Callable[..., Any]
+    inputs: Sequence[str] = field(default_factory=tuple)
+    outputs: Sequence[str] = field(default_factory=tuple)
+
+
+class StageGraph:
+    """
+    Runs pipeline stages as a dependency graph.
+
+    Each stage is started as soon as all of its inputs are available, so
+    independent branches (e.g. HLS encoding and transcription) run concurrently.
+    Stage functions receive their inputs as keyword arguments. A stage with a
+    single output returns that value directly; a stage with several outputs
+    returns a dict keyed by output name.
+
+    With a StageManifest as checkpoint, stages whose recorded key and outputs
+    are still valid are skipped and their outputs restored from the manifest.
+    Results of stages that raise StageFallback are never recorded.
+
+    on_stage(name, state, seconds) is called as stages are "started",
+    "skipped", "finished" (with their duration) or "failed".
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 4,
+        checkpoint: Optional[StageManifest] = None,
+        on_stage: Optional[Callable[[str, str, Optional[float]], None]] = None,
+    ):
+        self.max_workers = max(1, int(max_workers))
+        self.checkpoint = checkpoint
+        self.on_stage = on_stage
+        self.stages: Dict[str, Stage] = {}
+        self.timings: Dict[str, Dict[str, float]] = {}
+        self.skipped: List[str] = []
+        self.wall_time = 0.0
+
+    def add_stage(
+        self,
+        name: str,
+        func: Callable[..., Any],
+        inputs: Sequence[str] = (),
+        outputs: Sequence[str] = (),
+    ) -> Stage:
+        if name in self.stages:
+            raise ValueError(f"Duplicate stage: {name}")
+        for output in outputs:
+            for other in self.stages.values():
+                if output in other.outputs:
+                    raise ValueError(
+                        f"Output '{output}' of stage '{name}' is already produced by '{other.name}'"
+                    )
+        stage = Stage(name, func, tuple(inputs), tuple(outputs))
+        self.stages[name] = stage
+        return stage
+
+    def _validate(self, artifacts: Dict[str, Any]):
+        produced = set(artifacts)
+        for stage in self.stages.values():
+            produced.update(stage.outputs)
+        for stage in self.stages.values():
+            missing = [i for i in stage.inputs if i not in produced]
+            if missing:
+                raise ValueError(
+                    f"Stage '{stage.name}' has unsatisfiable inputs: {missing}"
+                )
+
+    def _execute(self, stage: Stage, kwargs: Dict[str, Any]):
+        started = time.perf_counter()
+        try:
+            result = stage.func(**kwargs)
+        except StageFallback as fallback:
+            return fallback.result, started, time.perf_counter(), fallback
+        return result, started, time.perf_counter(), None
+
+    def _collect(self, stage: Stage, result: Any) -> Dict[str, Any]:
+        if not stage.outputs:
+            return {}
+        if len(stage.outputs) == 1:
+            return {stage.outputs[0]: result}
+        if not isinstance(result, dict):
+            raise TypeError(
+                f"Stage '{stage.name}' declares {len(stage.outputs)} outputs and must return a dict"
+            )
+        missing = [o for o in stage.outputs if o not in result]
+        if missing:
+            raise ValueError(f"Stage '{stage.name}' did not produce: {missing}")
+        return {o: result[o] for o in stage.outputs}
+
+    def _notify(self, name: str, state: str, seconds: Optional[float] = None):
+        if self.on_stage is None:
+            return
+        try:
+            self.on_stage(name, state, seconds)
+        except Exception as e:
+            logging.warning(f"Stage callback failed for '{name}': {e}")
+
+    def _publish(self, stage, key, outputs, artifacts, keys):
+        artifacts.update(outputs)
+        if key is not None:
+            for output in outputs:
+                keys[output] = StageManifest.output_key(key, output)
+
+    def run(self, artifacts: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Run all stages and return the artifact dict (initial + produced)."""
+        artifacts = dict(artifacts or {})
+        self._validate(artifacts)
+
+        pending = dict(self.stages)
+        running = {}
+        keys: Dict[str, str] = {}
+        error = None
+        graph_start = time.perf_counter()
+
+        with ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="stage"
+        ) as pool:
+            while pending or running:
+                if error is None:
+                    ready = [
+                        s
+                        for s in pending.values()
+                        if all(i in artifacts for i in s.inputs)
+                    ]
+                    for stage in ready:
+                        del pending[stage.name]
+                        kwargs = {i: artifacts[i] for i in stage.inputs}
+                        key = None
+                        if self.checkpoint:
+                            key = self.checkpoint.stage_key(stage.name, kwargs, keys)
+                            outputs = self.checkpoint.lookup(stage.name, key)
+                            if outputs is not None:
+                                logging.info(
+                                    f"Stage '{stage.name}' already completed, skipping"
+                                )
+                                self.skipped.append(stage.name)
+                                self._notify(stage.name, "skipped")
+                                self._publish(stage, key, outputs, artifacts, keys)
+                                continue
+                        logging.info(f"Stage '{stage.name}' started")
+                        self._notify(stage.name, "started")
+                        future = pool.submit(self._execute, stage, kwargs)
+                        running[future] = (stage, key)
+
+                    if any(
+                        all(i in artifacts for i in s.inputs) for s in pending.values()
+                    ):
+                        # Skipped stages made more stages ready
+                        continue
+
+                if not running:
+                    if pending and error is None:
+                        error = RuntimeError(
+                            f"Stage graph deadlocked, cannot start: {sorted(pending)}"
+                        )
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage, key = running.pop(future)
+                    try:
+                        result, started, finished, fallback = future.result()
+                        outputs = self._collect(stage, result)
+                        if fallback is not None:
+                            logging.warning(
+                                f"Stage '{stage.name}' fell back, not checkpointed: {fallback}"
+                            )
+                            # Downstream keys then come from the values
+                            key = None
+                        elif self.checkpoint:
+                            self.checkpoint.record(
+                                stage.name, key, outputs, finished - started
+                            )
+                        self._publish(stage, key, outputs, artifacts, keys)
+                    except Exception as e:
+                        logging.error(f"Stage '{stage.name}' failed: {e}")
+                        self._notify(stage.name, "failed")
+                        if error is None:
+                            error = e
+                        continue
+                    self.timings[stage.name] = {
+                        "start": started - graph_start,
+                        "duration": finished - started,
+                    }
+                    logging.info(
+                        f"Stage '{stage.name}' finished in {finished - started:.2f}s"
+                    )
+                    self._notify(stage.name, "finished", finished - started)
+
+        self.wall_time = time.perf_counter() - graph_start
+        if error is not None:
+            raise error
+
+        logging.info(
+            f"Stage graph finished in {self.wall_time:.2f}s "
+            f"(sum of stages {self.total_stage_time():.2f}s)"
+        )
+        return artifacts
+
+    def total_stage_time(self) -> float:
+        return sum(t["duration"] for t in self.timings.values())
+
+    def summary(self) -> Dict[str, Any]:
+        """Per-stage wall times plus overall wall time for logging/metadata."""
+        return {
+            "wall_time": round(self.wall_time, 3),
+            "stage_time_sum": round(self.total_stage_time(), 3),
+            "stages": {
+                name: {k: round(v, 3) for k, v in t.items()}
+                for name, t in self.timings.items()
+            },
+        }
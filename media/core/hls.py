@@ -0,0 +1,211 @@
+import re
+import shutil
+import posixpath
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+MASTER_PLAYLIST = "master.m3u8"
+MEDIA_PLAYLIST = "playlist.m3u8"
+HLS_TIME = 10
+AUDIO_KBPS = 128
+
+# Video bitrate cap per rendition height (kbps); CRF below the cap
+_VIDEO_KBPS = {
+    2160: 14000,
+    1440: 8000,
+    1080: 5000,
+    720: 2800,
+    480: 1400,
+    360: 800,
+    240: 400,
+}
+
+_URI_ATTR = re.compile(r'URI="([^"]+)"')
+
+
+@dataclass
+class Rendition:
+    name: str
+    height: Optional[int] = None  # None for the audio-only rendition
+    video_kbps: int = 0
+
+    @property
+    def audio_only(self) -> bool:
+        return self.height is None
+
+
+def _video_kbps(height: int) -> int:
+    if height in _VIDEO_KBPS:
+        return _VIDEO_KBPS[height]
+    # Scale the 1080p cap by pixel count for heights not in the table
+    return max(200, int(_VIDEO_KBPS[1080] * (height / 1080) ** 2))
+
+
+def parse_ladder(spec: Optional[str]) -> List[Rendition]:
+    """
+    Parse a ladder spec such as "1080,720,480,360,audio". Heights may carry a
+    bitrate cap ("720:2500"). An empty spec means the single-rendition layout.
+    """
+    ladder = []
+    for token in (spec or "").replace(" ", "").split(","):
+        if not token:
+            continue
+        if token == "audio":
+            ladder.append(Rendition("audio"))
+            continue
+        height, _, kbps = token.partition(":")
+        height = int(height.rstrip("p"))
+        ladder.append(Rendition(f"{height}p", height, int(kbps or _video_kbps(height))))
+    return ladder
+
+
+def video_rotation(video: Dict) -> int:
+    """Display rotation in degrees from ffprobe stream tags or side data."""
+    rotation = video.get("tags", {}).get("rotate")
+    for side_data in video.get("side_data_list", []):
+        rotation = side_data.get("rotation", rotation)
+    return int(float(rotation or 0))
+
+
+def _display_height(video: Dict) -> int:
+    """Height as displayed, accounting for rotated (portrait phone) sources."""
+    width, height = int(video.get("width") or 0), int(video.get("height") or 0)
+    if abs(video_rotation(video)) % 180 == 90:
+        return width
+    return height
+
+
+def select_ladder(ladder: List[Rendition], probe: Dict) -> List[Rendition]:
+    """
+    Drop renditions the source can't fill: heights above the source (keeping
+    one at source height if none fit) and the audio-only rendition when there
+    is no audio track.
+    """
+    video, audio = probe.get("video"), probe.get("audio")
+    selected = []
+    if video:
+        source_height = _display_height(video)
+        videos = [r for r in ladder if not r.audio_only]
+        fitting = [r for r in videos if not source_height or r.height <= source_height]
+        if videos and not fitting:
+            fitting = [
+                Rendition(
+                    f"{source_height}p", source_height, _video_kbps(source_height)
+                )
+            ]
+        selected.extend(fitting)
+    if audio:
+        selected.extend(r for r in ladder if r.audio_only)
+    return selected
+
+
+def ladder_ffmpeg_args(
+    ladder: List[Rendition],
+    video_label: str,
+    audio_in: Optional[str],
+    hls_dir: Path,
+) -> Tuple[List[str], List[str]]:
+    """
+    Filters and output arguments encoding every rendition from one decode:
+    the decoded video (video_label, e.g. "[0:v]") is split and scaled once per
+    rendition, and the hls muxer writes {hls_dir}/{name}/playlist.m3u8 plus
+    master.m3u8 with BANDWIDTH/RESOLUTION taken from the bitrate caps.
+    Keyframes are forced on segment boundaries so renditions switch cleanly.
+    """
+    videos = [r for r in ladder if not r.audio_only]
+    filters = []
+    if len(videos) == 1:
+        filters.append(f"{video_label}scale=-2:{videos[0].height}[v0]")
+    elif videos:
+        splits = "".join(f"[v{i}in]" for i in range(len(videos)))
+        filters.append(f"{video_label}split={len(videos)}{splits}")
+        filters.extend(
+            f"[v{i}in]scale=-2:{r.height}[v{i}]" for i, r in enumerate(videos)
+        )
+
+    args, variants = [], []
+    for i, r in enumerate(videos):
+        args += ["-map", f"[v{i}]"]
+        if audio_in:
+            args += ["-map", audio_in]
+            variants.append(f"v:{i},a:{i},name:{r.name}")
+        else:
+            variants.append(f"v:{i},name:{r.name}")
+    if audio_in:
+        for r in ladder:
+            if r.audio_only:
+                args += ["-map", audio_in]
+                variants.append(f"a:{len(variants)},name:{r.name}")
+
+    if videos:
+        args += ["-c:v", "libx264", "-preset", "fast", "-crf", "23"]
+        for i, r in enumerate(videos):
+            args += [
+                f"-maxrate:v:{i}",
+                f"{r.video_kbps}k",
+                f"-bufsize:v:{i}",
+                f"{r.video_kbps * 2}k",
+            ]
+        args += ["-force_key_frames", f"expr:gte(t,n_forced*{HLS_TIME})"]
+    if audio_in:
+        args += ["-c:a", "aac", "-b:a", f"{AUDIO_KBPS}k"]
+
+    for r in ladder:
+        (hls_dir / r.name).mkdir(parents=True, exist_ok=True)
+    args += [
+        "-f",
+        "hls",
+        "-hls_time",
+        str(HLS_TIME),
+        "-hls_list_size",
+        "0",
+        "-master_pl_name",
+        MASTER_PLAYLIST,
+        "-var_stream_map",
+        " ".join(variants),
+        "-hls_segment_filename",
+        str(hls_dir / "%v" / "segment%03d.ts"),
+        str(hls_dir / "%v" / MEDIA_PLAYLIST),
+    ]
+    return filters, args
+
+
+def finalize_ladder(hls_dir: Path):
+    """
+    Publish the master playlist as hls/playlist.m3u8 too, so players that
+    load the single-rendition path pick up the ladder unchanged.
+    """
+    shutil.copyfile(hls_dir / MASTER_PLAYLIST, hls_dir / MEDIA_PLAYLIST)
+
+
+def _hls_relative(uri: str, playlist_dir: str) -> str:
+    """Path of a playlist entry relative to the hls/ root."""
+    if "://" in uri:
+        # Absolute URL, possibly from another source's prefix (artifact cache)
+        path = uri.split("?", 1)[0]
+        return (
+            path.rsplit("/hls/", 1)[-1] if "/hls/" in path else path.rsplit("/", 1)[-1]
+        )
+    return posixpath.normpath(posixpath.join(playlist_dir, uri))
+
+
+def rebase_playlist(content: str, playlist_dir: str, hls_base_url: str) -> str:
+    """
+    Rewrite every segment and variant playlist reference in a media or master
+    playlist to an absolute URL under hls_base_url. playlist_dir is the
+    playlist's directory relative to hls/ ("" for hls/playlist.m3u8).
+    """
+    base = hls_base_url.rstrip("/")
+
+    def absolute(uri: str) -> str:
+        return f"{base}/{_hls_relative(uri, playlist_dir)}"
+
+    lines = []
+    for line in content.splitlines():
+        if line.startswith("#"):
+            line = _URI_ATTR.sub(lambda m: f'URI="{absolute(m.group(1))}"', line)
+        elif line.strip():
+            line = absolute(line.strip())
+        lines.append(line)
+    return "\n".join(lines)
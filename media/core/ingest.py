@@ -0,0 +1,141 @@
+import json
+import asyncio
+import hashlib
+import logging
+import subprocess
+from pathlib import Path
+from typing import Optional, Tuple
+
+# Bytes received before the partial file is probed
+PROBE_AFTER_BYTES = 8 * 1024 * 1024
+
+# ffprobe errors that only mean the file is not complete yet (e.g. an MP4
+# whose moov atom is written at the end), not that it is not media
+_INCOMPLETE_ERRORS = ("moov atom not found", "end of file", "partial file")
+
+
+class IngestError(Exception):
+    def __init__(self, message: str, status_code: int):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def probe_upload(path: Path, complete: bool) -> Tuple[Optional[bool], str]:
+    """
+    Probe a (possibly partial) upload. Returns (True, "") for media with an
+    audio or video stream, (False, reason) for anything else, and (None,
+    reason) when a partial file can't be judged yet.
+    """
+    cmd = [
+        "ffprobe",
+        "-v",
+        "error",
+        "-show_entries",
+        "stream=codec_type",
+        "-of",
+        "json",
+        str(path),
+    ]
+    try:
+        proc = subprocess.run(cmd, capture_output=True, timeout=60)
+    except Exception as e:
+        # Missing or hung ffprobe says nothing about the upload
+        return None, f"ffprobe failed: {e}"
+    try:
+        streams = json.loads(proc.stdout or b"{}").get("streams", [])
+    except ValueError:
+        streams = []
+    if any(s.get("codec_type") in ("video", "audio") for s in streams):
+        return True, ""
+    error = proc.stderr.decode(errors="replace").strip().splitlines()
+    reason = error[-1] if error else "no audio or video stream"
+    if not complete and any(e in reason.lower() for e in _INCOMPLETE_ERRORS):
+        return None, reason
+    return False, reason
+
+
+class UploadIngest:
+    """
+    Receives an upload chunk by chunk without blocking the event loop: the
+    file write and the sha256 update run in a worker thread, the byte count is
+    checked against max_bytes as chunks arrive, and once probe_after bytes are
+    on disk the partial file is ffprobed in the background, so an upload that
+    isn't media is rejected while it is still streaming.
+
+        ingest = UploadIngest(path, max_bytes)
+        async for chunk in stream:
+            await ingest.write(chunk)
+        await ingest.finish()
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        max_bytes: int = 0,
+        probe_after: int = PROBE_AFTER_BYTES,
+    ):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.probe_after = probe_after
+        self.bytes = 0
+        self.digest = hashlib.sha256()
+        self.valid: Optional[bool] = None
+        self._file = None
+        self._probe: Optional[asyncio.Task] = None
+
+    @property
+    def content_hash(self) -> str:
+        return self.digest.hexdigest()
+
+    def _write(self, chunk: bytes):
+        if self._file is None:
+            self._file = open(self.path, "wb")
+        self._file.write(chunk)
+        self.digest.update(chunk)
+
+    async def write(self, chunk: bytes):
+        if not chunk:
+            return
+        self.bytes += len(chunk)
+        if self.max_bytes and self.bytes > self.max_bytes:
+            raise IngestError(f"Upload exceeds {self.max_bytes} bytes", 413)
+        await asyncio.to_thread(self._write, chunk)
+
+        if self._probe is None and self.bytes >= self.probe_after:
+            await asyncio.to_thread(self._file.flush)
+            self._probe = asyncio.create_task(
+                asyncio.to_thread(probe_upload, self.path, False)
+            )
+        elif self._probe is not None and self._probe.done() and self.valid is None:
+            self._check(*self._probe.result())
+
+    def _check(self, valid: Optional[bool], reason: str):
+        self.valid = valid
+        if valid is False:
+            raise IngestError(f"Not a playable media file: {reason}", 422)
+
+    async def finish(self):
+        """Close the file and make sure it is media (probing it if needed)."""
+        await asyncio.to_thread(self.close)
+        if self._probe is not None and self.valid is None:
+            self._check(*await self._probe)
+        if self.valid is None:
+            valid, reason = await asyncio.to_thread(probe_upload, self.path, True)
+            if valid is None:
+                logging.warning(f"Could not probe {self.path}, accepting: {reason}")
+            self._check(valid, reason)
+        logging.info(
+            f"Received {self.bytes} bytes into {self.path} (sha256 {self.content_hash})"
+        )
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    async def abort(self):
+        """Close and discard the partial file (e.g. after an IngestError)."""
+        if self._probe is not None:
+            await asyncio.gather(self._probe, return_exceptions=True)
+        await asyncio.to_thread(self.close)
+        await asyncio.to_thread(self.path.unlink, missing_ok=True)
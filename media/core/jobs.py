@@ -0,0 +1,327 @@
+import os
+import time
+import json
+import sqlite3
+import logging
+import multiprocessing
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional, Dict, Any, List
+
+# Job statuses
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at);
+"""
+
+
+class JobQueue:
+    """
+    Durable local job queue backed by SQLite.
+
+    Jobs move queued -> running (claim) -> done (ack) / failed (fail). Every
+    call opens its own connection, so the queue can be shared between the API
+    process and the worker processes. With an EventLog, (re)queued jobs get
+    a "queued" job event, which starts the attempt's event stream.
+    """
+
+    def __init__(self, db_path: str = "jobs.sqlite3", events=None):
+        self.db_path = str(db_path)
+        self.events = events
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _to_dict(row: Optional[sqlite3.Row]) -> Optional[Dict[str, Any]]:
+        if row is None:
+            return None
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        return job
+
+    def enqueue(
+        self, job_id: str, kind: str, payload: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Add a job. The job id doubles as the source (video) id."""
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, payload, status, created_at) VALUES (?, ?, ?, ?, ?)",
+                (job_id, kind, json.dumps(payload), JOB_QUEUED, time.time()),
+            )
+        self._queued([job_id])
+        return self.get(job_id)
+
+    def claim(self, worker: str) -> Optional[Dict[str, Any]]:
+        """Atomically move the oldest queued job to running and return it."""
+        with self._connect() as conn:
+            row = conn.execute(
+                """
+                UPDATE jobs
+                SET status = ?, worker = ?, attempts = attempts + 1, started_at = ?
+                WHERE id = (
+                    SELECT id FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1
+                )
+                RETURNING *
+                """,
+                (JOB_RUNNING, worker, time.time(), JOB_QUEUED),
+            ).fetchone()
+        return self._to_dict(row)
+
+    def ack(self, job_id: str):
+        """Mark a running job as successfully finished."""
+        self._finish(job_id, JOB_DONE, None)
+
+    def fail(self, job_id: str, error: str):
+        """Mark a running job as failed, keeping the error message."""
+        self._finish(job_id, JOB_FAILED, error)
+
+    def _finish(self, job_id: str, status: str, error: Optional[str]):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ?",
+                (status, error, time.time(), job_id),
+            )
+
+    def retry(self, job_id: str) -> bool:
+        """Requeue a failed job; its pipeline resumes from stage checkpoints."""
+        with self._connect() as conn:
+            cur = conn.execute(
+                "UPDATE jobs SET status = ?, worker = NULL, error = NULL WHERE id = ? AND status = ?",
+                (JOB_QUEUED, job_id, JOB_FAILED),
+            )
+            retried = cur.rowcount == 1
+        if retried:
+            self._queued([job_id])
+        return retried
+
+    def recover(self) -> int:
+        """
+        Requeue jobs left running by a previous server process.
+        Only call this before any workers for this database are started.
+        """
+        with self._connect() as conn:
+            rows = conn.execute(
+                "UPDATE jobs SET status = ?, worker = NULL WHERE status = ? RETURNING id",
+                (JOB_QUEUED, JOB_RUNNING),
+            ).fetchall()
+        self._queued([r["id"] for r in rows])
+        return len(rows)
+
+    def _queued(self, job_ids: List[str]):
+        if self.events is not None:
+            for job_id in job_ids:
+                self.events.publish(job_id, "job", {"status": JOB_QUEUED})
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row)
+
+    def list(
+        self, status: Optional[str] = None, limit: int = 100
+    ) -> List[Dict[str, Any]]:
+        query = "SELECT * FROM jobs"
+        params: list = []
+        if status:
+            query += " WHERE status = ?"
+            params.append(status)
+        query += " ORDER BY created_at DESC LIMIT ?"
+        params.append(limit)
+        with self._connect() as conn:
+            rows = conn.execute(query, params).fetchall()
+        return [self._to_dict(r) for r in rows]
+
+    def counts(self) -> Dict[str, int]:
+        """Number of jobs per status (queue depth is counts()['queued'])."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT status, COUNT(*) AS n FROM jobs GROUP BY status"
+            ).fetchall()
+        counts = {s: 0 for s in (JOB_QUEUED, JOB_RUNNING, JOB_DONE, JOB_FAILED)}
+        counts.update({r["status"]: r["n"] for r in rows})
+        return counts
+
+
+# --- Job handlers ---
+
+
+def run_job(job: Dict[str, Any], config: dict = None, events=None):
+    """
+    Dispatch a claimed job to the matching pipeline function. events(type,
+    data) receives the pipeline's stage and progress events.
+    """
+    from .pipeline import process_url_logic, process_file_logic
+
+    payload = job["payload"]
+    if job["kind"] == "url":
+        process_url_logic(
+            payload["url"],
+            payload["profile_id"],
+            is_dry_run=False,
+            config=config,
+            existing_video_uuid=job["id"],
+            lat=payload.get("lat"),
+            lng=payload.get("lng"),
+            events=events,
+        )
+    elif job["kind"] == "file":
+        process_file_logic(
+            Path(payload["file_path"]),
+            payload["profile_id"],
+            is_dry_run=False,
+            config=config,
+            existing_video_uuid=job["id"],
+            lat=payload.get("lat"),
+            lng=payload.get("lng"),
+            content_hash=payload.get("content_hash"),
+            events=events,
+        )
+    else:
+        raise ValueError(f"Unknown job kind: {job['kind']}")
+
+
+def _worker_main(db_path: str, worker: str, config: dict, poll_interval: float, stop):
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+    queue = JobQueue(db_path)
+    logging.info(f"Worker {worker} started (pid {os.getpid()})")
+
+    from . import status, transcription
+    from .db import client_stats
+    from .events import EventLog, JOB_EVENT
+    from . import metrics
+
+    events = EventLog(db_path)
+    metrics_store = metrics.MetricsStore(db_path)
+    history = int(config.get("EVENT_HISTORY") or 256)
+
+    transcription.configure(
+        config.get("VOSK_MODEL_PATH"), config.get("VOSK_RECOGNIZERS")
+    )
+    if config.get("VOSK_PRELOAD"):
+        # No-op if the parent already loaded it before forking
+        transcription.preload()
+
+    while not stop.is_set():
+        job = queue.claim(worker)
+        if not job:
+            stop.wait(poll_interval)
+            continue
+
+        logging.info(f"Worker {worker} claimed {job['kind']} job {job['id']}")
+        events.publish(
+            job["id"],
+            JOB_EVENT,
+            {"status": JOB_RUNNING, "attempt": job["attempts"], "worker": worker},
+        )
+        try:
+            run_job(job, config, events.publisher(job["id"]))
+            queue.ack(job["id"])
+            events.publish(job["id"], JOB_EVENT, {"status": JOB_DONE})
+        except Exception as e:
+            logging.error(f"Job {job['id']} failed: {e}")
+            queue.fail(job["id"], str(e))
+            events.publish(
+                job["id"], JOB_EVENT, {"status": JOB_FAILED, "error": str(e)}
+            )
+        try:
+            events.trim(job["id"], history)
+        except Exception as e:
+            logging.warning(f"Could not trim events of job {job['id']}: {e}")
+        logging.info(f"Worker {worker} transcription stats: {transcription.stats()}")
+        logging.info(f"Worker {worker} Supabase client stats: {client_stats()}")
+        logging.info(f"Worker {worker} status write stats: {status.stats()}")
+        metrics.track_process_stats()
+        metrics_store.flush()
+
+
+class WorkerPool:
+    """
+    Fixed-size pool of worker processes draining a JobQueue.
+
+    Workers are spawned by default so they do not inherit the API server's
+    event loop and threads. With start_method="fork" and VOSK_PRELOAD, the
+    Vosk model is loaded in the parent first so all workers share its pages
+    copy-on-write. A worker killed mid-job leaves the job running in the
+    database; JobQueue.recover() requeues it on the next startup.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        workers: int = 2,
+        config: dict = None,
+        poll_interval: float = 1.0,
+        start_method: str = "spawn",
+    ):
+        self.db_path = str(db_path)
+        self.workers = max(1, int(workers))
+        self.config = config or {}
+        self.poll_interval = poll_interval
+        self.start_method = start_method
+        self._ctx = multiprocessing.get_context(start_method)
+        self._stop = self._ctx.Event()
+        self._processes: List[multiprocessing.Process] = []
+
+    def start(self):
+        if self.start_method == "fork" and self.config.get("VOSK_PRELOAD"):
+            from . import transcription
+
+            transcription.configure(
+                self.config.get("VOSK_MODEL_PATH"), self.config.get("VOSK_RECOGNIZERS")
+            )
+            transcription.preload()
+
+        for i in range(self.workers):
+            process = self._ctx.Process(
+                target=_worker_main,
+                args=(
+                    self.db_path,
+                    f"worker-{i}",
+                    self.config,
+                    self.poll_interval,
+                    self._stop,
+                ),
+                # Not daemonic: workers may start their own process pools
+                # (parallel transcription)
+                daemon=False,
+            )
+            process.start()
+            self._processes.append(process)
+        logging.info(f"Started {self.workers} job workers on {self.db_path}")
+
+    def stop(self, timeout: float = 5.0):
+        """Stop polling; workers still busy after the timeout are terminated."""
+        self._stop.set()
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        self._processes = []
@@ -0,0 +1,332 @@
+import os
+import math
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Tuple
+
+# Upper bounds for durations, from short API calls to multi-hour encodes
+SECONDS_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600, 7200)
+# Processing seconds per media second
+RATIO_BUCKETS = (0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1, 2, 5)
+
+# name -> (type, help, histogram buckets)
+METRICS: Dict[str, Tuple[str, str, tuple]] = {
+    "media_jobs_total": (
+        "counter",
+        "Ingest jobs finished, by source type and result.",
+        (),
+    ),
+    "media_stage_duration_seconds": (
+        "histogram",
+        "Wall time of pipeline stages, by stage and source type.",
+        SECONDS_BUCKETS,
+    ),
+    "media_stage_realtime_factor": (
+        "histogram",
+        "Stage wall time per second of media, by stage and source type.",
+        RATIO_BUCKETS,
+    ),
+    "media_stage_failures_total": (
+        "counter",
+        "Pipeline stages that raised, by stage and source type.",
+        (),
+    ),
+    "media_bottleneck_stage_total": (
+        "counter",
+        "Stage that finished last in an ingest's processing graph.",
+        (),
+    ),
+    "media_processed_media_seconds_total": (
+        "counter",
+        "Seconds of media ingested, by source type.",
+        (),
+    ),
+    "media_first_playable_seconds": (
+        "histogram",
+        "Time from ingest start to the first published HLS segment.",
+        SECONDS_BUCKETS,
+    ),
+    "media_bytes_total": (
+        "counter",
+        "Bytes moved, by direction (in/out) and what they were.",
+        (),
+    ),
+    "media_uploaded_files_total": (
+        "counter",
+        "Files written to storage, by result.",
+        (),
+    ),
+    "media_upload_retries_total": (
+        "counter",
+        "Storage upload attempts retried after a transient error.",
+        (),
+    ),
+    "media_subprocesses_total": (
+        "counter",
+        "External commands run, by command and result.",
+        (),
+    ),
+    "media_downloads_total": (
+        "counter",
+        "yt-dlp calls, by operation and result.",
+        (),
+    ),
+    "media_vosk_model_loads_total": ("counter", "Vosk model loads.", ()),
+    "media_vosk_model_load_seconds_total": (
+        "counter",
+        "Seconds spent loading Vosk models.",
+        (),
+    ),
+    "media_vosk_recognizer_acquires_total": (
+        "counter",
+        "Vosk recognizers taken from the per-process pool.",
+        (),
+    ),
+    "media_vosk_recognizer_wait_seconds_total": (
+        "counter",
+        "Seconds spent waiting for a free Vosk recognizer.",
+        (),
+    ),
+    "media_supabase_requests_total": (
+        "counter",
+        "Supabase HTTP requests, by client (sync/async).",
+        (),
+    ),
+    "media_supabase_connections_total": (
+        "counter",
+        "New Supabase HTTP connections, by client (sync/async).",
+        (),
+    ),
+    "media_status_writes_total": (
+        "counter",
+        "Source status updates requested and rows actually written.",
+        (),
+    ),
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS metrics (
+    series TEXT NOT NULL,
+    labels TEXT NOT NULL,
+    value REAL NOT NULL,
+    PRIMARY KEY (series, labels)
+);
+"""
+
+Labels = Tuple[Tuple[str, str], ...]
+
+_lock = threading.Lock()
+# (series, labels) -> value added since the last flush, in this process
+_pending: Dict[Tuple[str, Labels], float] = {}
+# Last cumulative value seen by track(), per series and labels
+_tracked: Dict[Tuple[str, Labels], float] = {}
+_pid = os.getpid()
+
+
+def _labels(labels: Dict[str, object]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+
+def _add(series: str, labels: Labels, value: float):
+    global _pid
+    with _lock:
+        if _pid != os.getpid():
+            # Forked: the parent flushes its own values
+            _pending.clear()
+            _tracked.clear()
+            _pid = os.getpid()
+        _pending[(series, labels)] = _pending.get((series, labels), 0.0) + value
+
+
+def inc(name: str, value: float = 1.0, **labels):
+    """Add to a counter."""
+    if value:
+        _add(name, _labels(labels), value)
+
+
+def observe(name: str, value: float, **labels):
+    """Record one histogram observation (buckets are cumulative)."""
+    if value is None or math.isnan(value):
+        return
+    key = _labels(labels)
+    for bound in METRICS[name][2]:
+        # Zero adds too, so every bucket is exported from the first sample
+        _add(f"{name}_bucket", key + (("le", _format(bound)),), int(value <= bound))
+    _add(f"{name}_bucket", key + (("le", "+Inf"),), 1)
+    _add(f"{name}_sum", key, value)
+    _add(f"{name}_count", key, 1)
+
+
+def track(name: str, total: float, **labels):
+    """
+    Feed a counter from a cumulative per-process total (e.g. a stats() dict):
+    only the growth since the last call is added.
+    """
+    key = (name, _labels(labels))
+    with _lock:
+        previous = _tracked.get(key, 0.0)
+        _tracked[key] = total
+    if total > previous:
+        inc(name, total - previous, **labels)
+
+
+def take() -> Dict[Tuple[str, Labels], float]:
+    """This process's values since the last take()."""
+    global _pending
+    with _lock:
+        values, _pending = _pending, {}
+    return values
+
+
+def track_process_stats():
+    """Fold the per-process stats() counters into metrics."""
+    from . import status, transcription
+    from .db import client_stats
+
+    vosk = transcription.stats()
+    track("media_vosk_model_loads_total", vosk["model_loads"])
+    track("media_vosk_model_load_seconds_total", vosk["model_load_seconds"])
+    track("media_vosk_recognizer_acquires_total", vosk["recognizer_acquires"])
+    track("media_vosk_recognizer_wait_seconds_total", vosk["recognizer_wait_seconds"])
+    for client, stats in client_stats().items():
+        track("media_supabase_requests_total", stats["requests"], client=client)
+        track("media_supabase_connections_total", stats["connections"], client=client)
+    writes = status.stats()
+    track("media_status_writes_total", writes["updates"], kind="requested")
+    track("media_status_writes_total", writes["writes"], kind="written")
+    track("media_status_writes_total", writes["failed_writes"], kind="failed")
+
+
+class MetricsStore:
+    """
+    Metric totals of all processes, in the job queue's SQLite database.
+    Workers flush() what they recorded after each job; the API process
+    flushes its own before reading everything back for /metrics.
+    """
+
+    def __init__(self, db_path: str = "jobs.sqlite3"):
+        self.db_path = str(db_path)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def flush(self):
+        """Add this process's new values to the stored totals."""
+        values = take()
+        if not values:
+            return
+        rows = [
+            (series, _encode(labels), value)
+            for (series, labels), value in values.items()
+        ]
+        try:
+            with self._connect() as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.executemany(
+                    "INSERT INTO metrics (series, labels, value) VALUES (?, ?, ?) "
+                    "ON CONFLICT(series, labels) DO UPDATE SET value = value + excluded.value",
+                    rows,
+                )
+                conn.execute("COMMIT")
+        except Exception as e:
+            # Keep them for the next flush
+            for (series, labels), value in values.items():
+                _add(series, labels, value)
+            logging.warning(f"Could not flush metrics: {e}")
+
+    def totals(self) -> Dict[Tuple[str, Labels], float]:
+        with self._connect() as conn:
+            rows = conn.execute("SELECT series, labels, value FROM metrics").fetchall()
+        return {(r["series"], _decode(r["labels"])): r["value"] for r in rows}
+
+
+def _encode(labels: Labels) -> str:
+    return "\x1f".join(f"{k}\x1e{v}" for k, v in labels)
+
+
+def _decode(text: str) -> Labels:
+    if not text:
+        return ()
+    return tuple(tuple(item.split("\x1e", 1)) for item in text.split("\x1f"))
+
+
+def _format(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value)) if abs(value) < 1e15 else repr(float(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _series_line(series: str, labels: Labels, value: float) -> str:
+    if labels:
+        body = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+        series = f"{series}{{{body}}}"
+    return f"{series} {_format(value)}"
+
+
+def _family(series: str) -> str:
+    for suffix in ("_bucket", "_sum", "_count"):
+        base = series[: -len(suffix)]
+        if series.endswith(suffix) and METRICS.get(base, ("",))[0] == "histogram":
+            return base
+    return series
+
+
+def _bucket_order(labels: Labels) -> tuple:
+    le = dict(labels).get("le")
+    rest = tuple(item for item in labels if item[0] != "le")
+    return rest, math.inf if le in (None, "+Inf") else float(le)
+
+
+def render(
+    totals: Dict[Tuple[str, Labels], float],
+    gauges: Iterable[Tuple[str, str, Dict[str, object], float]] = (),
+) -> str:
+    """
+    Prometheus text exposition (version 0.0.4) of counter/histogram totals
+    plus gauges given as (name, help, labels, value).
+    """
+    families: Dict[str, List[Tuple[str, Labels, float]]] = {}
+    for (series, labels), value in totals.items():
+        families.setdefault(_family(series), []).append((series, labels, value))
+
+    lines = []
+    for name in sorted(families):
+        kind, help, _ = METRICS.get(name, ("untyped", "", ()))
+        if help:
+            lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} {kind}")
+        samples = sorted(
+            families[name],
+            key=lambda s: (
+                s[1] if not s[0].endswith("_bucket") else _bucket_order(s[1])[0],
+                s[0],
+                _bucket_order(s[1])[1],
+            ),
+        )
+        lines.extend(_series_line(*sample) for sample in samples)
+
+    seen = set()
+    for name, help, labels, value in gauges:
+        if name not in seen:
+            seen.add(name)
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} gauge")
+        lines.append(_series_line(name, _labels(labels), value))
+    return "\n".join(lines) + "\n"
@@ -1,4 +1,5 @@
 import os
+import time
 import uuid
 import shutil
 import logging
@@ -6,13 +7,12 @@ import json
 import requests
 import subprocess
 from pathlib import Path
-from typing import Optional
+from typing import Callable, List, Optional
 
 from .db import (
     get_supabase_client,
     ensure_profile_exists,
     create_source_record,
-    update_source_status,
     create_higherkey_for_source,
     BUCKET_SOURCES,
 )
@@ -20,12 +20,37 @@ from .processing import (
     extract_audio_wav,
     generate_waveform_data,
     convert_to_hls,
+    convert_to_hls_chunked,
     generate_thumbnail,
-    get_video_duration,
+    probe_media,
+    process_single_pass,
+    analyze_audio_stream,
+    TranscriptionError,
     transcribe_vosk,
     generate_word_level_vtt,
 )
-from .storage import upload_directory_to_supabase, fix_hls_playlist_with_absolute_urls
+from .backends import StorageBackend, SupabaseStorage, get_storage_backend
+from .storage import (
+    upload_directory,
+    fix_hls_playlist_with_absolute_urls,
+    hls_base_url,
+)
+from .resumable import ResumableUploader, UPLOADS_NAME
+from .progressive import ProgressivePublisher
+from .status import StatusEmitter
+from . import metrics
+from .graph import StageFallback, StageGraph
+from .waveform import DEFAULT_BUCKETS
+from .hls import Rendition, parse_ladder
+from .transcription import configure as configure_transcription, transcribe_parallel
+from .checkpoint import StageManifest, MANIFEST_NAME
+from .cache import (
+    ArtifactCache,
+    restore_from_cache,
+    url_cache_key,
+    file_cache_key,
+    sha256_file,
+)
 from .youtube import (
     download_video,
     extract_video_id,
@@ -34,6 +59,446 @@ from .youtube import (
 )
 
 
+def build_processing_graph(
+    video_dir: Path,
+    wav_file: str,
+    subtitle_words: list = None,
+    probe_source: bool = True,
+    fallback_duration: float = 0.0,
+    include_thumbnail: bool = True,
+    single_pass: bool = False,
+    stream_audio: bool = False,
+    transcribe_workers: int = 1,
+    waveform_buckets: int = DEFAULT_BUCKETS,
+    hls_ladder: Optional[List[Rendition]] = None,
+    hls_chunk_workers: int = 1,
+    hls_remux: bool = False,
+    max_workers: int = 4,
+    checkpoint: StageManifest = None,
+    on_progress: Optional[Callable[[str, float], None]] = None,
+    on_stage: Optional[Callable[[str, str, Optional[float]], None]] = None,
+) -> StageGraph:
+    """
+    Build the post-download stage graph shared by URL and file ingests.
+
+    Expects a "video" artifact (path to video.mp4), plus "probe" and "duration"
+    artifacts when probe_source is False. Only HLS, audio extraction, the probe
+    and the thumbnail read the video; waveform and transcription hang off the
+    audio branch, so they all overlap. With single_pass, HLS, audio and the
+    thumbnail come from one ffmpeg decode instead. With stream_audio, PCM is
+    piped from ffmpeg into the waveform and Vosk together and no WAV is written.
+    The waveform stage writes wave.json (absolute peaks) and wave_minmax.json
+    with waveform_buckets buckets each, plus the wave.bin zoom pyramid.
+    With an hls_ladder, HLS is an adaptive bitrate ladder with a master playlist.
+    Otherwise, hls_remux stream-copies HLS-compatible sources, and
+    hls_chunk_workers > 1 encodes long sources in parallel chunks (multi-pass
+    only). The "hls_mode" artifact records the path taken.
+    on_progress(task, fraction) receives ffmpeg encode progress ("hls" or
+    "transcode") and transcription progress ("transcribe" or "audio_stream");
+    on_stage is passed to the StageGraph.
+    """
+    graph = StageGraph(
+        max_workers=max_workers, checkpoint=checkpoint, on_stage=on_stage
+    )
+    hls_dir = video_dir / "hls"
+    thumb_file = str(video_dir / "thumbnail.png")
+    minmax_file = str(video_dir / "wave_minmax.json")
+    pyramid_file = str(video_dir / "wave.bin")
+
+    def reporter(task: str):
+        if on_progress is None:
+            return None
+        return lambda fraction: on_progress(task, fraction)
+
+    def probe(video):
+        info = probe_media(video)
+        return {"probe": info, "duration": info["duration"] or fallback_duration}
+
+    def extract_audio(video):
+        extract_audio_wav(video, wav_file)
+        return wav_file
+
+    def waveform(audio):
+        output = str(video_dir / "wave.json")
+        generate_waveform_data(
+            audio, output, waveform_buckets, minmax_file, pyramid_file
+        )
+        return output
+
+    def thumbnail(video):
+        generate_thumbnail(video, thumb_file)
+        return thumb_file
+
+    def hls(video, probe=None):
+        if hls_chunk_workers > 1 and not hls_ladder:
+            mode = convert_to_hls_chunked(
+                video,
+                hls_dir,
+                probe,
+                hls_chunk_workers,
+                remux=hls_remux,
+                on_progress=reporter("hls"),
+            )
+        else:
+            mode = convert_to_hls(
+                video, hls_dir, hls_ladder, probe, hls_remux, reporter("hls")
+            )
+        return {"hls": str(hls_dir), "hls_mode": mode}
+
+    def transcode(video, probe):
+        audio = None if stream_audio else wav_file
+        mode = process_single_pass(
+            video,
+            hls_dir,
+            audio,
+            thumb_file,
+            probe,
+            hls_ladder,
+            hls_remux,
+            reporter("transcode"),
+        )
+        return {
+            "hls": str(hls_dir),
+            "hls_mode": mode,
+            "audio": audio,
+            "thumbnail": thumb_file,
+        }
+
+    def audio_stream(video, duration):
+        output = str(video_dir / "wave.json")
+        try:
+            words = analyze_audio_stream(
+                video,
+                output,
+                duration,
+                transcribe=not subtitle_words,
+                buckets=waveform_buckets,
+                minmax_json=minmax_file,
+                pyramid_file=pyramid_file,
+                on_progress=reporter("audio_stream"),
+            )
+        except TranscriptionError as e:
+            # Keep what was recognized (gaps become blanks), but retry later
+            raise StageFallback({"waveform": output, "words": e.words}, str(e))
+        return {"waveform": output, "words": subtitle_words or words}
+
+    def transcribe(audio):
+        logging.info("Transcribing with Vosk...")
+        try:
+            if transcribe_workers > 1:
+                return transcribe_parallel(
+                    audio, transcribe_workers, on_progress=reporter("transcribe")
+                )
+            return transcribe_vosk(audio, on_progress=reporter("transcribe"))
+        except Exception as e:
+            logging.error(f"Transcription failed: {e}")
+            # Blank subtitles for now; not checkpointed, so a retry transcribes
+            raise StageFallback([], f"transcription failed: {e}")
+
+    def subtitles():
+        return subtitle_words
+
+    def vtt(words, duration):
+        generate_word_level_vtt(
+            words, video_dir / "words.vtt", video_dir / "words.txt", duration
+        )
+        return str(video_dir / "words.vtt")
+
+    if probe_source:
+        graph.add_stage("probe", probe, ["video"], ["probe", "duration"])
+    if single_pass:
+        outputs = ["hls", "hls_mode", "thumbnail"]
+        if not stream_audio:
+            outputs.append("audio")
+        graph.add_stage("transcode", transcode, ["video", "probe"], outputs)
+    else:
+        if not stream_audio:
+            graph.add_stage("extract_audio", extract_audio, ["video"], ["audio"])
+        # The ladder, the remux check, the chunk split points and encode
+        # progress use the probe
+        needs_probe = hls_ladder or hls_remux or hls_chunk_workers > 1 or on_progress
+        hls_inputs = ["video", "probe"] if needs_probe else ["video"]
+        graph.add_stage("hls", hls, hls_inputs, ["hls", "hls_mode"])
+        if include_thumbnail:
+            graph.add_stage("thumbnail", thumbnail, ["video"], ["thumbnail"])
+
+    if subtitle_words:
+        logging.info("Using downloaded subtitles, skipping Vosk.")
+    if stream_audio:
+        graph.add_stage(
+            "audio_stream", audio_stream, ["video", "duration"], ["waveform", "words"]
+        )
+    else:
+        graph.add_stage("waveform", waveform, ["audio"], ["waveform"])
+        if subtitle_words:
+            graph.add_stage("transcribe", subtitles, [], ["words"])
+        else:
+            graph.add_stage("transcribe", transcribe, ["audio"], ["words"])
+    graph.add_stage("vtt", vtt, ["words", "duration"], ["vtt"])
+    return graph
+
+
+def _pipeline_workers(config: dict) -> int:
+    return int(config.get("PIPELINE_WORKERS") or 4)
+
+
+def _single_pass(config: dict) -> bool:
+    return config.get("PROCESSING_MODE") == "singlepass"
+
+
+def _stream_audio(config: dict) -> bool:
+    return config.get("AUDIO_MODE") == "stream"
+
+
+def _processing_metadata(artifacts: dict, config: dict) -> dict:
+    """How the source was processed, kept in sources.metadata["processing"]."""
+    return {
+        "hls": artifacts.get("hls_mode"),
+        "mode": config.get("PROCESSING_MODE"),
+        "audio": config.get("AUDIO_MODE"),
+    }
+
+
+def _start_publisher(
+    config: dict,
+    storage: StorageBackend,
+    hls_dir: Path,
+    storage_prefix: str,
+    status: StatusEmitter,
+    started_at: float,
+) -> Optional[ProgressivePublisher]:
+    """With HLS_PROGRESSIVE, publish segments while the HLS stage is running."""
+    if not config.get("HLS_PROGRESSIVE"):
+        return None
+
+    def playable(seconds: float):
+        status.update("streaming")
+
+    return ProgressivePublisher(
+        storage,
+        BUCKET_SOURCES,
+        hls_dir,
+        storage_prefix,
+        on_first_playable=playable,
+        started_at=started_at,
+        base_url=hls_base_url(
+            storage,
+            BUCKET_SOURCES,
+            storage_prefix,
+            config.get("HLS_BASE_URL_TEMPLATE"),
+        ),
+    ).start()
+
+
+def _stage_observer(status: StatusEmitter, source: str):
+    """StageGraph on_stage callback: stage events plus duration metrics."""
+
+    def on_stage(name: str, state: str, seconds: Optional[float] = None):
+        status.stage(name, state, seconds)
+        if state == "finished":
+            metrics.observe(
+                "media_stage_duration_seconds", seconds, stage=name, source=source
+            )
+        elif state == "failed":
+            metrics.inc("media_stage_failures_total", stage=name, source=source)
+
+    return on_stage
+
+
+def _record_graph_metrics(graph: StageGraph, source: str, duration: float):
+    """Realtime factor per stage, and which stage held up the graph."""
+    if duration:
+        for name, timing in graph.timings.items():
+            metrics.observe(
+                "media_stage_realtime_factor",
+                timing["duration"] / duration,
+                stage=name,
+                source=source,
+            )
+    # vtt only formats the words, so the stage before it is the real cause
+    ends = {
+        name: t["start"] + t["duration"]
+        for name, t in graph.timings.items()
+        if name != "vtt"
+    }
+    if ends:
+        metrics.inc(
+            "media_bottleneck_stage_total", stage=max(ends, key=ends.get), source=source
+        )
+
+
+def _record_ingest_metrics(source: str, started_at: float, duration: float):
+    seconds = time.monotonic() - started_at
+    metrics.inc("media_jobs_total", source=source, result="completed")
+    metrics.inc("media_processed_media_seconds_total", duration or 0, source=source)
+    metrics.observe(
+        "media_stage_duration_seconds", seconds, stage="ingest", source=source
+    )
+    if duration:
+        metrics.observe(
+            "media_stage_realtime_factor",
+            seconds / duration,
+            stage="ingest",
+            source=source,
+        )
+
+
+def _finish_publisher(publisher: Optional[ProgressivePublisher], processing: dict):
+    """
+    Publish the final playlist. Returns the already uploaded paths (relative to
+    the video dir); on any error the regular upload covers everything.
+    """
+    if publisher is None:
+        return set()
+    try:
+        published = publisher.finish()
+    except Exception as e:
+        logging.warning(f"Progressive publish incomplete, uploading normally: {e}")
+        return set()
+    processing["first_playable_seconds"] = publisher.first_playable_seconds
+    if publisher.first_playable_seconds is not None:
+        metrics.observe(
+            "media_first_playable_seconds", publisher.first_playable_seconds
+        )
+    if not publisher.complete:
+        # Segments are up, but hls/playlist.m3u8 still needs the regular pass
+        return published - {"hls/playlist.m3u8"}
+    return published
+
+
+def _upload_artifacts(
+    config: dict,
+    storage: StorageBackend,
+    video_dir: Path,
+    storage_prefix: str,
+    published: set,
+    status: Optional[StatusEmitter] = None,
+    on_stage=None,
+    known_hashes: Optional[dict] = None,
+):
+    """
+    Upload the working dir. On Supabase, files of at least
+    RESUMABLE_UPLOAD_THRESHOLD bytes (video.mp4, audio.wav) are sent in
+    resumable chunks. Offsets are kept in {video_dir}/uploads.json, so a retry of the
+    same video_id continues a large upload instead of restarting it. With
+    UPLOAD_INCREMENTAL, artifacts matching the prefix's manifest.json are
+    skipped. Playlists are rewritten against HLS_BASE_URL_TEMPLATE (default:
+    the bucket's public URL) before they are sent, so each is uploaded once.
+    Byte progress is reported to status as the "upload" task, and the upload
+    to on_stage as the "upload" stage. known_hashes are sha256 digests by
+    path relative to video_dir that the manifest diff need not recompute.
+    """
+    threshold = int(config.get("RESUMABLE_UPLOAD_THRESHOLD") or 0)
+    resumable = None
+    if threshold > 0 and isinstance(storage, SupabaseStorage):
+        resumable = ResumableUploader.from_supabase(
+            storage.client,
+            state_path=video_dir / UPLOADS_NAME,
+            chunk_size=int(config.get("UPLOAD_CHUNK_SIZE") or 6 * 1024 * 1024),
+            threshold=threshold,
+            retries=int(config.get("UPLOAD_RETRIES", 3)),
+        )
+    if on_stage:
+        on_stage("upload", "started")
+    try:
+        upload = upload_directory(
+            storage,
+            BUCKET_SOURCES,
+            video_dir,
+            storage_prefix,
+            exclude={MANIFEST_NAME, UPLOADS_NAME},
+            workers=int(config.get("UPLOAD_WORKERS") or 8),
+            retries=int(config.get("UPLOAD_RETRIES", 3)),
+            resumable=resumable,
+            uploaded=published,
+            incremental=config.get("UPLOAD_INCREMENTAL", True),
+            playlist_base_url=hls_base_url(
+                storage,
+                BUCKET_SOURCES,
+                storage_prefix,
+                config.get("HLS_BASE_URL_TEMPLATE"),
+            ),
+            on_progress=(lambda f: status.progress("upload", f)) if status else None,
+            known_hashes=known_hashes,
+        )
+    finally:
+        if resumable:
+            resumable.close()
+    if on_stage:
+        on_stage("upload", "finished" if upload.ok else "failed", upload.seconds)
+    upload.raise_for_failures()
+
+
+def _status_emitter(
+    config: dict, supabase, video_uuid: str, is_dry_run: bool, events=None
+):
+    """
+    Write-behind status updates for the source row (none in dry runs), also
+    published to `events` (a job's EventLog publisher) when given.
+    """
+    return StatusEmitter(
+        None if is_dry_run else supabase,
+        video_uuid,
+        interval=float(config.get("STATUS_INTERVAL") or 1.0),
+        progress_interval=float(config.get("PROGRESS_INTERVAL") or 5.0),
+        events=events,
+        event_interval=float(config.get("EVENT_INTERVAL") or 0.5),
+    )
+
+
+def _artifact_cache(config: dict) -> Optional[ArtifactCache]:
+    db_path = config.get("ARTIFACT_CACHE_DB_PATH")
+    return ArtifactCache(db_path) if db_path else None
+
+
+def _complete_from_cache(
+    storage: StorageBackend,
+    cache: ArtifactCache,
+    cache_key: str,
+    profile_id: str,
+    video_uuid: str,
+    status: StatusEmitter,
+    final_data: dict,
+    template: Optional[str] = None,
+) -> bool:
+    """
+    If another ingest already produced artifacts for this source, copy them
+    under {profile_id}/{video_uuid} and mark the source completed.
+    """
+    storage_prefix = f"{profile_id}/{video_uuid}"
+    cached = restore_from_cache(
+        storage, cache, BUCKET_SOURCES, cache_key, storage_prefix
+    )
+    if cached is None:
+        return False
+
+    # Segment URLs in the copied playlist still point at the original prefix
+    fix_hls_playlist_with_absolute_urls(storage, profile_id, video_uuid, template)
+    final_data = dict(final_data)
+    final_data["duration"] = cached.get("duration") or final_data.get("duration")
+    status.update("completed", final_data)
+    status.flush()
+    logging.info("Processing complete (reused cached artifacts)!")
+    return True
+
+
+def _cleanup_work_dir(
+    base_temp_dir: Path, profile_id: str, video_dir: Path, keep: bool
+):
+    """Remove the working dir, unless asked to keep it for a resumable retry."""
+    if keep:
+        logging.info(f"Keeping {video_dir} so a retry can resume from checkpoints")
+    elif video_dir.exists():
+        logging.info(f"Cleaning up {video_dir}")
+        shutil.rmtree(video_dir)
+
+    # Clean empty profile dir
+    if (base_temp_dir / profile_id).exists() and not any(
+        (base_temp_dir / profile_id).iterdir()
+    ):
+        (base_temp_dir / profile_id).rmdir()
+
+
 def process_url_logic(
     source: str,
     profile_id: str,
@@ -42,18 +507,26 @@ def process_url_logic(
     existing_video_uuid: str = None,
     lat: float = None,
     lng: float = None,
+    events=None,
 ):
     """
     Core logic for processing a URL.
+    events(type, data) receives stage transitions and progress (see
+    core/events.py).
     """
     if config is None:
         config = {}
+    configure_transcription(
+        config.get("VOSK_MODEL_PATH"), config.get("VOSK_RECOGNIZERS")
+    )
+    ingest_started = time.monotonic()
 
-    # Initialize Supabase
+    # Initialize Supabase (database) and the artifact storage backend
     supabase = get_supabase_client()
     if not supabase:
         logging.error("Supabase configuration missing.")
         raise Exception("Supabase configuration missing")
+    storage = None if is_dry_run else get_storage_backend(config, supabase)
 
     # Setup directories
     video_uuid = existing_video_uuid or str(uuid.uuid4())
@@ -70,6 +543,13 @@ def process_url_logic(
     logging.info(f"UUID: {video_uuid}")
     logging.info(f"Profile: {profile_id}")
 
+    # Completed stages from a previous attempt of this video_uuid are skipped
+    manifest = StageManifest(video_dir / MANIFEST_NAME)
+    failed = False
+    publisher = None
+    status = _status_emitter(config, supabase, video_uuid, is_dry_run, events)
+    on_stage = _stage_observer(status, "url")
+
     try:
         # Pre-step: Get info and thumbnail early
         cookies_path = "cookies.txt" if os.path.exists("cookies.txt") else None
@@ -99,9 +579,7 @@ def process_url_logic(
                     thumbnail_url=thumbnail_path,
                 )
             else:
-                update_source_status(
-                    supabase,
-                    video_uuid,
+                status.update(
                     "getting thumbnail",
                     {
                         "title": title,
@@ -147,39 +625,73 @@ def process_url_logic(
                         if temp_thumb.exists():
                             temp_thumb.unlink()
 
-                    # Upload to Supabase
-                    with open(thumb_path, "rb") as f:
-                        supabase.storage.from_(BUCKET_SOURCES).upload(
-                            path=f"{storage_prefix}/thumbnail.png",
-                            file=f,
-                            file_options={
-                                "content-type": "image/png",
-                                "upsert": "true",
-                            },
-                        )
+                    # Upload as bytes: the thumbnail stage may rewrite the file
+                    # in place, which must not touch a hardlinked local object
+                    storage.put(
+                        BUCKET_SOURCES,
+                        f"{storage_prefix}/thumbnail.png",
+                        thumb_path.read_bytes(),
+                        "image/png",
+                    )
                     logging.info("Early thumbnail uploaded successfully")
-                    update_source_status(supabase, video_uuid, "downloading")
+                    status.update("downloading")
                 else:
                     logging.warning(f"Failed to download thumbnail: {resp.status_code}")
-                    update_source_status(supabase, video_uuid, "downloading")
+                    status.update("downloading")
             except Exception as e:
                 logging.warning(f"Error processing early thumbnail: {e}")
-                update_source_status(supabase, video_uuid, "downloading")
+                status.update("downloading")
         elif not is_dry_run:
-            update_source_status(supabase, video_uuid, "downloading")
+            status.update("downloading")
+
+        # 1.75 Reuse artifacts if this source was already ingested (any profile)
+        cache = _artifact_cache(config)
+        cache_key = url_cache_key(source)
+        if not is_dry_run and cache and cache_key:
+            if _complete_from_cache(
+                storage,
+                cache,
+                cache_key,
+                profile_id,
+                video_uuid,
+                status,
+                {
+                    "duration": duration,
+                    "title": title,
+                    "description": description,
+                    "thumbnail_url": thumbnail_path,
+                },
+                config.get("HLS_BASE_URL_TEMPLATE"),
+            ):
+                metrics.inc("media_jobs_total", source="url", result="cached")
+                return video_uuid
 
         # 2. Download
-        logging.info("Downloading video...")
-        dl_result = download_video(source, temp_dl_dir, cookies_path)
+        def download(source):
+            logging.info("Downloading video...")
+            result = download_video(source, temp_dl_dir, cookies_path)
 
-        video_file_temp = dl_result["video_path"]
-        if not video_file_temp:
-            raise Exception("Download failed, no video file found.")
+            video_file_temp = result.pop("video_path")
+            if not video_file_temp:
+                raise Exception("Download failed, no video file found.")
 
-        # Move video to root as video.mp4
-        video_file = video_dir / "video.mp4"
-        shutil.move(video_file_temp, video_file)
-        video_file = str(video_file)
+            # Move video to root as video.mp4
+            video_file = video_dir / "video.mp4"
+            shutil.move(video_file_temp, video_file)
+            result["video"] = str(video_file)
+            return result
+
+        download_graph = StageGraph(
+            max_workers=1, checkpoint=manifest, on_stage=on_stage
+        )
+        download_graph.add_stage(
+            "download",
+            download,
+            ["source"],
+            ["video", "title", "description", "chapters", "words"],
+        )
+        dl_result = download_graph.run({"source": source})
+        video_file = dl_result["video"]
 
         # Update title/description if more accurate info came from download
         title = dl_result["title"] or title
@@ -200,89 +712,98 @@ def process_url_logic(
 
         # 3. Processing
         if not is_dry_run:
-            update_source_status(
-                supabase,
-                video_uuid,
+            status.update(
                 "processing",
                 {"title": title, "description": description},
             )
 
-        # Audio & Waveform
-        wav_file = str(video_dir / "audio.wav")
-        extract_audio_wav(video_file, wav_file)
-        generate_waveform_data(wav_file, str(video_dir / "wave.json"))
-
-        # Thumbnail
-        generate_thumbnail(video_file, str(video_dir / "thumbnail.png"))
-
-        # HLS
-        convert_to_hls(video_file, hls_dir)
-
-        # Transcription
-        video_duration = get_video_duration(video_file) or duration
-        words = dl_result["words"]
-
-        if not words:
-            logging.info("No subtitles downloaded, transcribing with Vosk...")
-            try:
-                words = transcribe_vosk(wav_file, "model")
-            except Exception as e:
-                logging.error(f"Transcription failed: {e}")
-                words = []  # Will result in blanks
-
-        generate_word_level_vtt(
-            words, video_dir / "words.vtt", video_dir / "words.txt", video_duration
+        # Audio/waveform, thumbnail, HLS and transcription run as a stage graph
+        graph = build_processing_graph(
+            video_dir,
+            str(video_dir / "audio.wav"),
+            subtitle_words=dl_result["words"],
+            fallback_duration=duration,
+            single_pass=_single_pass(config),
+            stream_audio=_stream_audio(config),
+            transcribe_workers=int(config.get("TRANSCRIBE_WORKERS") or 1),
+            waveform_buckets=int(config.get("WAVEFORM_BUCKETS") or DEFAULT_BUCKETS),
+            hls_ladder=parse_ladder(config.get("HLS_LADDER")),
+            hls_chunk_workers=int(config.get("HLS_CHUNK_WORKERS") or 1),
+            hls_remux=bool(config.get("HLS_REMUX")),
+            max_workers=_pipeline_workers(config),
+            checkpoint=manifest,
+            on_progress=status.progress,
+            on_stage=on_stage,
         )
+        if not is_dry_run:
+            publisher = _start_publisher(
+                config, storage, hls_dir, storage_prefix, status, ingest_started
+            )
+        artifacts = graph.run({"video": video_file})
+        video_duration = artifacts["duration"]
+        _record_graph_metrics(graph, "url", video_duration)
+        processing = _processing_metadata(artifacts, config)
+        published = _finish_publisher(publisher, processing)
+        logging.info(f"Processing path: {processing}")
 
         # 4. Upload
         if not is_dry_run:
-            update_source_status(supabase, video_uuid, "uploading")
+            status.update("uploading")
 
             # Cleanup temp dir before upload
             if temp_dl_dir.exists():
                 shutil.rmtree(temp_dl_dir)
 
             storage_prefix = f"{profile_id}/{video_uuid}"
-            upload_directory_to_supabase(
-                supabase, BUCKET_SOURCES, video_dir, storage_prefix
+            _upload_artifacts(
+                config,
+                storage,
+                video_dir,
+                storage_prefix,
+                published,
+                status,
+                on_stage,
             )
-            fix_hls_playlist_with_absolute_urls(supabase, profile_id, video_uuid)
 
             # Final DB Update
-            update_source_status(
-                supabase,
-                video_uuid,
+            status.update(
                 "completed",
                 {
                     "duration": video_duration,
                     "title": title,
                     "description": description,
                     "thumbnail_url": f"{storage_prefix}/thumbnail.png",
+                    "metadata": {**(info or {}), "processing": processing},
                 },
             )
+            status.flush()
+            if cache and cache_key:
+                cache.store(cache_key, storage_prefix, {"duration": video_duration})
 
             logging.info("Processing complete!")
+            _record_ingest_metrics("url", ingest_started, video_duration)
             return video_uuid
         else:
             logging.info("[Dry Run] Skipping upload and final DB updates.")
             return "dry-run-uuid"
 
     except Exception as e:
+        failed = True
         logging.error(f"Error: {e}")
+        metrics.inc("media_jobs_total", source="url", result="error")
         if not is_dry_run:
-            update_source_status(supabase, video_uuid, "error")
+            status.update("error")
         raise e
     finally:
-        # Cleanup
-        if video_dir.exists():
-            logging.info(f"Cleaning up {video_dir}")
-            shutil.rmtree(video_dir)
-
-        # Clean empty profile dir
-        if (base_temp_dir / profile_id).exists() and not any(
-            (base_temp_dir / profile_id).iterdir()
-        ):
-            (base_temp_dir / profile_id).rmdir()
+        if publisher:
+            publisher.stop()
+        status.close()
+        _cleanup_work_dir(
+            base_temp_dir,
+            profile_id,
+            video_dir,
+            keep=failed and bool(config.get("KEEP_WORK_DIR_ON_FAILURE")),
+        )
 
 
 def process_file_logic(
@@ -293,29 +814,41 @@ def process_file_logic(
     existing_video_uuid: str = None,
     lat: float = None,
     lng: float = None,
+    content_hash: str = None,
+    events=None,
 ):
     """
     Core logic for processing a local file.
+    content_hash is the SHA-256 of the file if the caller already computed it
+    while receiving the upload. events is as in process_url_logic.
     """
     if config is None:
         config = {}
+    configure_transcription(
+        config.get("VOSK_MODEL_PATH"), config.get("VOSK_RECOGNIZERS")
+    )
+    ingest_started = time.monotonic()
+
+    # Setup directories
+    video_uuid = existing_video_uuid or str(uuid.uuid4())
+    base_temp_dir = Path("temp_videos")
+    video_dir = base_temp_dir / profile_id / video_uuid
+    temp_dl_dir = video_dir / "temp"
+    hls_dir = video_dir / "hls"
+    video_file = video_dir / "video.mp4"
 
-    if not file_path.exists():
+    # A retry may find the upload already moved into the kept working dir
+    source_file = file_path if file_path.exists() else video_file
+    if not source_file.exists():
         logging.error(f"File not found: {file_path}")
         raise FileNotFoundError(f"File not found: {file_path}")
 
-    # Initialize Supabase
+    # Initialize Supabase (database) and the artifact storage backend
     supabase = get_supabase_client()
     if not supabase:
         logging.error("Supabase configuration missing.")
         raise Exception("Supabase configuration missing")
-
-    # Setup directories
-    video_uuid = existing_video_uuid or str(uuid.uuid4())
-    base_temp_dir = Path("temp_videos")
-    video_dir = base_temp_dir / profile_id / video_uuid
-    temp_dl_dir = video_dir / "temp"
-    hls_dir = video_dir / "hls"
+    storage = None if is_dry_run else get_storage_backend(config, supabase)
 
     video_dir.mkdir(parents=True, exist_ok=True)
     temp_dl_dir.mkdir(exist_ok=True)
@@ -328,9 +861,17 @@ def process_file_logic(
     title = file_path.stem
     description = ""
 
+    # Completed stages from a previous attempt of this video_uuid are skipped
+    manifest = StageManifest(video_dir / MANIFEST_NAME)
+    failed = False
+    publisher = None
+    status = _status_emitter(config, supabase, video_uuid, is_dry_run, events)
+    on_stage = _stage_observer(status, "file")
+
     try:
-        # Pre-step: Get duration
-        video_duration = get_video_duration(str(file_path))
+        # Pre-step: Probe once; duration and stream info are reused below
+        probe = probe_media(str(source_file))
+        video_duration = probe["duration"]
         storage_prefix = f"{profile_id}/{video_uuid}"
         thumbnail_path = f"{storage_prefix}/thumbnail.png"
 
@@ -341,113 +882,150 @@ def process_file_logic(
             create_higherkey_for_source(
                 supabase, video_uuid, profile_id, title, lat=lat, lng=lng
             )
-            update_source_status(supabase, video_uuid, "getting thumbnail")
+            status.update("getting thumbnail")
+
+        # 1.5 Reuse artifacts if identical content was already ingested
+        cache = _artifact_cache(config)
+        cache_key = None
+        if not is_dry_run and cache:
+            content_hash = content_hash or sha256_file(source_file)
+            cache_key = file_cache_key(content_hash)
+            if _complete_from_cache(
+                storage,
+                cache,
+                cache_key,
+                profile_id,
+                video_uuid,
+                status,
+                {
+                    "duration": video_duration,
+                    "title": title,
+                    "description": description,
+                    "thumbnail_url": thumbnail_path,
+                },
+                config.get("HLS_BASE_URL_TEMPLATE"),
+            ):
+                metrics.inc("media_jobs_total", source="file", result="cached")
+                return video_uuid
 
         # 2. Generate and upload thumbnail
         thumb_path = video_dir / "thumbnail.png"
-        generate_thumbnail(str(file_path), str(thumb_path))
+        generate_thumbnail(str(source_file), str(thumb_path))
 
         if not is_dry_run and thumb_path.exists():
             try:
-                from .db import BUCKET_SOURCES
-
-                with open(thumb_path, "rb") as f:
-                    supabase.storage.from_(BUCKET_SOURCES).upload(
-                        path=thumbnail_path,
-                        file=f,
-                        file_options={
-                            "content-type": "image/png",
-                            "upsert": "true",
-                        },
-                    )
+                storage.put(BUCKET_SOURCES, thumbnail_path, thumb_path, "image/png")
                 logging.info(f"Uploaded thumbnail to {thumbnail_path}")
             except Exception as e:
                 logging.warning(f"Could not upload thumbnail: {e}")
 
         # 3. Update status to processing
         if not is_dry_run:
-            update_source_status(
-                supabase,
-                video_uuid,
+            status.update(
                 "processing",
                 {"thumbnail_url": thumbnail_path, "duration": video_duration},
             )
 
-        # 4. Copy File
-        logging.info("Copying video file...")
-        video_file = video_dir / "video.mp4"
-        shutil.copy2(file_path, video_file)
+        # 4. Copy File (copy2 keeps mtime, so an unchanged copy keeps checkpoints valid)
+        if source_file != video_file and (
+            not video_file.exists()
+            or video_file.stat().st_size != source_file.stat().st_size
+        ):
+            logging.info("Copying video file...")
+            shutil.copy2(source_file, video_file)
         video_file = str(video_file)
 
         # 3. Processing
         # (Status is already 'processing')
 
-        # Audio & Waveform
-        wav_file = str(temp_dl_dir / "audio.wav")
-        extract_audio_wav(video_file, wav_file)
-        generate_waveform_data(wav_file, str(video_dir / "wave.json"))
-
-        # HLS
-        convert_to_hls(video_file, hls_dir)
-
-        # Transcription
-        logging.info("Transcribing with Vosk...")
-        try:
-            words = transcribe_vosk(wav_file, "model")
-        except Exception as e:
-            logging.error(f"Transcription failed: {e}")
-            words = []
-
-        generate_word_level_vtt(
-            words, video_dir / "words.vtt", video_dir / "words.txt", video_duration
+        # Audio/waveform, HLS and transcription run as a stage graph
+        # (the thumbnail was already generated above)
+        graph = build_processing_graph(
+            video_dir,
+            str(temp_dl_dir / "audio.wav"),
+            probe_source=False,
+            include_thumbnail=False,
+            single_pass=_single_pass(config),
+            stream_audio=_stream_audio(config),
+            transcribe_workers=int(config.get("TRANSCRIBE_WORKERS") or 1),
+            waveform_buckets=int(config.get("WAVEFORM_BUCKETS") or DEFAULT_BUCKETS),
+            hls_ladder=parse_ladder(config.get("HLS_LADDER")),
+            hls_chunk_workers=int(config.get("HLS_CHUNK_WORKERS") or 1),
+            hls_remux=bool(config.get("HLS_REMUX")),
+            max_workers=_pipeline_workers(config),
+            checkpoint=manifest,
+            on_progress=status.progress,
+            on_stage=on_stage,
+        )
+        if not is_dry_run:
+            publisher = _start_publisher(
+                config, storage, hls_dir, storage_prefix, status, ingest_started
+            )
+        artifacts = graph.run(
+            {"video": video_file, "probe": probe, "duration": video_duration}
         )
+        _record_graph_metrics(graph, "file", video_duration)
+        processing = _processing_metadata(artifacts, config)
+        published = _finish_publisher(publisher, processing)
+        logging.info(f"Processing path: {processing}")
 
         # 4. Upload
         if not is_dry_run:
-            update_source_status(supabase, video_uuid, "uploading")
+            status.update("uploading")
 
             # Cleanup temp dir before upload
             if temp_dl_dir.exists():
                 shutil.rmtree(temp_dl_dir)
 
             storage_prefix = f"{profile_id}/{video_uuid}"
-            upload_directory_to_supabase(
-                supabase, BUCKET_SOURCES, video_dir, storage_prefix
+            _upload_artifacts(
+                config,
+                storage,
+                video_dir,
+                storage_prefix,
+                published,
+                status,
+                on_stage,
+                # video.mp4 is a copy of the source, hashed on ingest or above
+                {"video.mp4": content_hash} if content_hash else None,
             )
-            fix_hls_playlist_with_absolute_urls(supabase, profile_id, video_uuid)
 
             # Final DB Update
-            update_source_status(
-                supabase,
-                video_uuid,
+            status.update(
                 "completed",
                 {
                     "duration": video_duration,
                     "title": title,
                     "description": description,
                     "thumbnail_url": f"{storage_prefix}/thumbnail.png",
+                    "metadata": {"processing": processing},
                 },
             )
+            status.flush()
+            if cache and cache_key:
+                cache.store(cache_key, storage_prefix, {"duration": video_duration})
 
             logging.info("Processing complete!")
+            _record_ingest_metrics("file", ingest_started, video_duration)
             return video_uuid
         else:
             logging.info("[Dry Run] Skipping upload and final DB updates.")
             return "dry-run-uuid"
 
     except Exception as e:
+        failed = True
         logging.error(f"Error: {e}")
+        metrics.inc("media_jobs_total", source="file", result="error")
         if not is_dry_run:
-            update_source_status(supabase, video_uuid, "error")
+            status.update("error")
         raise e
     finally:
-        # Cleanup
-        if video_dir.exists():
-            logging.info(f"Cleaning up {video_dir}")
-            shutil.rmtree(video_dir)
-
-        # Clean empty profile dir
-        if (base_temp_dir / profile_id).exists() and not any(
-            (base_temp_dir / profile_id).iterdir()
-        ):
-            (base_temp_dir / profile_id).rmdir()
+        if publisher:
+            publisher.stop()
+        status.close()
+        _cleanup_work_dir(
+            base_temp_dir,
+            profile_id,
+            video_dir,
+            keep=failed and bool(config.get("KEEP_WORK_DIR_ON_FAILURE")),
+        )
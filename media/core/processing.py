@@ -1,12 +1,56 @@
 import os
 import json
 import wave
+import shutil
 import logging
 import subprocess
 import math
 from pathlib import Path
-from typing import List, Dict
-from vosk import Model, KaldiRecognizer
+from contextlib import ExitStack
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Dict, Optional, Tuple
+
+from .waveform import WaveformWriter, DEFAULT_BUCKETS
+from .hls import (
+    Rendition,
+    select_ladder,
+    ladder_ffmpeg_args,
+    finalize_ladder,
+    video_rotation,
+)
+from .transcription import recognizer
+from . import metrics
+
+
+def probe_media(video_file: str) -> Dict:
+    """
+    Run ffprobe once and return duration plus the first video/audio stream.
+    Returns {"duration": 0.0, "video": None, "audio": None} on failure.
+    """
+    cmd = [
+        "ffprobe",
+        "-v",
+        "error",
+        "-show_format",
+        "-show_streams",
+        "-of",
+        "json",
+        video_file,
+    ]
+    result = {"duration": 0.0, "video": None, "audio": None, "format": {}}
+    try:
+        data = json.loads(ffprobe_output(cmd).decode())
+    except Exception as e:
+        logging.error(f"Error probing {video_file}: {e}")
+        return result
+
+    result["format"] = data.get("format", {})
+    result["duration"] = float(result["format"].get("duration") or 0.0)
+    for stream in data.get("streams", []):
+        kind = stream.get("codec_type")
+        if kind in ("video", "audio") and result[kind] is None:
+            result[kind] = stream
+    return result
 
 
 def get_video_duration(video_file: str) -> float:
@@ -22,13 +66,78 @@ def get_video_duration(video_file: str) -> float:
         video_file,
     ]
     try:
-        output = subprocess.check_output(cmd).decode().strip()
+        output = ffprobe_output(cmd).decode().strip()
         return float(output)
     except Exception as e:
         logging.error(f"Error getting duration: {e}")
         return 0.0
 
 
+def _count_subprocess(command: str, ok: bool):
+    result = "ok" if ok else "error"
+    metrics.inc("media_subprocesses_total", command=command, result=result)
+
+
+def ffprobe_output(cmd: List[str]) -> bytes:
+    """subprocess.check_output for ffprobe, counted in metrics."""
+    try:
+        output = subprocess.check_output(cmd)
+    except Exception:
+        _count_subprocess("ffprobe", False)
+        raise
+    _count_subprocess("ffprobe", True)
+    return output
+
+
+def run_ffmpeg(
+    cmd: List[str],
+    duration: Optional[float] = None,
+    on_progress: Optional[Callable[[float], None]] = None,
+):
+    """
+    Run an ffmpeg command (raising CalledProcessError on failure). With
+    on_progress and a known duration, ffmpeg writes -progress key=value lines
+    to stdout and on_progress receives out_time / duration (0..1) for each.
+    """
+    try:
+        _run_ffmpeg(cmd, duration, on_progress)
+    except Exception:
+        _count_subprocess("ffmpeg", False)
+        raise
+    _count_subprocess("ffmpeg", True)
+
+
+def _run_ffmpeg(
+    cmd: List[str],
+    duration: Optional[float],
+    on_progress: Optional[Callable[[float], None]],
+):
+    if not on_progress or not duration:
+        subprocess.run(
+            cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        return
+
+    full = [cmd[0], "-progress", "pipe:1", "-nostats"] + cmd[1:]
+    proc = subprocess.Popen(
+        full, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
+    )
+    try:
+        for line in proc.stdout:
+            key, _, value = line.strip().partition("=")
+            if key == "out_time_us" and value.isdigit():
+                on_progress(min(1.0, int(value) / 1e6 / duration))
+            elif key == "progress" and value == "end":
+                on_progress(1.0)
+        if proc.wait() != 0:
+            raise subprocess.CalledProcessError(proc.returncode, cmd)
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+        proc.stdout.close()
+
+
 def extract_audio_wav(video_file: str, output_wav: str):
     """Extract audio from video as 16kHz mono WAV."""
     logging.info(f"Extracting audio from {video_file} to {output_wav}...")
@@ -45,41 +154,36 @@ def extract_audio_wav(video_file: str, output_wav: str):
         "wav",
         output_wav,
     ]
-    subprocess.run(
-        cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
-    )
+    run_ffmpeg(cmd)
+
+
+WAVEFORM_CHUNK_FRAMES = 1 << 20  # ~65s of 16kHz audio per read
 
 
-def generate_waveform_data(wav_file: str, output_json: str, width: int = 1000):
-    """Generate waveform data from a WAV file."""
+def generate_waveform_data(
+    wav_file: str,
+    output_json: str,
+    buckets: int = DEFAULT_BUCKETS,
+    minmax_json: Optional[str] = None,
+    pyramid_file: Optional[str] = None,
+    chunk_frames: int = WAVEFORM_CHUNK_FRAMES,
+):
+    """
+    Generate waveform data from a 16-bit mono WAV file, read in fixed-size
+    chunks so memory stays bounded. Writes absolute peaks to output_json and,
+    if given, per-bucket min/max to minmax_json and the binary
+    level-of-detail pyramid to pyramid_file.
+    """
     logging.info("Generating waveform data...")
     try:
         with wave.open(wav_file, "rb") as wav:
-            frames = wav.readframes(-1)
-            import numpy as np
-
-            samples = np.frombuffer(frames, dtype=np.int16)
-
-        max_samples = min(width * 10, 10000)
-        if len(samples) > 0:
-            block_size = int(len(samples) / max_samples)
-            waveform_data = []
-            # Simple downsampling
-            for i in range(0, max_samples):
-                start = i * block_size
-                end = start + block_size
-                chunk = samples[start:end]
-                if len(chunk) > 0:
-                    waveform_data.append(
-                        round(float(np.max(np.abs(chunk))) / 32768.0, 4)
-                    )
-                else:
-                    waveform_data.append(0)
-        else:
-            waveform_data = []
-
-        with open(output_json, "w") as f:
-            json.dump(waveform_data, f)
+            waveform = WaveformWriter(wav.getnframes(), wav.getframerate(), buckets)
+            while True:
+                frames = wav.readframes(chunk_frames)
+                if not frames:
+                    break
+                waveform.add(frames)
+        waveform.write(output_json, minmax_json, pyramid_file)
     except Exception as e:
         logging.error(f"Error generating waveform: {e}")
         # Write empty array on failure
@@ -87,40 +191,59 @@ def generate_waveform_data(wav_file: str, output_json: str, width: int = 1000):
             json.dump([], f)
 
 
-def convert_to_hls(input_file: str, hls_dir: Path):
-    """Convert video to HLS format."""
+def convert_to_hls(
+    input_file: str,
+    hls_dir: Path,
+    ladder: Optional[List[Rendition]] = None,
+    probe: Optional[Dict] = None,
+    remux: bool = False,
+    on_progress: Optional[Callable[[float], None]] = None,
+) -> str:
+    """
+    Convert video to HLS format. With a ladder, every rendition is encoded
+    from one decode into hls/{name}/ and hls/master.m3u8 (see core/hls.py).
+    Otherwise, with remux, sources that pass remux_compatibility are
+    stream-copied instead of re-encoded. Returns the path taken: "ladder",
+    "remux" or "encode". on_progress gets the encoded fraction when the
+    probe's duration is known (see run_ffmpeg).
+    """
     logging.info(f"Converting {input_file} to HLS format...")
     hls_dir.mkdir(parents=True, exist_ok=True)
     playlist_path = hls_dir / "playlist.m3u8"
 
-    cmd = [
-        "ffmpeg",
-        "-y",
-        "-i",
-        str(input_file),
-        "-c:v",
-        "libx264",
-        "-preset",
-        "fast",
-        "-crf",
-        "23",
-        "-c:a",
-        "aac",
-        "-b:a",
-        "128k",
-        "-hls_time",
-        "10",
-        "-hls_list_size",
-        "0",
-        "-hls_segment_filename",
-        str(hls_dir / "segment%03d.ts"),
-        "-f",
-        "hls",
-        str(playlist_path),
-    ]
-    subprocess.run(
-        cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
-    )
+    if ladder:
+        probe = probe or probe_media(input_file)
+        ladder = select_ladder(ladder, probe)
+        if ladder:
+            audio_in = "0:a:0" if probe.get("audio") else None
+            filters, output = ladder_ffmpeg_args(ladder, "[0:v]", audio_in, hls_dir)
+            cmd = ["ffmpeg", "-y", "-i", str(input_file)]
+            if filters:
+                cmd += ["-filter_complex", ";".join(filters)]
+            run_ffmpeg(cmd + output, probe.get("duration"), on_progress)
+            finalize_ladder(hls_dir)
+            return "ladder"
+
+    if remux:
+        probe = probe or probe_media(input_file)
+        compatible, reason = remux_compatibility(input_file, probe)
+        if compatible:
+            logging.info(f"Remuxing to HLS without re-encoding ({reason})")
+            cmd = ["ffmpeg", "-y", "-i", str(input_file)]
+            cmd += _remux_args(probe, hls_dir, playlist_path)
+            try:
+                run_ffmpeg(cmd, probe.get("duration"), on_progress)
+                return "remux"
+            except subprocess.CalledProcessError as e:
+                logging.warning(f"Remux failed ({e}), re-encoding instead")
+                _clear_hls_dir(hls_dir)
+        else:
+            logging.info(f"Re-encoding for HLS: {reason}")
+
+    cmd = ["ffmpeg", "-y", "-i", str(input_file)]
+    cmd += _single_rendition_args(hls_dir, playlist_path)
+    run_ffmpeg(cmd, (probe or {}).get("duration"), on_progress)
+    return "encode"
 
 
 def generate_thumbnail(video_file: str, output_png: str):
@@ -142,9 +265,7 @@ def generate_thumbnail(video_file: str, output_png: str):
         output_png,
     ]
     try:
-        subprocess.run(
-            cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
-        )
+        run_ffmpeg(cmd)
         if os.path.exists(output_png) and os.path.getsize(output_png) > 0:
             return True
     except Exception:
@@ -164,63 +285,597 @@ def generate_thumbnail(video_file: str, output_png: str):
         output_png,
     ]
     try:
-        subprocess.run(
-            cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
-        )
+        run_ffmpeg(cmd)
         return True
     except Exception as e:
         logging.error(f"Failed to generate thumbnail: {e}")
         return False
 
 
-# --- Transcription Logic ---
+def process_single_pass(
+    video_file: str,
+    hls_dir: Path,
+    output_wav: Optional[str],
+    output_png: str,
+    probe: Dict,
+    ladder: Optional[List[Rendition]] = None,
+    remux: bool = False,
+    on_progress: Optional[Callable[[float], None]] = None,
+) -> str:
+    """
+    Produce the HLS rendition, 16kHz mono WAV and thumbnail from one ffmpeg
+    run, so the source is demuxed and decoded once instead of 3-4 times.
+    `probe` is the result of probe_media() for video_file. Pass
+    output_wav=None when audio is analyzed via analyze_audio_stream instead.
+    With a ladder, all HLS renditions come from the same decode; with remux,
+    compatible sources are stream-copied to HLS. Returns the HLS path taken
+    and reports on_progress as convert_to_hls does.
+    """
+    ladder = select_ladder(ladder, probe) if ladder else None
+    logging.info(f"Single-pass processing {video_file}...")
+    hls_dir.mkdir(parents=True, exist_ok=True)
+    playlist_path = hls_dir / "playlist.m3u8"
 
+    copy = False
+    if remux and not ladder:
+        copy, reason = remux_compatibility(video_file, probe)
+        logging.info(f"{'Remuxing' if copy else 'Re-encoding'} HLS: {reason}")
+
+    # Same thumbnail position as generate_thumbnail: 1s in, or the first frame
+    thumb_at = 1.0 if probe.get("duration", 0) > 1.0 else 0.0
+    if not copy:
+        filters = [
+            "[0:v]split=2[vhls][vthumb]",
+            f"[vthumb]trim=start={thumb_at}[thumb]",
+        ]
+
+    cmd = ["ffmpeg", "-y", "-i", str(video_file)]
+    if probe.get("audio") or not output_wav:
+        audio_in = "0:a:0"
+    else:
+        # No audio track: transcribe/waveform a silent track of the same length
+        cmd += [
+            "-f",
+            "lavfi",
+            "-t",
+            str(probe.get("duration") or 1),
+            "-i",
+            "anullsrc=r=16000:cl=mono",
+        ]
+        audio_in = "1:a:0"
+    thumb = "[thumb]"
+    if copy:
+        # Nothing else decodes the video: take the thumbnail from an
+        # input-seeked copy (one GOP decoded) rather than a trim filter,
+        # which would decode every frame up to thumb_at
+        thumb = f"{cmd.count('-i')}:v:0"
+        cmd += ["-ss", str(thumb_at), "-i", str(video_file)]
+
+    # Output 1: HLS
+    if ladder:
+        ladder_filters, hls_output = ladder_ffmpeg_args(
+            ladder, "[vhls]", audio_in if probe.get("audio") else None, hls_dir
+        )
+        filters += ladder_filters
+        cmd += ["-filter_complex", ";".join(filters)] + hls_output
+    elif copy:
+        cmd += _remux_args(probe, hls_dir, playlist_path)
+    else:
+        cmd += ["-filter_complex", ";".join(filters)]
+        cmd += ["-map", "[vhls]"]
+        if probe.get("audio"):
+            cmd += ["-map", audio_in]
+        cmd += _single_rendition_args(hls_dir, playlist_path)
+    # Output 2: 16kHz mono PCM for waveform/transcription
+    if output_wav:
+        cmd += ["-map", audio_in, "-ar", "16000", "-ac", "1", "-f", "wav", output_wav]
+    # Output 3: thumbnail frame
+    cmd += ["-map", thumb, "-frames:v", "1", "-q:v", "2", output_png]
 
-def transcribe_vosk(wav_file: str, model_path: str = "model") -> List[Dict]:
-    """Transcribe audio using Vosk."""
-    logging.info(f"Transcribing with Vosk using model: {model_path}")
+    try:
+        run_ffmpeg(cmd, probe.get("duration"), on_progress)
+    except subprocess.CalledProcessError as e:
+        if not copy:
+            raise
+        logging.warning(f"Remux failed ({e}), re-encoding instead")
+        _clear_hls_dir(hls_dir)
+        return process_single_pass(
+            video_file,
+            hls_dir,
+            output_wav,
+            output_png,
+            probe,
+            ladder,
+            on_progress=on_progress,
+        )
+    if ladder:
+        finalize_ladder(hls_dir)
+        return "ladder"
+    return "remux" if copy else "encode"
 
-    if not os.path.exists(model_path):
-        # Try looking in parent directories or common locations
-        candidates = ["model", "../model", "media/model"]
-        found = False
-        for c in candidates:
-            if os.path.exists(c):
-                model_path = c
-                found = True
-                break
-        if not found:
-            raise FileNotFoundError(f"Vosk model not found at {model_path}")
 
-    model = Model(model_path)
-    wf = wave.open(wav_file, "rb")
+def _single_rendition_args(hls_dir: Path, playlist_path: Path) -> List[str]:
+    return [
+        "-c:v",
+        "libx264",
+        "-preset",
+        "fast",
+        "-crf",
+        "23",
+        "-c:a",
+        "aac",
+        "-b:a",
+        "128k",
+        "-hls_time",
+        "10",
+        "-hls_list_size",
+        "0",
+        "-hls_segment_filename",
+        str(hls_dir / "segment%03d.ts"),
+        "-f",
+        "hls",
+        str(playlist_path),
+    ]
+
 
-    rec = KaldiRecognizer(model, wf.getframerate())
-    rec.SetWords(True)
+# --- Chunked HLS Encode ---
 
-    results = []
-    while True:
-        data = wf.readframes(4000)
-        if len(data) == 0:
+
+def keyframe_times(
+    video_file: str, around: List[float], window: float = 20.0
+) -> List[float]:
+    """
+    Video keyframe timestamps near each of `around`, read from packet flags
+    (no decoding) over short -read_intervals windows instead of the whole file.
+    """
+    intervals = ",".join(f"{max(0.0, t - window)}%+{2 * window}" for t in around)
+    cmd = [
+        "ffprobe",
+        "-v",
+        "error",
+        "-select_streams",
+        "v:0",
+        "-show_entries",
+        "packet=pts_time,flags",
+        "-read_intervals",
+        intervals,
+        "-of",
+        "csv=p=0",
+        video_file,
+    ]
+    keyframes = set()
+    for line in ffprobe_output(cmd).decode().splitlines():
+        pts, _, flags = line.partition(",")
+        if "K" in flags and pts not in ("", "N/A"):
+            keyframes.add(float(pts))
+    return sorted(keyframes)
+
+
+def plan_chunks(
+    video_file: str, duration: float, chunks: int, start_time: float = 0.0
+) -> List[Tuple[float, Optional[float]]]:
+    """
+    (start, end) time ranges splitting the source into up to `chunks` parts at
+    the keyframes nearest the even split points. The last range ends at None.
+    Times are relative to the container start_time, as -ss expects.
+    """
+    targets = [duration * k / chunks for k in range(1, chunks)]
+    keyframes = [
+        round(t - start_time, 6)
+        for t in keyframe_times(video_file, [start_time + t for t in targets])
+    ]
+    splits = []
+    for target in targets:
+        if not keyframes:
             break
-        if rec.AcceptWaveform(data):
-            part = json.loads(rec.Result())
-            if "result" in part:
-                for item in part["result"]:
-                    if "word" in item:
-                        item["text"] = item.pop("word")
-                results.extend(part["result"])
-
-    part = json.loads(rec.FinalResult())
-    if "result" in part:
-        for item in part["result"]:
-            if "word" in item:
-                item["text"] = item.pop("word")
-        results.extend(part["result"])
+        split = min(keyframes, key=lambda t: abs(t - target))
+        if split > 0 and (not splits or split > splits[-1]):
+            splits.append(split)
+    starts = [0.0] + splits
+    return list(zip(starts, splits + [None]))
+
+
+def _encode_chunk(
+    video_file: str,
+    start: float,
+    end: Optional[float],
+    output: str,
+    threads: int,
+    span: Optional[float] = None,
+    on_progress: Optional[Callable[[float], None]] = None,
+):
+    """
+    Encode one video-only time range; the seek lands exactly on a keyframe.
+    span is the range's length in seconds, for on_progress.
+    """
+    cmd = ["ffmpeg", "-y", "-ss", str(start), "-i", video_file]
+    if end is not None:
+        cmd += ["-t", str(end - start)]
+    cmd += [
+        "-an",
+        "-threads",
+        str(threads),
+        "-c:v",
+        "libx264",
+        "-preset",
+        "fast",
+        "-crf",
+        "23",
+        "-force_key_frames",
+        "expr:gte(t,n_forced*10)",
+        output,
+    ]
+    run_ffmpeg(cmd, span, on_progress)
+
+
+def _encode_audio(video_file: str, output: str):
+    cmd = ["ffmpeg", "-y", "-i", video_file, "-vn", "-c:a", "aac", "-b:a", "128k"]
+    run_ffmpeg(cmd + [output])
+
+
+def convert_to_hls_chunked(
+    input_file: str,
+    hls_dir: Path,
+    probe: Dict,
+    workers: int,
+    min_chunk_seconds: float = 120.0,
+    remux: bool = False,
+    on_progress: Optional[Callable[[float], None]] = None,
+) -> str:
+    """
+    Segment-parallel version of convert_to_hls for long sources. The video is
+    split at keyframes into up to `workers` time ranges, which are encoded
+    concurrently (one ffmpeg process each) while the audio is encoded once in
+    full, so there are no AAC priming gaps at chunk boundaries. The concat
+    demuxer then stitches the chunks back into one timeline, and a stream-copy
+    HLS pass writes the usual hls/playlist.m3u8 with continuous segment
+    numbers and timestamps. Falls back to convert_to_hls for short sources
+    and, with remux, for sources that can be stream-copied. Returns the path
+    taken ("chunked", or what convert_to_hls returned). on_progress follows
+    the chunk encodes, which are most of the work.
+    """
+    duration = probe.get("duration") or 0.0
+    chunks = max(1, min(workers, int(duration // min_chunk_seconds)))
+    if (
+        chunks < 2
+        or not probe.get("video")
+        or (remux and remux_compatibility(input_file, probe)[0])
+    ):
+        return convert_to_hls(
+            input_file, hls_dir, probe=probe, remux=remux, on_progress=on_progress
+        )
 
+    start_time = float(probe.get("format", {}).get("start_time") or 0.0)
+    ranges = plan_chunks(input_file, duration, chunks, start_time)
+    logging.info(f"Converting {input_file} to HLS in {len(ranges)} parallel chunks...")
+    hls_dir.mkdir(parents=True, exist_ok=True)
+    # Next to hls/ rather than in /tmp: chunks of a long source are large
+    work_dir = hls_dir.parent / "hls_chunks"
+    shutil.rmtree(work_dir, ignore_errors=True)
+    work_dir.mkdir()
+    threads = max(1, (os.cpu_count() or 1) // len(ranges))
+    try:
+        chunk_files = [str(work_dir / f"chunk{i:03d}.mp4") for i in range(len(ranges))]
+        audio_file = str(work_dir / "audio.m4a") if probe.get("audio") else None
+        # Ranges are relative to start_time, like duration
+        spans = [
+            (end if end is not None else duration) - start for start, end in ranges
+        ]
+        encoded = [0.0] * len(ranges)
+
+        def chunk_progress(index: int):
+            def report(fraction: float):
+                encoded[index] = fraction * spans[index]
+                on_progress(sum(encoded) / duration)
+
+            return report if on_progress else None
+
+        with ThreadPoolExecutor(max_workers=len(ranges) + 1) as pool:
+            futures = [
+                pool.submit(
+                    _encode_chunk,
+                    input_file,
+                    start,
+                    end,
+                    output,
+                    threads,
+                    spans[i],
+                    chunk_progress(i),
+                )
+                for i, ((start, end), output) in enumerate(zip(ranges, chunk_files))
+            ]
+            if audio_file:
+                futures.append(pool.submit(_encode_audio, input_file, audio_file))
+            for future in futures:
+                future.result()
+
+        concat_list = work_dir / "chunks.txt"
+        # The concat demuxer resolves relative entries against the list's dir
+        concat_list.write_text(
+            "".join(f"file '{Path(path).resolve()}'\n" for path in chunk_files)
+        )
+        cmd = ["ffmpeg", "-y", "-f", "concat", "-safe", "0", "-i", str(concat_list)]
+        if audio_file:
+            cmd += ["-i", audio_file, "-map", "0:v:0", "-map", "1:a:0"]
+        cmd += [
+            "-c",
+            "copy",
+            "-hls_time",
+            "10",
+            "-hls_list_size",
+            "0",
+            "-hls_segment_filename",
+            str(hls_dir / "segment%03d.ts"),
+            "-f",
+            "hls",
+            str(hls_dir / "playlist.m3u8"),
+        ]
+        run_ffmpeg(cmd)
+        return "chunked"
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+# --- Stream-copy Remux ---
+
+REMUX_H264_PROFILES = {"Constrained Baseline", "Baseline", "Main", "High"}
+REMUX_MAX_HEIGHT = 1080
+REMUX_MAX_KBPS = 8000
+REMUX_MAX_GOP_SECONDS = 10.0
+
+
+def remux_compatibility(video_file: str, probe: Dict) -> Tuple[bool, str]:
+    """
+    Whether the source can go to HLS with -c copy: H.264 (8-bit 4:2:0, a
+    profile every player decodes) plus AAC or no audio, no rotation (MPEG-TS
+    has no display matrix), at most 1080p / REMUX_MAX_KBPS, and keyframes at
+    most REMUX_MAX_GOP_SECONDS apart, sampled at the start and the middle.
+    Returns (compatible, reason).
+    """
+    video, audio = probe.get("video"), probe.get("audio")
+    if not video:
+        return False, "no video stream"
+    if video.get("codec_name") != "h264":
+        return False, f"video codec {video.get('codec_name')}"
+    if video.get("profile") not in REMUX_H264_PROFILES:
+        return False, f"h264 profile {video.get('profile')}"
+    if video.get("pix_fmt") not in ("yuv420p", "yuvj420p"):
+        return False, f"pixel format {video.get('pix_fmt')}"
+    if video_rotation(video):
+        return False, f"rotated {video_rotation(video)} degrees"
+    if int(video.get("height") or 0) > REMUX_MAX_HEIGHT:
+        return False, f"height {video.get('height')}"
+    if audio and audio.get("codec_name") != "aac":
+        return False, f"audio codec {audio.get('codec_name')}"
+
+    bit_rate = int(video.get("bit_rate") or probe["format"].get("bit_rate") or 0)
+    if bit_rate > REMUX_MAX_KBPS * 1000:
+        return False, f"bitrate {bit_rate // 1000}kbps"
+
+    duration = probe.get("duration") or 0.0
+    start_time = float(probe.get("format", {}).get("start_time") or 0.0)
+    samples = sorted({start_time + min(30.0, duration / 2), start_time + duration / 2})
+    try:
+        keyframes = keyframe_times(video_file, samples, window=30.0)
+    except Exception as e:
+        return False, f"keyframe probe failed: {e}"
+    if not keyframes:
+        return False, "no keyframes found"
+    gop = max((b - a for a, b in zip(keyframes, keyframes[1:])), default=0.0)
+    if gop > REMUX_MAX_GOP_SECONDS:
+        return False, f"keyframe interval {gop:.1f}s"
+    return True, f"h264 {video.get('profile')}, GOP <= {gop:.1f}s"
+
+
+def _remux_args(probe: Dict, hls_dir: Path, playlist_path: Path) -> List[str]:
+    """
+    Stream-copy HLS output. Segments can only start on keyframes, so each one
+    is cut at the first keyframe after hls_time (at most one GOP longer).
+    """
+    args = ["-map", "0:v:0"]
+    if probe.get("audio"):
+        args += ["-map", "0:a:0"]
+    return args + [
+        "-c",
+        "copy",
+        "-hls_time",
+        "10",
+        "-hls_list_size",
+        "0",
+        "-hls_flags",
+        "independent_segments",
+        "-hls_segment_filename",
+        str(hls_dir / "segment%03d.ts"),
+        "-f",
+        "hls",
+        str(playlist_path),
+    ]
+
+
+def _clear_hls_dir(hls_dir: Path):
+    shutil.rmtree(hls_dir, ignore_errors=True)
+    hls_dir.mkdir(parents=True, exist_ok=True)
+
+
+# --- Transcription Logic ---
+
+
+def _words_from_result(result_json: str) -> List[Dict]:
+    part = json.loads(result_json)
+    words = part.get("result", [])
+    for item in words:
+        if "word" in item:
+            item["text"] = item.pop("word")
+    return words
+
+
+def transcribe_vosk(
+    wav_file: str,
+    model_path: Optional[str] = None,
+    on_progress: Optional[Callable[[float], None]] = None,
+) -> List[Dict]:
+    """
+    Transcribe audio using Vosk (model cached per process, see
+    transcription.py). on_progress gets the fraction of frames fed so far.
+    """
+    logging.info(f"Transcribing with Vosk using model: {model_path or 'default'}")
+
+    results = []
+    with wave.open(wav_file, "rb") as wf:
+        total = wf.getnframes()
+        fed = 0
+        with recognizer(wf.getframerate(), model_path) as rec:
+            while True:
+                data = wf.readframes(4000)
+                if len(data) == 0:
+                    break
+                if rec.AcceptWaveform(data):
+                    results.extend(_words_from_result(rec.Result()))
+                fed += 4000
+                if on_progress and total:
+                    on_progress(min(1.0, fed / total))
+
+            results.extend(_words_from_result(rec.FinalResult()))
     return results
 
 
+# --- Streaming Audio ---
+
+PCM_SAMPLE_RATE = 16000
+PCM_CHUNK_BYTES = 8000  # 4000 frames of s16le mono, same as transcribe_vosk
+
+
+def stream_audio_pcm(video_file: str, chunk_bytes: int = PCM_CHUNK_BYTES):
+    """Yield 16kHz mono s16le PCM chunks decoded by ffmpeg, without a WAV on disk."""
+    cmd = [
+        "ffmpeg",
+        "-v",
+        "error",
+        "-i",
+        video_file,
+        "-vn",
+        "-ar",
+        str(PCM_SAMPLE_RATE),
+        "-ac",
+        "1",
+        "-f",
+        "s16le",
+        "pipe:1",
+    ]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            data = proc.stdout.read(chunk_bytes)
+            if not data:
+                break
+            yield data
+        if proc.wait() != 0:
+            raise subprocess.CalledProcessError(proc.returncode, cmd)
+        _count_subprocess("ffmpeg", True)
+    except Exception:
+        _count_subprocess("ffmpeg", False)
+        raise
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+        proc.stdout.close()
+
+
+class TranscriptionError(Exception):
+    """Vosk failed during analyze_audio_stream; words is what it got before."""
+
+    def __init__(self, message: str, words: List[Dict]):
+        super().__init__(message)
+        self.words = words
+
+
+def analyze_audio_stream(
+    video_file: str,
+    output_json: str,
+    duration: float,
+    transcribe: bool = True,
+    model_path: Optional[str] = None,
+    buckets: int = DEFAULT_BUCKETS,
+    minmax_json: Optional[str] = None,
+    pyramid_file: Optional[str] = None,
+    on_progress: Optional[Callable[[float], None]] = None,
+) -> List[Dict]:
+    """
+    Decode the audio once and fan each PCM chunk out to the waveform peak
+    accumulator and (if transcribe is set) a Vosk recognizer, so transcription
+    runs while ffmpeg is still extracting. Writes the waveform JSON (plus the
+    min/max JSON and pyramid when those paths are set) and returns the
+    transcribed words. Memory use is independent of length. on_progress gets
+    the PCM byte offset as a fraction of duration. If Vosk fails, the
+    waveform is still written and TranscriptionError is raised.
+    """
+    logging.info(f"Streaming audio analysis for {video_file}...")
+    waveform = WaveformWriter(int(duration * PCM_SAMPLE_RATE), PCM_SAMPLE_RATE, buckets)
+    outputs = (output_json, minmax_json, pyramid_file)
+
+    with ExitStack() as stack:
+        rec = error = None
+        if transcribe:
+            try:
+                rec = stack.enter_context(recognizer(PCM_SAMPLE_RATE, model_path))
+            except Exception as e:
+                logging.error(f"Transcription failed: {e}")
+                error = e
+        words, rec_error = _fan_out_pcm(
+            video_file,
+            waveform,
+            rec,
+            outputs,
+            on_progress,
+            duration * PCM_SAMPLE_RATE * 2,
+        )
+    error = error or rec_error
+    if error is not None:
+        raise TranscriptionError(str(error), words)
+    return words
+
+
+def _fan_out_pcm(
+    video_file: str,
+    waveform: WaveformWriter,
+    rec,
+    outputs: tuple,
+    on_progress: Optional[Callable[[float], None]] = None,
+    expected_bytes: float = 0,
+):
+    """Feed the decoded PCM to both consumers; returns (words, Vosk error)."""
+    words = []
+    error = None
+    pending = b""
+    offset = 0
+    try:
+        for data in stream_audio_pcm(video_file):
+            offset += len(data)
+            if on_progress and expected_bytes:
+                on_progress(min(1.0, offset / expected_bytes))
+            data = pending + data
+            if len(data) % 2:
+                # Keep sample alignment if a read ends mid-sample
+                data, pending = data[:-1], data[-1:]
+            else:
+                pending = b""
+            waveform.add(data)
+            if rec is not None:
+                try:
+                    if rec.AcceptWaveform(data):
+                        words.extend(_words_from_result(rec.Result()))
+                except Exception as e:
+                    logging.error(f"Transcription failed: {e}")
+                    rec, error = None, e
+        if rec is not None:
+            words.extend(_words_from_result(rec.FinalResult()))
+    finally:
+        waveform.write(*outputs)
+
+    return words, error
+
+
 def fill_gaps_with_blanks(
     words: List[Dict], video_duration: float, interval: float = 0.5
 ) -> List[Dict]:
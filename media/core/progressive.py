@@ -0,0 +1,177 @@
+import math
+import time
+import logging
+import threading
+from pathlib import Path
+from typing import Callable, List, Optional, Set, Tuple
+
+from .backends import StorageBackend
+from .hls import HLS_TIME, MEDIA_PLAYLIST
+from .storage import content_type_for, upload_with_retry
+
+
+def parse_media_playlist(content: str) -> Tuple[List[Tuple[float, str]], bool]:
+    """
+    (duration, uri) per complete segment entry plus whether #EXT-X-ENDLIST was
+    seen. A trailing line without a newline may still be being written by
+    ffmpeg and is ignored.
+    """
+    if not content.endswith("\n"):
+        content = content.rsplit("\n", 1)[0] if "\n" in content else ""
+    segments, duration, ended = [], None, False
+    for line in content.splitlines():
+        line = line.strip()
+        if line.startswith("#EXTINF:"):
+            duration = float(line[len("#EXTINF:") :].split(",", 1)[0])
+        elif line.startswith("#EXT-X-ENDLIST"):
+            ended = True
+        elif line and not line.startswith("#") and duration is not None:
+            segments.append((duration, line))
+            duration = None
+    return segments, ended
+
+
+def event_playlist(
+    segments: List[Tuple[float, str]], base_url: str, ended: bool
+) -> str:
+    """EVENT playlist listing the published segments by absolute URL."""
+    target = max(HLS_TIME * 2, math.ceil(max((d for d, _ in segments), default=0)))
+    lines = [
+        "#EXTM3U",
+        "#EXT-X-VERSION:3",
+        "#EXT-X-PLAYLIST-TYPE:EVENT",
+        f"#EXT-X-TARGETDURATION:{target}",
+        "#EXT-X-MEDIA-SEQUENCE:0",
+    ]
+    for duration, uri in segments:
+        lines.append(f"#EXTINF:{duration:.6f},")
+        lines.append(f"{base_url}/{uri.rsplit('/', 1)[-1]}")
+    if ended:
+        lines.append("#EXT-X-ENDLIST")
+    return "\n".join(lines) + "\n"
+
+
+class ProgressivePublisher:
+    """
+    Watches hls/playlist.m3u8 while ffmpeg writes it and uploads each segment
+    as soon as ffmpeg lists it, followed by an EVENT playlist with absolute
+    URLs, so playback can start while the encode is still running. finish()
+    publishes the final playlist with #EXT-X-ENDLIST.
+
+    Only the single-rendition layout is published progressively; a master
+    playlist (HLS_LADDER) is left to the regular upload.
+    """
+
+    def __init__(
+        self,
+        storage: StorageBackend,
+        bucket_name: str,
+        hls_dir: Path,
+        storage_prefix: str,
+        on_first_playable: Optional[Callable[[float], None]] = None,
+        started_at: Optional[float] = None,
+        poll_interval: float = 1.0,
+        base_url: Optional[str] = None,
+    ):
+        self.storage = storage
+        self.bucket_name = bucket_name
+        self.hls_dir = Path(hls_dir)
+        self.storage_prefix = storage_prefix
+        self.on_first_playable = on_first_playable
+        self.started_at = started_at or time.monotonic()
+        self.poll_interval = poll_interval
+
+        self.published: Set[str] = set()  # paths relative to the video dir
+        self.segments: List[Tuple[float, str]] = []
+        self.complete = False
+        self.first_playable_seconds: Optional[float] = None
+
+        self._dirty = False
+        self._watch_from = time.time()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        # Segment URLs in the published playlist (see storage.hls_base_url)
+        self.base_url = (
+            base_url
+            or storage.public_url(
+                bucket_name, f"{storage_prefix}/hls/{MEDIA_PLAYLIST}"
+            ).rsplit("/", 1)[0]
+        )
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop watching without publishing an ENDLIST (e.g. on failure)."""
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def finish(self) -> Set[str]:
+        """Publish what is left plus the final playlist; returns published paths."""
+        self.stop()
+        self._poll()
+        return self.published
+
+    def _run(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self._poll()
+            except Exception as e:
+                logging.warning(f"Progressive publish failed, will retry: {e}")
+
+    def _poll(self):
+        playlist = self.hls_dir / MEDIA_PLAYLIST
+        if self.complete or not playlist.exists():
+            return
+        content = playlist.read_text(encoding="utf-8", errors="replace")
+        if "#EXT-X-STREAM-INF" in content:
+            return
+        segments, ended = parse_media_playlist(content)
+        # A playlist left over from an interrupted attempt is only trusted
+        # once it is complete; otherwise wait for ffmpeg to rewrite it
+        if not ended and playlist.stat().st_mtime < self._watch_from:
+            return
+
+        for duration, uri in segments[len(self.segments) :]:
+            self._upload(self.hls_dir / uri)
+            self.segments.append((duration, uri))
+            self._dirty = True
+        if self._dirty or ended:
+            self._publish_playlist(ended)
+            self._dirty = False
+            self.complete = ended
+
+    def _publish_playlist(self, ended: bool):
+        content = event_playlist(self.segments, self.base_url, ended)
+        self._upload_bytes(f"hls/{MEDIA_PLAYLIST}", content.encode("utf-8"))
+        if self.first_playable_seconds is None and self.segments:
+            self.first_playable_seconds = time.monotonic() - self.started_at
+            logging.info(
+                f"First segment playable after {self.first_playable_seconds:.1f}s"
+            )
+            if self.on_first_playable:
+                self.on_first_playable(self.first_playable_seconds)
+
+    def _upload(self, local_path: Path):
+        relative = local_path.relative_to(self.hls_dir.parent).as_posix()
+        upload_with_retry(
+            self.storage,
+            self.bucket_name,
+            f"{self.storage_prefix}/{relative}",
+            local_path,
+            content_type_for(local_path),
+        )
+        self.published.add(relative)
+
+    def _upload_bytes(self, relative: str, data: bytes):
+        upload_with_retry(
+            self.storage,
+            self.bucket_name,
+            f"{self.storage_prefix}/{relative}",
+            data,
+            content_type_for(relative),
+            "0",
+        )
+        self.published.add(relative)
@@ -0,0 +1,377 @@
+import os
+import json
+import time
+import base64
+import random
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+import httpx
+from supabase import Client
+
+TUS_VERSION = "1.0.0"
+# Supabase Storage only accepts 6 MB chunks (the last one may be shorter)
+DEFAULT_CHUNK_SIZE = 6 * 1024 * 1024
+# Files at least this large go through the resumable endpoint
+DEFAULT_THRESHOLD = 64 * 1024 * 1024
+UPLOADS_NAME = "uploads.json"
+
+
+class ResumableUploadError(Exception):
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+
+class UploadState:
+    """
+    On-disk record of unfinished resumable uploads (storage path -> upload URL
+    plus the size and mtime of the file being sent), so a retried job asks the
+    server for the offset it reached instead of starting over.
+    """
+
+    def __init__(self, path: Optional[Path]):
+        self.path = Path(path) if path else None
+        self._lock = threading.Lock()
+        self.entries: Dict[str, Dict] = {}
+        if self.path and self.path.exists():
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self.entries = json.load(f)
+            except Exception as e:
+                logging.warning(f"Ignoring unreadable upload state {self.path}: {e}")
+
+    def get(self, key: str, stat: os.stat_result) -> Optional[str]:
+        entry = self.entries.get(key)
+        if (
+            entry
+            and entry.get("size") == stat.st_size
+            and entry.get("mtime_ns") == stat.st_mtime_ns
+        ):
+            return entry["url"]
+        return None
+
+    def set(self, key: str, url: str, stat: os.stat_result):
+        with self._lock:
+            self.entries[key] = {
+                "url": url,
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+            }
+            self._save()
+
+    def remove(self, key: str):
+        with self._lock:
+            if self.entries.pop(key, None) is not None:
+                self._save()
+
+    def _save(self):
+        if not self.path:
+            return
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f)
+        os.replace(tmp, self.path)
+
+
+def _metadata(values: Dict[str, str]) -> str:
+    return ",".join(
+        f"{k} {base64.b64encode(v.encode('utf-8')).decode('ascii')}"
+        for k, v in values.items()
+    )
+
+
+class ResumableUploader:
+    """
+    TUS 1.0 client for Supabase Storage's resumable endpoint
+    ({SUPABASE_URL}/storage/v1/upload/resumable).
+
+    Files are sent in chunk_size PATCH requests read straight from disk, so
+    only one chunk is in memory. After a failed chunk the server is asked for
+    its offset (HEAD) and the upload continues from there, with jittered
+    exponential backoff between attempts. Upload URLs are persisted in an
+    UploadState, so a later process resumes too.
+    """
+
+    def __init__(
+        self,
+        endpoint: str,
+        headers: Optional[Dict[str, str]] = None,
+        state_path: Optional[Path] = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        threshold: int = DEFAULT_THRESHOLD,
+        retries: int = 3,
+        backoff: float = 0.5,
+        timeout: float = 120.0,
+        client: Optional[httpx.Client] = None,
+    ):
+        self.endpoint = endpoint
+        self.chunk_size = max(1, int(chunk_size))
+        self.threshold = threshold
+        self.retries = retries
+        self.backoff = backoff
+        self.state = UploadState(state_path)
+        self.headers = {"Tus-Resumable": TUS_VERSION, **(headers or {})}
+        # A shared (pooled) client is borrowed, not closed
+        self._owns_client = client is None
+        self.client = client or httpx.Client(timeout=timeout)
+
+    @classmethod
+    def from_supabase(cls, supabase: Client, **kwargs) -> "ResumableUploader":
+        url = str(supabase.supabase_url).rstrip("/")
+        key = supabase.supabase_key
+        kwargs.setdefault("client", supabase.options.httpx_client)
+        return cls(
+            f"{url}/storage/v1/upload/resumable",
+            {"apikey": key, "authorization": f"Bearer {key}"},
+            **kwargs,
+        )
+
+    def close(self):
+        if self._owns_client:
+            self.client.close()
+
+    def upload(
+        self,
+        local_path: Path,
+        bucket_name: str,
+        storage_path: str,
+        content_type: str,
+        upsert: bool = True,
+        on_bytes: Optional[Callable[[int], None]] = None,
+    ) -> int:
+        """
+        Upload (or finish uploading) one file; returns the bytes sent.
+        on_bytes(n) is called as the server's offset advances by n bytes.
+        """
+        local_path = Path(local_path)
+        stat = local_path.stat()
+        key = f"{bucket_name}/{storage_path}"
+
+        url = self.state.get(key, stat)
+        offset = self._offset(url) if url else None
+        if offset is None:
+            url = self._create(
+                stat.st_size, bucket_name, storage_path, content_type, upsert
+            )
+            self.state.set(key, url, stat)
+            offset = 0
+        elif offset:
+            logging.info(f"Resuming {key} at {offset}/{stat.st_size} bytes")
+
+        sent, attempt, reported = 0, 0, 0
+        with open(local_path, "rb") as f:
+            while offset < stat.st_size:
+                if on_bytes and offset > reported:
+                    on_bytes(offset - reported)
+                    reported = offset
+                f.seek(offset)
+                chunk = f.read(self.chunk_size)
+                try:
+                    offset = self._patch(url, offset, chunk)
+                    sent += len(chunk)
+                    attempt = 0
+                except (httpx.TransportError, ResumableUploadError) as e:
+                    status = getattr(e, "status", None)
+                    if attempt >= self.retries or not _retryable(status):
+                        raise
+                    time.sleep(random.uniform(0, self.backoff * 2**attempt))
+                    attempt += 1
+                    # The server may have stored part of the chunk
+                    offset = self._offset(url)
+                    if offset is None:
+                        raise ResumableUploadError(f"Upload {url} expired", status)
+        if on_bytes and offset > reported:
+            on_bytes(offset - reported)
+        self.state.remove(key)
+        return sent
+
+    def _create(
+        self,
+        length: int,
+        bucket_name: str,
+        storage_path: str,
+        content_type: str,
+        upsert: bool,
+    ) -> str:
+        metadata = {
+            "bucketName": bucket_name,
+            "objectName": storage_path,
+            "contentType": content_type,
+            "cacheControl": "3600",
+        }
+        response = self._request(
+            "POST",
+            self.endpoint,
+            headers={
+                "Upload-Length": str(length),
+                "Upload-Metadata": _metadata(metadata),
+                "x-upsert": "true" if upsert else "false",
+            },
+        )
+        if response.status_code != 201 or "location" not in response.headers:
+            raise ResumableUploadError(
+                f"Creating upload for {storage_path} failed: "
+                f"{response.status_code} {response.text[:200]}",
+                response.status_code,
+            )
+        return str(httpx.URL(self.endpoint).join(response.headers["location"]))
+
+    def _offset(self, url: str) -> Optional[int]:
+        """Offset the server holds for url, or None if the upload is gone."""
+        response = self._request("HEAD", url)
+        if response.status_code in (404, 410):
+            return None
+        if response.status_code >= 400 or "upload-offset" not in response.headers:
+            raise ResumableUploadError(
+                f"Upload status {url} failed: {response.status_code}",
+                response.status_code,
+            )
+        return int(response.headers["upload-offset"])
+
+    def _patch(self, url: str, offset: int, chunk: bytes) -> int:
+        response = self.client.patch(
+            url,
+            content=chunk,
+            headers={
+                **self.headers,
+                "Upload-Offset": str(offset),
+                "Content-Type": "application/offset+octet-stream",
+            },
+        )
+        if response.status_code != 204:
+            raise ResumableUploadError(
+                f"Chunk at {offset} failed: {response.status_code} {response.text[:200]}",
+                response.status_code,
+            )
+        return int(response.headers["upload-offset"])
+
+    def _request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """Creation and offset requests, retried on connection and 5xx errors."""
+        headers = {**self.headers, **kwargs.pop("headers", {})}
+        for attempt in range(self.retries + 1):
+            try:
+                response = self.client.request(method, url, headers=headers, **kwargs)
+            except httpx.TransportError:
+                if attempt == self.retries:
+                    raise
+            else:
+                status = response.status_code
+                if attempt == self.retries or (status < 500 and status != 429):
+                    return response
+            time.sleep(random.uniform(0, self.backoff * 2**attempt))
+
+
+def _retryable(status: Optional[int]) -> bool:
+    # No status means a connection error; 409 is an offset mismatch, which
+    # the HEAD before the next attempt resolves
+    return status is None or status >= 500 or status in (408, 409, 429)
+
+
+class LocalTusServer:
+    """
+    Minimal in-process stand-in for the Supabase resumable endpoint, for
+    benchmarks and manual testing without a Supabase project. Objects land in
+    {root}/{bucket}/{object}. fail_every=N drops every Nth PATCH after
+    storing half of it, to exercise resumption.
+
+        with LocalTusServer(root) as server:
+            ResumableUploader(server.endpoint).upload(...)
+    """
+
+    def __init__(self, root: Path, port: int = 0, fail_every: int = 0):
+        self.root = Path(root)
+        self.fail_every = fail_every
+        self.uploads: Dict[str, Dict] = {}
+        self.patches = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def endpoint(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/storage/v1/upload/resumable"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _reply(self, status: int, headers: Optional[Dict[str, str]] = None):
+                self.send_response(status)
+                self.send_header("Tus-Resumable", TUS_VERSION)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def _upload(self) -> Optional[Dict]:
+                return server.uploads.get(self.path.rsplit("/", 1)[-1])
+
+            def do_POST(self):
+                metadata = {}
+                for item in self.headers.get("Upload-Metadata", "").split(","):
+                    name, _, value = item.strip().partition(" ")
+                    metadata[name] = base64.b64decode(value).decode("utf-8")
+                path = server.root / metadata["bucketName"] / metadata["objectName"]
+                if path.exists() and self.headers.get("x-upsert") != "true":
+                    return self._reply(409)
+                path.parent.mkdir(parents=True, exist_ok=True)
+                path.write_bytes(b"")
+                with server._lock:
+                    upload_id = f"{len(server.uploads) + 1:08d}"
+                    server.uploads[upload_id] = {
+                        "path": path,
+                        "length": int(self.headers["Upload-Length"]),
+                        "offset": 0,
+                    }
+                self._reply(201, {"Location": f"{self.path}/{upload_id}"})
+
+            def do_HEAD(self):
+                upload = self._upload()
+                if not upload:
+                    return self._reply(404)
+                self._reply(
+                    200,
+                    {
+                        "Upload-Offset": str(upload["offset"]),
+                        "Upload-Length": str(upload["length"]),
+                        "Cache-Control": "no-store",
+                    },
+                )
+
+            def do_PATCH(self):
+                upload = self._upload()
+                if not upload:
+                    return self._reply(404)
+                if int(self.headers["Upload-Offset"]) != upload["offset"]:
+                    return self._reply(409)
+                data = self.rfile.read(int(self.headers["Content-Length"]))
+                with server._lock:
+                    server.patches += 1
+                    fail = server.fail_every and server.patches % server.fail_every == 0
+                if fail:
+                    # Keep a partial chunk, as a dropped connection would
+                    data = data[: len(data) // 2]
+                with open(upload["path"], "ab") as f:
+                    f.write(data)
+                upload["offset"] += len(data)
+                if fail:
+                    return self._reply(503)
+                self._reply(204, {"Upload-Offset": str(upload["offset"])})
+
+        return Handler
@@ -0,0 +1,239 @@
+import time
+import logging
+import threading
+from typing import Any, Callable, Dict, Optional
+
+from .db import update_source_status
+
+_stats_lock = threading.Lock()
+_stats = {
+    "updates": 0,
+    "progress_updates": 0,
+    "writes": 0,
+    "failed_writes": 0,
+    "write_seconds": 0.0,
+}
+
+
+# Cleared once PostgREST reports sources.progress missing (a database not
+# migrated yet, see db/seed.sql); progress then only goes to events
+_progress_column = True
+
+
+def _missing_progress_column(error: Exception) -> bool:
+    """PGRST204 (not in the schema cache) or Postgres 42703 on progress."""
+    text = str(error)
+    return "progress" in text and any(
+        code in text for code in ("PGRST204", "42703", "does not exist")
+    )
+
+
+def stats() -> Dict[str, float]:
+    """Status updates requested vs. rows actually written, for this process."""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def _count(**values):
+    with _stats_lock:
+        for name, value in values.items():
+            _stats[name] += value
+
+
+class StatusEmitter:
+    """
+    Write-behind status updates for one source row.
+
+    update() and progress() only merge fields into a pending dict and return;
+    a background thread writes the merged row with update_source_status, at
+    most once per `interval` seconds after a status change and once per
+    `progress_interval` seconds for progress alone. Bursts of updates between
+    two writes become one write, and the processing thread never waits on
+    PostgREST.
+
+    `progress` is the completion (0-100) of the current status: every task
+    reporting progress (e.g. the HLS encode and the transcription) is weighted
+    equally, and a new status starts again at 0 ("completed" at 100).
+
+    flush() writes whatever is pending from the calling thread and raises on
+    failure, so final states ("completed") are durable before the job is
+    acked. With supabase=None (dry runs) nothing is written.
+
+    With an `events` callback (type, data), every status change and stage
+    transition is also published as an event, as is progress, at most once
+    per `event_interval` seconds per task (see core/events.py).
+    """
+
+    def __init__(
+        self,
+        supabase,
+        video_id: str,
+        interval: float = 1.0,
+        progress_interval: float = 5.0,
+        events: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+        event_interval: float = 0.5,
+    ):
+        self.supabase = supabase
+        self.video_id = video_id
+        self.interval = interval
+        self.progress_interval = progress_interval
+        self.events = events
+        self.event_interval = event_interval
+        self._event_times: Dict[str, float] = {}
+        self.status: Optional[str] = None
+        self._pending: Dict[str, Any] = {}
+        self._status_changed = False
+        self._parts: Dict[str, float] = {}
+        self._last_write = 0.0
+        self._closed = False
+        self._cond = threading.Condition()
+        # Held while a write is in flight so writes land in order
+        self._write_lock = threading.Lock()
+        self._thread = None
+        if supabase is not None:
+            self._thread = threading.Thread(
+                target=self._run, name=f"status-{video_id}", daemon=True
+            )
+            self._thread.start()
+
+    def update(self, status: str, extra_data: Optional[Dict[str, Any]] = None):
+        """Queue a status (and other columns) for the next write."""
+        _count(updates=1)
+        with self._cond:
+            changed = status != self.status
+            if changed:
+                self.status = status
+                self._status_changed = True
+                self._parts.clear()
+                self._event_times.clear()
+                self._pending["progress"] = 100.0 if status == "completed" else 0.0
+            if extra_data:
+                self._pending.update(extra_data)
+            self._pending["status"] = status
+            self._cond.notify()
+        if changed:
+            self._emit("status", {"status": status})
+
+    def progress(self, task: str, fraction: float):
+        """Report a task's completion (0..1) within the current status."""
+        with self._cond:
+            if self.status is None:
+                # Nothing to attach it to until the first update()
+                return
+            self._parts[task] = min(1.0, max(0.0, fraction))
+            value = round(100.0 * sum(self._parts.values()) / len(self._parts), 1)
+            if value == self._pending.get("progress"):
+                return
+            _count(progress_updates=1)
+            if _progress_column:
+                self._pending["progress"] = value
+                self._cond.notify()
+            now = time.monotonic()
+            due = self._event_times.get(task, 0.0) + self.event_interval
+            if self.events is None or (now < due and fraction < 1.0):
+                return
+            self._event_times[task] = now
+            status = self.status
+        self._emit(
+            "progress",
+            {
+                "status": status,
+                "task": task,
+                "fraction": round(fraction, 4),
+                "progress": value,
+            },
+        )
+
+    def stage(self, name: str, state: str, seconds: Optional[float] = None):
+        """Publish a pipeline stage transition (started, finished, ...)."""
+        data = {"stage": name, "state": state}
+        if seconds is not None:
+            data["seconds"] = round(seconds, 3)
+        self._emit("stage", data)
+
+    def _emit(self, type: str, data: Dict[str, Any]):
+        if self.events is not None:
+            self.events(type, data)
+
+    def flush(self):
+        """Write pending fields now; raises if the write fails."""
+        if self.supabase is None:
+            return
+        with self._write_lock:
+            with self._cond:
+                data = self._take()
+            if data:
+                self._write(data)
+
+    def close(self):
+        """Stop the writer after a last flush; failures are only logged."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        if self._thread:
+            self._thread.join()
+        try:
+            self.flush()
+        except Exception as e:
+            logging.warning(f"Final status write for {self.video_id} failed: {e}")
+
+    def _take(self) -> Dict[str, Any]:
+        data, self._pending = self._pending, {}
+        self._status_changed = False
+        if data and self.status is not None:
+            data.setdefault("status", self.status)
+        return data
+
+    def _write(self, data: Dict[str, Any]):
+        global _progress_column
+        started = time.perf_counter()
+        try:
+            fields = dict(data)
+            status = fields.pop("status")
+            if not _progress_column:
+                fields.pop("progress", None)
+            try:
+                update_source_status(self.supabase, self.video_id, status, fields)
+            except Exception as e:
+                if "progress" not in fields or not _missing_progress_column(e):
+                    raise
+                logging.warning(
+                    "sources.progress does not exist (see db/seed.sql); "
+                    "writing status without progress"
+                )
+                _progress_column = False
+                fields.pop("progress")
+                update_source_status(self.supabase, self.video_id, status, fields)
+        except Exception:
+            _count(failed_writes=1)
+            with self._cond:
+                # Keep the fields for the next attempt, unless superseded
+                self._pending = {**data, **self._pending}
+                self._status_changed = True
+            raise
+        finally:
+            with self._cond:
+                self._last_write = time.monotonic()
+        _count(writes=1, write_seconds=time.perf_counter() - started)
+
+    def _due_in(self) -> Optional[float]:
+        """Seconds until the pending fields should be written (None: idle)."""
+        if not self._pending:
+            return None
+        interval = self.interval if self._status_changed else self.progress_interval
+        return self._last_write + interval - time.monotonic()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._closed:
+                    due = self._due_in()
+                    if due is not None and due <= 0:
+                        break
+                    self._cond.wait(due)
+                if self._closed:
+                    return
+            try:
+                self.flush()
+            except Exception as e:
+                logging.warning(f"Status write for {self.video_id} failed: {e}")
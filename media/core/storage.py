@@ -1,109 +1,533 @@
 import os
+import json
+import time
+import random
+import hashlib
+import threading
+import posixpath
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from supabase import Client
+from typing import Callable, Dict, List, Optional, Set, Tuple, Union
+from .backends import StorageBackend
 from .db import BUCKET_SOURCES
+from .hls import MEDIA_PLAYLIST, rebase_playlist
+from .resumable import ResumableUploader
+from . import metrics
 
+CONTENT_TYPES = {
+    ".m3u8": "application/vnd.apple.mpegurl",  # or application/x-mpegURL
+    ".ts": "video/MP2T",
+    ".vtt": "text/vtt",
+    ".json": "application/json",
+    ".png": "image/png",
+    ".txt": "text/plain",
+    ".mp4": "video/mp4",
+    ".wav": "audio/wav",
+}
 
-def upload_directory_to_supabase(
-    supabase: Client, bucket_name: str, local_dir: Path, storage_prefix: str
+
+# Per-prefix record of uploaded artifacts (relative path -> size, sha256)
+ARTIFACT_MANIFEST = "manifest.json"
+MANIFEST_VERSION = 1
+
+
+def content_type_for(path) -> str:
+    """Content type for an artifact, by file extension."""
+    return CONTENT_TYPES.get(Path(path).suffix, "application/octet-stream")
+
+
+def _retryable(error: Exception) -> bool:
+    # Client errors (bad path, auth, ...) won't succeed on retry
+    status = getattr(error, "status", None)
+    try:
+        status = int(status)
+    except (TypeError, ValueError):
+        return True
+    return not (400 <= status < 500) or status in (408, 429)
+
+
+def upload_with_retry(
+    storage: StorageBackend,
+    bucket_name: str,
+    storage_path: str,
+    data: Union[Path, bytes],
+    content_type: str,
+    cache_control: Optional[str] = None,
+    retries: int = 3,
+    backoff: float = 0.5,
 ):
-    """Recursively upload directory contents to Supabase Storage."""
+    """
+    Store a local path or bytes through the storage backend, retrying
+    transient failures with exponential backoff and full jitter.
+    """
+    for attempt in range(retries + 1):
+        try:
+            return storage.put(
+                bucket_name, storage_path, data, content_type, cache_control
+            )
+        except Exception as e:
+            if attempt == retries or not _retryable(e):
+                raise
+            metrics.inc("media_upload_retries_total")
+            time.sleep(random.uniform(0, backoff * 2**attempt))
+
+
+@dataclass
+class UploadResult:
+    uploaded: List[str] = field(default_factory=list)
+    failed: Dict[str, str] = field(default_factory=dict)  # storage path -> error
+    unchanged: int = 0  # skipped because the remote manifest matches
+    deleted: List[str] = field(default_factory=list)
+    bytes: int = 0
+    seconds: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return not self.failed
+
+    def summary(self) -> str:
+        seconds = max(self.seconds, 1e-6)
+        mb = self.bytes / (1024 * 1024)
+        return (
+            f"{len(self.uploaded)} files ({mb:.1f} MB) in {self.seconds:.1f}s: "
+            f"{len(self.uploaded) / seconds:.1f} files/s, {mb / seconds:.1f} MB/s, "
+            f"{self.unchanged} unchanged, {len(self.deleted)} deleted, "
+            f"{len(self.failed)} failed"
+        )
+
+    def raise_for_failures(self):
+        if self.failed:
+            details = "; ".join(f"{k}: {v}" for k, v in list(self.failed.items())[:5])
+            raise UploadError(f"{len(self.failed)} uploads failed ({details})", self)
+
+
+class UploadError(Exception):
+    def __init__(self, message: str, result: UploadResult):
+        super().__init__(message)
+        self.result = result
+
+
+def upload_files(
+    storage: StorageBackend,
+    bucket_name: str,
+    files: List[Tuple[Union[Path, bytes], str]],
+    workers: int = 8,
+    retries: int = 3,
+    result: UploadResult = None,
+    resumable: Optional[ResumableUploader] = None,
+    on_bytes: Optional[Callable[[int], None]] = None,
+) -> UploadResult:
+    """
+    Upload (local path or bytes, storage path) pairs on a bounded thread pool. All
+    threads share the backend, so requests reuse its keep-alive connection
+    pool. Files of at least resumable.threshold bytes
+    go through the resumable (chunked) endpoint instead. Failures are
+    collected, not raised. on_bytes(n) is called from the upload threads as
+    files (or resumable chunks) complete.
+    """
+    result = result or UploadResult()
+    started = time.perf_counter()
+
+    def upload(item: Tuple[Union[Path, bytes], str]):
+        source, storage_path = item
+        content_type = content_type_for(storage_path)
+        try:
+            size = _size(source)
+            if resumable and isinstance(source, Path) and size >= resumable.threshold:
+                resumable.upload(
+                    source, bucket_name, storage_path, content_type, on_bytes=on_bytes
+                )
+            else:
+                upload_with_retry(
+                    storage,
+                    bucket_name,
+                    storage_path,
+                    source,
+                    content_type,
+                    retries=retries,
+                )
+                if on_bytes:
+                    on_bytes(size)
+            return storage_path, size, None
+        except Exception as e:
+            return storage_path, 0, str(e)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for storage_path, size, error in pool.map(upload, files):
+            if error is None:
+                result.uploaded.append(storage_path)
+                result.bytes += size
+                metrics.inc("media_uploaded_files_total", result="ok")
+                metrics.inc("media_bytes_total", size, direction="out", kind="storage")
+            else:
+                result.failed[storage_path] = error
+                metrics.inc("media_uploaded_files_total", result="error")
+    result.seconds += time.perf_counter() - started
+    return result
+
+
+def _size(source: Union[Path, bytes]) -> int:
+    return len(source) if isinstance(source, bytes) else source.stat().st_size
+
+
+def file_sha256(source: Union[Path, bytes]) -> str:
+    if isinstance(source, bytes):
+        return hashlib.sha256(source).hexdigest()
+    digest = hashlib.sha256()
+    with open(source, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def hash_files(files: Dict[str, Union[Path, bytes]], workers: int = 8) -> Dict:
+    """{relative path: sha256} for {relative path: local path or bytes}."""
+    names = sorted(files)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        digests = list(pool.map(lambda name: file_sha256(files[name]), names))
+    return dict(zip(names, digests))
+
+
+def build_manifest(
+    files: Dict[str, Union[Path, bytes]],
+    workers: int = 8,
+    known: Optional[Dict[str, str]] = None,
+) -> Dict:
+    """Manifest for {relative path: local path or bytes}, hashed concurrently.
+    Digests in known ({relative path: sha256}) are reused, not recomputed."""
+    digests = {name: known[name] for name in files if known and name in known}
+    digests.update(
+        hash_files(
+            {name: source for name, source in files.items() if name not in digests},
+            workers,
+        )
+    )
+    return {
+        "version": MANIFEST_VERSION,
+        "files": {
+            name: {"size": _size(files[name]), "sha256": digests[name]}
+            for name in sorted(files)
+        },
+    }
+
+
+def hls_base_url(
+    storage: StorageBackend,
+    bucket_name: str,
+    storage_prefix: str,
+    template: Optional[str] = None,
+) -> str:
+    """
+    Base URL playlists reference segments and variant playlists by. template
+    (HLS_BASE_URL_TEMPLATE, e.g. "https://cdn.example.com/{prefix}/hls") may
+    use {supabase_url} (the backend's endpoint), {bucket}, {prefix},
+    {profile_id} and {video_id}; without one it is the bucket's public URL
+    for {prefix}/hls.
+    """
+    if template:
+        profile_id, _, video_id = storage_prefix.partition("/")
+        return template.format(
+            supabase_url=storage.endpoint,
+            bucket=bucket_name,
+            prefix=storage_prefix,
+            profile_id=profile_id,
+            video_id=video_id,
+        ).rstrip("/")
+    # On Supabase: {supabase_url}/storage/v1/object/public/{bucket}/{prefix}/hls
+    return storage.public_url(
+        bucket_name, f"{storage_prefix}/hls/{MEDIA_PLAYLIST}"
+    ).rsplit("/", 1)[0]
+
+
+def rebase_local_playlist(path: Path, hls_dir: Path, base_url: str) -> bytes:
+    """A local playlist under hls_dir with every reference made absolute."""
+    playlist_dir = path.parent.relative_to(hls_dir).as_posix()
+    content = path.read_text(encoding="utf-8")
+    rebased = rebase_playlist(
+        content, "" if playlist_dir == "." else playlist_dir, base_url
+    )
+    return rebased.encode("utf-8")
+
+
+def fetch_manifest(
+    storage: StorageBackend, bucket_name: str, storage_prefix: str
+) -> Dict:
+    """The prefix's remote manifest, or an empty one if there is none."""
+    try:
+        data = storage.get(bucket_name, f"{storage_prefix}/{ARTIFACT_MANIFEST}")
+        manifest = json.loads(data)
+        if manifest.get("version") == MANIFEST_VERSION:
+            return manifest
+    except Exception:
+        pass
+    return {"version": MANIFEST_VERSION, "files": {}}
+
+
+def upload_directory(
+    storage: StorageBackend,
+    bucket_name: str,
+    local_dir: Path,
+    storage_prefix: str,
+    exclude: Set[str] = frozenset(),
+    workers: int = 8,
+    retries: int = 3,
+    resumable: Optional[ResumableUploader] = None,
+    uploaded: Set[str] = frozenset(),
+    incremental: bool = True,
+    playlist_base_url: Optional[str] = None,
+    on_progress: Optional[Callable[[float], None]] = None,
+    known_hashes: Optional[Dict[str, str]] = None,
+) -> UploadResult:
+    """Recursively upload directory contents to the storage backend.
+    Paths (relative to local_dir) listed in exclude are skipped; paths in
+    uploaded are already in storage (progressive publishing) and only
+    recorded. Files go up concurrently; playlists only after every other file
+    succeeded, so none is visible before the segments it lists. With
+    playlist_base_url, playlists under hls/ are rewritten to absolute URLs in
+    memory and uploaded once, already in their final form.
+
+    With incremental, the prefix's manifest.json (size and sha256 per
+    artifact) is diffed against the local files: only changed files are sent,
+    objects the previous manifest lists but that no longer exist locally are
+    deleted, and the new manifest is written last. Only files whose size
+    matches their remote entry are hashed before the upload; the rest are
+    changed either way and hashed once it succeeded. known_hashes
+    ({relative path: sha256}, e.g. the source video hashed on ingest) are
+    reused instead of reading the file again. on_progress receives the
+    fraction of bytes to send that have been sent. Returns the aggregated
+    result."""
     print(f"Uploading {local_dir} to {bucket_name}/{storage_prefix}...")
 
     # Convert to Path object if string
     local_dir = Path(local_dir)
 
-    for file_path in local_dir.rglob("*"):
+    local_files = {}
+    for file_path in sorted(local_dir.rglob("*")):
         if file_path.is_file():
-            relative_path = file_path.relative_to(local_dir)
-            storage_path = f"{storage_prefix}/{relative_path}"
-
-            # Determine content type
-            content_type = "application/octet-stream"
-            if file_path.suffix == ".m3u8":
-                content_type = (
-                    "application/vnd.apple.mpegurl"  # or application/x-mpegURL
+            relative_path = file_path.relative_to(local_dir).as_posix()
+            if relative_path in exclude or relative_path == ARTIFACT_MANIFEST:
+                continue
+            if (
+                playlist_base_url
+                and relative_path.startswith("hls/")
+                and file_path.suffix == ".m3u8"
+            ):
+                local_files[relative_path] = rebase_local_playlist(
+                    file_path, local_dir / "hls", playlist_base_url
                 )
-            elif file_path.suffix == ".ts":
-                content_type = "video/MP2T"
-            elif file_path.suffix == ".vtt":
-                content_type = "text/vtt"
-            elif file_path.suffix == ".json":
-                content_type = "application/json"
-            elif file_path.suffix == ".png":
-                content_type = "image/png"
-            elif file_path.suffix == ".txt":
-                content_type = "text/plain"
-            elif file_path.suffix == ".mp4":
-                content_type = "video/mp4"
-            elif file_path.suffix == ".wav":
-                content_type = "audio/wav"
-
-            try:
-                with open(file_path, "rb") as f:
-                    supabase.storage.from_(bucket_name).upload(
-                        storage_path,
-                        f,
-                        file_options={"content-type": content_type, "upsert": "true"},
-                    )
-            except Exception as e:
-                print(f"Failed to upload {file_path}: {e}")
+            else:
+                local_files[relative_path] = file_path
 
+    result = UploadResult()
+    manifest = remote = hashes = None
+    if incremental:
+        remote = fetch_manifest(storage, bucket_name, storage_prefix)["files"]
+        sizes = {name: _size(source) for name, source in local_files.items()}
+        hashes = {
+            name: digest
+            for name, digest in (known_hashes or {}).items()
+            if name in local_files
+        }
+        hashes.update(
+            hash_files(
+                {
+                    name: source
+                    for name, source in local_files.items()
+                    if name not in hashes
+                    and remote.get(name, {}).get("size") == sizes[name]
+                },
+                workers,
+            )
+        )
 
-def fix_hls_playlist_with_absolute_urls(
-    supabase: Client, profile_id: str, video_id: str
+    files, playlists = [], []
+    for relative_path, source in local_files.items():
+        if relative_path in uploaded:
+            continue
+        if hashes is not None and remote.get(relative_path) == {
+            "size": sizes[relative_path],
+            "sha256": hashes.get(relative_path),
+        }:
+            result.unchanged += 1
+            continue
+        storage_path = f"{storage_prefix}/{relative_path}"
+        target = playlists if relative_path.endswith(".m3u8") else files
+        target.append((source, storage_path))
+
+    if on_progress:
+        total = sum(_size(source) for source, _ in files + playlists) or 1
+        sent = [0]
+        lock = threading.Lock()
+
+        def _report(n: int):
+            with lock:
+                sent[0] += n
+                fraction = sent[0] / total
+            on_progress(min(1.0, fraction))
+
+        on_bytes = _report
+    else:
+        on_bytes = None
+
+    upload_files(
+        storage,
+        bucket_name,
+        files,
+        workers,
+        retries,
+        result,
+        resumable=resumable,
+        on_bytes=on_bytes,
+    )
+    if result.ok:
+        upload_files(
+            storage,
+            bucket_name,
+            playlists,
+            workers,
+            retries,
+            result,
+            on_bytes=on_bytes,
+        )
+    else:
+        for _, storage_path in playlists:
+            result.failed[storage_path] = "skipped: segment uploads failed"
+
+    if hashes is not None and result.ok:
+        manifest = build_manifest(local_files, workers, known=hashes)
+    if manifest:
+        _delete_removed(storage, bucket_name, storage_prefix, remote, manifest, result)
+    if manifest:
+        try:
+            upload_with_retry(
+                storage,
+                bucket_name,
+                f"{storage_prefix}/{ARTIFACT_MANIFEST}",
+                json.dumps(manifest, indent=1).encode("utf-8"),
+                content_type_for(ARTIFACT_MANIFEST),
+                "0",
+                retries,
+            )
+        except Exception as e:
+            result.failed[f"{storage_prefix}/{ARTIFACT_MANIFEST}"] = str(e)
+
+    print(f"Uploaded {result.summary()}")
+    for storage_path, error in result.failed.items():
+        print(f"Failed to upload {storage_path}: {error}")
+    return result
+
+
+def _delete_removed(
+    storage: StorageBackend,
+    bucket_name: str,
+    storage_prefix: str,
+    remote: Dict,
+    manifest: Dict,
+    result: UploadResult,
 ):
+    """Remove objects the previous manifest lists that are gone locally."""
+    removed = [
+        f"{storage_prefix}/{name}"
+        for name in sorted(remote)
+        if name not in manifest["files"]
+    ]
+    for i in range(0, len(removed), 1000):
+        batch = removed[i : i + 1000]
+        try:
+            storage.delete(bucket_name, batch)
+            result.deleted.extend(batch)
+        except Exception as e:
+            for storage_path in batch:
+                result.failed[storage_path] = f"delete failed: {e}"
+
+
+def copy_storage_prefix(
+    storage: StorageBackend, bucket_name: str, src_prefix: str, dst_prefix: str
+) -> Tuple[List[str], Dict[str, str]]:
     """
-    Fix HLS playlist by rewriting segment references with absolute public URLs.
-    This is necessary because the player might not handle relative paths correctly
-    if the m3u8 is served from a different context or if we want to be explicit.
+    Server-side copy of every object under src_prefix to dst_prefix.
+    Returns the destination paths copied and the source paths that failed
+    (with the error). The manifest goes last, so it is only there if
+    everything it lists is.
     """
-    bucket_name = BUCKET_SOURCES
-    storage_prefix = f"{profile_id}/{video_id}"
-    playlist_path_storage = f"{storage_prefix}/hls/playlist.m3u8"
+    manifest = f"{src_prefix}/{ARTIFACT_MANIFEST}"
+    src_paths = storage.list(bucket_name, src_prefix)
+    src_paths.sort(key=lambda path: path == manifest)
+    copied: List[str] = []
+    failed: Dict[str, str] = {}
+    for src_path in src_paths:
+        if src_path == manifest and failed:
+            failed[src_path] = "skipped: other objects failed to copy"
+            continue
+        dst_path = dst_prefix + src_path[len(src_prefix) :]
+        try:
+            storage.copy(bucket_name, src_path, dst_path)
+            copied.append(dst_path)
+        except Exception as e:
+            failed[src_path] = str(e)
+    return copied, failed
 
-    try:
-        # Download existing playlist
-        data = supabase.storage.from_(bucket_name).download(playlist_path_storage)
-        content = data.decode("utf-8")
 
-        # Get public URL base
-        # The public URL for a file is usually:
-        # {supabase_url}/storage/v1/object/public/{bucket}/{path}
-        # We need the path to the HLS folder
-
-        # Supabase python client doesn't always give the full public URL easily for a folder
-        # We construct it manually or use get_public_url for a dummy file
+def rebase_stored_playlists(
+    storage: StorageBackend,
+    bucket_name: str,
+    storage_prefix: str,
+    base_url: str,
+    dry_run: bool = False,
+) -> Tuple[int, int]:
+    """
+    Rewrite every playlist under {storage_prefix}/hls in storage so it
+    references base_url. Playlists that already do are left alone. Returns
+    (playlists found, playlists changed); with dry_run nothing is uploaded.
+    """
+    hls_prefix = f"{storage_prefix}/hls"
+    playlists = [
+        path for path in storage.list(bucket_name, hls_prefix) if path.endswith(".m3u8")
+    ]
+    changed = 0
+    for playlist_path_storage in playlists:
+        content = storage.get(bucket_name, playlist_path_storage).decode("utf-8")
+        playlist_dir = posixpath.dirname(playlist_path_storage[len(hls_prefix) + 1 :])
+        new_content = rebase_playlist(content, playlist_dir, base_url)
+        if new_content == content:
+            continue
+        changed += 1
+        if not dry_run:
+            upload_with_retry(
+                storage,
+                bucket_name,
+                playlist_path_storage,
+                new_content.encode("utf-8"),
+                CONTENT_TYPES[".m3u8"],
+            )
+    return len(playlists), changed
 
-        # Let's construct the base URL for the segments
-        # segments are in .../hls/segmentXXX.ts
 
-        # We can get the public URL for the playlist itself and strip the filename
-        playlist_public_url = supabase.storage.from_(bucket_name).get_public_url(
-            playlist_path_storage
-        )
-        base_url = playlist_public_url.rsplit("/", 1)[0]
+def fix_hls_playlist_with_absolute_urls(
+    storage: StorageBackend,
+    profile_id: str,
+    video_id: str,
+    template: Optional[str] = None,
+):
+    """
+    Fix HLS playlists by rewriting segment and variant references with
+    absolute public URLs. This is necessary because the player might not handle
+    relative paths correctly if the m3u8 is served from a different context or
+    if we want to be explicit. Handles both the single-rendition layout
+    (hls/playlist.m3u8) and the ladder layout (hls/master.m3u8, its copy at
+    hls/playlist.m3u8 and hls/{rendition}/playlist.m3u8).
 
-        new_lines = []
-        for line in content.splitlines():
-            if line.endswith(".ts") and not line.startswith("http"):
-                # It's a relative segment path
-                new_lines.append(f"{base_url}/{line}")
-            else:
-                new_lines.append(line)
-
-        new_content = "\n".join(new_lines)
-
-        # Upload back
-        supabase.storage.from_(bucket_name).upload(
-            playlist_path_storage,
-            new_content.encode("utf-8"),
-            file_options={
-                "content-type": "application/vnd.apple.mpegurl",
-                "upsert": "true",
-            },
+    New uploads are rewritten before they are sent (playlist_base_url); this
+    is for playlists already in storage, e.g. ones copied from another prefix.
+    """
+    storage_prefix = f"{profile_id}/{video_id}"
+    try:
+        base_url = hls_base_url(storage, BUCKET_SOURCES, storage_prefix, template)
+        found, changed = rebase_stored_playlists(
+            storage, BUCKET_SOURCES, storage_prefix, base_url
         )
-        print("Fixed HLS playlist with absolute URLs.")
+        print(f"Fixed {changed} of {found} HLS playlist(s) with absolute URLs.")
 
     except Exception as e:
         print(f"Error fixing HLS playlist: {e}")
@@ -0,0 +1,329 @@
+import os
+import json
+import time
+import wave
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from vosk import Model, KaldiRecognizer
+
+# Process-wide defaults, see configure()
+_model_path = "model"
+_pool_size = 2
+
+_lock = threading.Lock()
+_resolved_paths: Dict[str, str] = {}
+_models: Dict[str, Model] = {}
+_pools: Dict[str, "RecognizerPool"] = {}
+_stats = {
+    "model_loads": 0,
+    "model_load_seconds": 0.0,
+    "recognizer_acquires": 0,
+    "recognizer_wait_seconds": 0.0,
+    "recognizer_wait_max_seconds": 0.0,
+}
+
+
+def configure(model_path: Optional[str] = None, pool_size: Optional[int] = None):
+    """Set the default model path and recognizer pool size for this process."""
+    global _model_path, _pool_size
+    with _lock:
+        if model_path:
+            _model_path = model_path
+        if pool_size:
+            _pool_size = max(1, int(pool_size))
+
+
+def resolve_model_path(model_path: Optional[str] = None) -> str:
+    """Find the Vosk model directory, trying common locations (cached)."""
+    model_path = model_path or _model_path
+    if model_path in _resolved_paths:
+        return _resolved_paths[model_path]
+
+    resolved = None
+    if os.path.exists(model_path):
+        resolved = model_path
+    else:
+        # Try looking in parent directories or common locations
+        for c in ["model", "../model", "media/model"]:
+            if os.path.exists(c):
+                resolved = c
+                break
+    if not resolved:
+        raise FileNotFoundError(f"Vosk model not found at {model_path}")
+
+    _resolved_paths[model_path] = os.path.abspath(resolved)
+    return _resolved_paths[model_path]
+
+
+def get_model(model_path: Optional[str] = None) -> Model:
+    """Load the Vosk model once per process and return the shared instance."""
+    path = resolve_model_path(model_path)
+    model = _models.get(path)
+    if model is not None:
+        return model
+
+    with _lock:
+        if path not in _models:
+            logging.info(f"Loading Vosk model from {path}...")
+            started = time.perf_counter()
+            _models[path] = Model(path)
+            elapsed = time.perf_counter() - started
+            _stats["model_loads"] += 1
+            _stats["model_load_seconds"] += elapsed
+            logging.info(f"Loaded Vosk model in {elapsed:.2f}s")
+        return _models[path]
+
+
+def preload(model_path: Optional[str] = None):
+    """
+    Load the model ahead of the first job. Called in the parent before
+    forking workers, the model pages are shared copy-on-write.
+    """
+    try:
+        get_model(model_path)
+    except Exception as e:
+        logging.warning(f"Could not preload Vosk model: {e}")
+
+
+class RecognizerPool:
+    """
+    Bounded pool of KaldiRecognizers sharing one model. Recognizers are reset
+    and reused between transcriptions; at most `size` are in use at once.
+    """
+
+    def __init__(self, model: Model, size: int):
+        self.model = model
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle: Dict[int, List[KaldiRecognizer]] = {}
+        self._idle_lock = threading.Lock()
+
+    @contextmanager
+    def acquire(self, sample_rate: int):
+        started = time.perf_counter()
+        self._slots.acquire()
+        waited = time.perf_counter() - started
+        with _lock:
+            _stats["recognizer_acquires"] += 1
+            _stats["recognizer_wait_seconds"] += waited
+            _stats["recognizer_wait_max_seconds"] = max(
+                _stats["recognizer_wait_max_seconds"], waited
+            )
+
+        try:
+            with self._idle_lock:
+                idle = self._idle.setdefault(int(sample_rate), [])
+                rec = idle.pop() if idle else None
+            if rec is None:
+                rec = KaldiRecognizer(self.model, sample_rate)
+            rec.SetWords(True)
+            try:
+                yield rec
+            finally:
+                rec.Reset()
+                with self._idle_lock:
+                    self._idle[int(sample_rate)].append(rec)
+        finally:
+            self._slots.release()
+
+
+def recognizer(sample_rate: int, model_path: Optional[str] = None):
+    """Borrow a recognizer from the process-wide pool (context manager)."""
+    model = get_model(model_path)
+    path = resolve_model_path(model_path)
+    with _lock:
+        pool = _pools.get(path)
+        if pool is None:
+            pool = _pools[path] = RecognizerPool(model, _pool_size)
+    return pool.acquire(sample_rate)
+
+
+def stats() -> Dict[str, float]:
+    """Model load and recognizer wait counters for this process."""
+    with _lock:
+        return dict(_stats)
+
+
+# --- Parallel chunked transcription ---
+
+_chunk_pool: Optional[ProcessPoolExecutor] = None
+_chunk_pool_workers = 0
+
+
+def _init_chunk_worker(model_path: str, pool_size: int):
+    configure(model_path, pool_size)
+    preload()
+
+
+def _chunk_executor(workers: int) -> ProcessPoolExecutor:
+    """Long-lived pool so each chunk worker loads the model only once."""
+    global _chunk_pool, _chunk_pool_workers
+    with _lock:
+        if _chunk_pool is None or _chunk_pool_workers != workers:
+            if _chunk_pool is not None:
+                _chunk_pool.shutdown(wait=False)
+            _chunk_pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_chunk_worker,
+                initargs=(_model_path, 1),
+            )
+            _chunk_pool_workers = workers
+        return _chunk_pool
+
+
+def window_energies(wav_file: str, window_frames: int) -> Tuple[np.ndarray, int, int]:
+    """
+    RMS energy per window of a 16-bit mono WAV, read in blocks so memory stays
+    bounded. Returns (energies, sample_rate, total_frames).
+    """
+    energies = []
+    with wave.open(wav_file, "rb") as wf:
+        rate, total = wf.getframerate(), wf.getnframes()
+        while True:
+            data = wf.readframes(window_frames * 1024)
+            if not data:
+                break
+            samples = np.frombuffer(data, dtype=np.int16).astype(np.float32)
+            usable = len(samples) // window_frames * window_frames
+            if usable:
+                blocks = samples[:usable].reshape(-1, window_frames)
+                energies.append(np.sqrt(np.mean(blocks**2, axis=1)))
+    if not energies:
+        return np.zeros(0, dtype=np.float32), rate, total
+    return np.concatenate(energies), rate, total
+
+
+def find_silence_splits(
+    energies: np.ndarray,
+    window_frames: int,
+    total_frames: int,
+    chunks: int,
+    search_windows: int,
+) -> List[int]:
+    """
+    Frame offsets splitting the audio into `chunks` parts, each moved to the
+    quietest window within +-search_windows of the even split point.
+    """
+    splits = []
+    for k in range(1, chunks):
+        center = int(total_frames * k / chunks) // window_frames
+        lo = max(0, center - search_windows)
+        hi = min(len(energies), center + search_windows + 1)
+        if hi <= lo:
+            continue
+        quietest = lo + int(np.argmin(energies[lo:hi]))
+        split = quietest * window_frames + window_frames // 2
+        if not splits or split > splits[-1]:
+            splits.append(split)
+    return splits
+
+
+def _transcribe_range(wav_file: str, start: int, end: int) -> List[Dict]:
+    """Transcribe frames [start, end) and return words on the file's timeline."""
+    words = []
+    with wave.open(wav_file, "rb") as wf:
+        rate = wf.getframerate()
+        wf.setpos(start)
+        remaining = end - start
+        with recognizer(rate) as rec:
+            while remaining > 0:
+                data = wf.readframes(min(4000, remaining))
+                if not data:
+                    break
+                remaining -= len(data) // wf.getsampwidth()
+                if rec.AcceptWaveform(data):
+                    words.extend(json.loads(rec.Result()).get("result", []))
+            words.extend(json.loads(rec.FinalResult()).get("result", []))
+
+    offset = start / rate
+    for word in words:
+        word["start"] += offset
+        word["end"] += offset
+        if "word" in word:
+            word["text"] = word.pop("word")
+    return words
+
+
+def transcribe_parallel(
+    wav_file: str,
+    workers: int,
+    min_chunk_seconds: float = 300.0,
+    overlap_seconds: float = 1.0,
+    search_seconds: float = 30.0,
+    on_progress: Optional[Callable[[float], None]] = None,
+) -> List[Dict]:
+    """
+    Split a 16kHz mono WAV at silences into up to `workers` chunks, transcribe
+    them on a process pool and merge the words with offset-corrected
+    timestamps. Chunks overlap by overlap_seconds so words at a boundary are
+    fully heard; each word is kept only by the chunk its midpoint falls in.
+    Output matches transcribe_vosk (list of {"start", "end", "text", ...}).
+    on_progress gets the fraction of audio in finished chunks.
+    """
+    window_frames = 1600  # 100ms at 16kHz
+    energies, rate, total = window_energies(wav_file, window_frames)
+    duration = total / rate if rate else 0
+    chunks = max(1, min(workers, int(duration // min_chunk_seconds)))
+
+    splits = find_silence_splits(
+        energies,
+        window_frames,
+        total,
+        chunks,
+        int(search_seconds * rate / window_frames),
+    )
+    bounds = [0] + splits + [total]
+    overlap = int(overlap_seconds * rate)
+    logging.info(f"Transcribing {duration:.0f}s in {len(bounds) - 1} parallel chunks")
+
+    started = time.perf_counter()
+    if len(bounds) == 2:
+        results = [_transcribe_range(wav_file, 0, total)]
+        if on_progress:
+            on_progress(1.0)
+    else:
+        pool = _chunk_executor(workers)
+        futures = [
+            pool.submit(
+                _transcribe_range,
+                wav_file,
+                max(0, lo - overlap),
+                min(total, hi + overlap),
+            )
+            for lo, hi in zip(bounds, bounds[1:])
+        ]
+        if on_progress:
+            finished = []
+
+            def chunk_done(future, frames):
+                with _lock:
+                    finished.append(frames)
+                    fraction = sum(finished) / total
+                on_progress(min(1.0, fraction))
+
+            for future, lo, hi in zip(futures, bounds, bounds[1:]):
+                future.add_done_callback(lambda f, n=hi - lo: chunk_done(f, n))
+        results = [f.result() for f in futures]
+
+    merged = []
+    for (lo, hi), words in zip(zip(bounds, bounds[1:]), results):
+        core_start, core_end = lo / rate, hi / rate
+        for word in words:
+            middle = (word["start"] + word["end"]) / 2
+            if core_start <= middle < core_end or (hi == total and middle >= core_end):
+                merged.append(word)
+    merged.sort(key=lambda w: w["start"])
+
+    elapsed = time.perf_counter() - started
+    if elapsed > 0:
+        logging.info(
+            f"Transcribed {duration:.0f}s of audio in {elapsed:.1f}s "
+            f"({duration / elapsed:.1f}x realtime)"
+        )
+    return merged
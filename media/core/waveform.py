@@ -0,0 +1,226 @@
+import json
+import struct
+import numpy as np
+from typing import Dict, List, Optional, Sequence, Tuple
+
+DEFAULT_BUCKETS = 10000
+
+# Level-of-detail pyramid (wave.bin), coarsest first
+DEFAULT_LEVELS = (256, 1024, 4096, 16384, 65536)
+PYRAMID_MAGIC = b"HKSW"
+PYRAMID_VERSION = 1
+# magic, version, bytes per bucket, level count, sample rate, timeline samples
+PYRAMID_HEADER = struct.Struct("<4sBBHIQ")
+# buckets, byte offset of the level's data
+PYRAMID_LEVEL = struct.Struct("<IQ")
+
+
+class PeakAccumulator:
+    """
+    Incremental min/max downsampler for 16-bit PCM.
+
+    Samples are fed chunk by chunk (e.g. straight from an ffmpeg pipe or a WAV
+    read in blocks), so memory stays constant regardless of the audio length.
+    Each chunk is reduced with one vectorized reduceat per bucket boundary set
+    instead of a Python loop per bucket.
+
+    The number of samples must be estimated up front (duration * sample rate).
+    Bucket i covers samples [i * n // buckets, (i + 1) * n // buckets), so no
+    tail is dropped; samples past the estimate fold into the last bucket and
+    buckets never reached stay at zero.
+    """
+
+    def __init__(self, expected_samples: int, buckets: int = DEFAULT_BUCKETS):
+        self.buckets = max(1, int(buckets))
+        self.expected = expected = max(1, int(expected_samples))
+        self.edges = np.arange(self.buckets + 1, dtype=np.int64) * expected
+        self.edges //= self.buckets
+        self.mins = np.full(self.buckets, np.iinfo(np.int16).max, dtype=np.int16)
+        self.maxs = np.full(self.buckets, np.iinfo(np.int16).min, dtype=np.int16)
+        self.filled = np.zeros(self.buckets, dtype=bool)
+        self.position = 0
+
+    def _bucket(self, position: int) -> int:
+        bucket = int(np.searchsorted(self.edges, position, side="right")) - 1
+        return min(bucket, self.buckets - 1)
+
+    def add(self, pcm):
+        """Fold s16le bytes (or an int16 array) into the buckets."""
+        samples = pcm if isinstance(pcm, np.ndarray) else np.frombuffer(pcm, np.int16)
+        count = len(samples)
+        if not count:
+            return
+
+        first = self._bucket(self.position)
+        last = self._bucket(self.position + count - 1)
+        # Chunk-relative offsets where a new bucket starts (empty buckets,
+        # which only exist when there are fewer samples than buckets, collapse)
+        starts = np.unique(self.edges[first + 1 : last + 1]) - self.position
+        offsets = np.concatenate(([0], starts))
+        ids = np.searchsorted(self.edges, offsets + self.position, side="right") - 1
+        ids = np.minimum(ids, self.buckets - 1)
+
+        self.mins[ids] = np.minimum(
+            self.mins[ids], np.minimum.reduceat(samples, offsets)
+        )
+        self.maxs[ids] = np.maximum(
+            self.maxs[ids], np.maximum.reduceat(samples, offsets)
+        )
+        self.filled[ids] = True
+        self.position += count
+
+    def minmax(self) -> Dict[str, List[float]]:
+        """Per-bucket min and max, normalized to [-1, 1]."""
+        if self.position == 0:
+            return {"min": [], "max": []}
+        mins = np.where(self.filled, self.mins, 0) / 32768.0
+        maxs = np.where(self.filled, self.maxs, 0) / 32768.0
+        return {
+            "min": np.round(mins, 4).tolist(),
+            "max": np.round(maxs, 4).tolist(),
+        }
+
+    def result(self) -> List[float]:
+        """Absolute peak per bucket (the wave.json format)."""
+        if self.position == 0:
+            return []
+        peaks = np.maximum(
+            np.abs(self.mins.astype(np.int32)), np.abs(self.maxs.astype(np.int32))
+        )
+        peaks = np.where(self.filled, peaks, 0) / 32768.0
+        return np.round(peaks, 4).tolist()
+
+    def write_json(self, output_json: str, minmax_json: Optional[str] = None):
+        with open(output_json, "w") as f:
+            json.dump(self.result(), f)
+        if minmax_json:
+            with open(minmax_json, "w") as f:
+                json.dump({"buckets": self.buckets, **self.minmax()}, f)
+
+
+def _quantize(values: np.ndarray) -> np.ndarray:
+    """int16 sample values to int8, keeping full scale at +-127."""
+    return np.clip(np.round(values * (127 / 32768.0)), -127, 127).astype(np.int8)
+
+
+def pyramid_levels(
+    peaks: PeakAccumulator, levels: Sequence[int] = DEFAULT_LEVELS
+) -> List[Tuple[int, np.ndarray]]:
+    """
+    Derive each level from the accumulator's buckets, which must be the finest
+    level. Level edges line up with groups of finest buckets (i * n // b), so a
+    coarse bucket is an exact reshape-and-reduce of the fine ones. Returns
+    (buckets, interleaved int8 min/max pairs) per level.
+    """
+    result = []
+    for buckets in levels:
+        if peaks.buckets % buckets:
+            raise ValueError(f"Level {buckets} does not divide {peaks.buckets}")
+        group = peaks.buckets // buckets
+        mins = peaks.mins.reshape(buckets, group).min(axis=1)
+        maxs = peaks.maxs.reshape(buckets, group).max(axis=1)
+        filled = peaks.filled.reshape(buckets, group).any(axis=1)
+        pairs = np.empty((buckets, 2), dtype=np.int8)
+        pairs[:, 0] = np.where(filled, _quantize(mins), 0)
+        pairs[:, 1] = np.where(filled, _quantize(maxs), 0)
+        result.append((buckets, pairs.reshape(-1)))
+    return result
+
+
+def write_pyramid(
+    path: str,
+    peaks: PeakAccumulator,
+    sample_rate: int,
+    levels: Sequence[int] = DEFAULT_LEVELS,
+):
+    """
+    Write the waveform pyramid as one binary file (little-endian):
+
+        header   PYRAMID_HEADER (20 bytes)
+        index    PYRAMID_LEVEL per level (12 bytes each), coarsest first
+        data     per level, `buckets` int8 (min, max) pairs
+
+    Bucket i of a level covers samples [i * n // buckets, (i + 1) * n // buckets)
+    of the n timeline samples in the header, and lives at byte
+    offset + 2 * i, so a client can range-request one level or one time window
+    of it after reading the first 20 + 12 * levels bytes.
+    """
+    data = pyramid_levels(peaks, sorted(levels))
+    offset = PYRAMID_HEADER.size + PYRAMID_LEVEL.size * len(data)
+    index = []
+    for buckets, pairs in data:
+        index.append(PYRAMID_LEVEL.pack(buckets, offset))
+        offset += pairs.nbytes
+
+    with open(path, "wb") as f:
+        f.write(
+            PYRAMID_HEADER.pack(
+                PYRAMID_MAGIC,
+                PYRAMID_VERSION,
+                2,
+                len(data),
+                int(sample_rate),
+                peaks.expected,
+            )
+        )
+        f.writelines(index)
+        for _, pairs in data:
+            f.write(pairs.tobytes())
+
+
+def read_pyramid_index(header: bytes) -> Dict:
+    """Parse the header and level index from the first bytes of a wave.bin."""
+    magic, version, stride, count, rate, samples = PYRAMID_HEADER.unpack_from(header)
+    if magic != PYRAMID_MAGIC or version != PYRAMID_VERSION:
+        raise ValueError("Not a version 1 waveform pyramid")
+    levels = [
+        dict(
+            zip(
+                ("buckets", "offset"),
+                PYRAMID_LEVEL.unpack_from(
+                    header, PYRAMID_HEADER.size + i * PYRAMID_LEVEL.size
+                ),
+            )
+        )
+        for i in range(count)
+    ]
+    return {
+        "bytes_per_bucket": stride,
+        "sample_rate": rate,
+        "samples": samples,
+        "levels": levels,
+    }
+
+
+class WaveformWriter:
+    """
+    Feeds PCM to the wave.json accumulator and the finest pyramid level at
+    once, then writes wave.json, wave_minmax.json and wave.bin as requested.
+    """
+
+    def __init__(
+        self,
+        expected_samples: int,
+        sample_rate: int,
+        buckets: int = DEFAULT_BUCKETS,
+        levels: Sequence[int] = DEFAULT_LEVELS,
+    ):
+        self.sample_rate = sample_rate
+        self.levels = sorted(levels)
+        self.peaks = PeakAccumulator(expected_samples, buckets)
+        self.finest = PeakAccumulator(expected_samples, self.levels[-1])
+
+    def add(self, pcm):
+        samples = pcm if isinstance(pcm, np.ndarray) else np.frombuffer(pcm, np.int16)
+        self.peaks.add(samples)
+        self.finest.add(samples)
+
+    def write(
+        self,
+        output_json: str,
+        minmax_json: Optional[str] = None,
+        pyramid_file: Optional[str] = None,
+    ):
+        self.peaks.write_json(output_json, minmax_json)
+        if pyramid_file:
+            write_pyramid(pyramid_file, self.finest, self.sample_rate, self.levels)
@@ -6,6 +6,8 @@ import yt_dlp
 from pathlib import Path
 from typing import Optional, Dict, Any
 
+from . import metrics
+
 
 def extract_video_id(url: str) -> Optional[str]:
     """Extract video ID from YouTube or Pornhub URL."""
@@ -75,6 +77,7 @@ def get_video_info(url: str, cookies_path: Optional[str] = None) -> Dict[str, An
     try:
         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
             info = ydl.extract_info(url, download=False)
+            metrics.inc("media_downloads_total", operation="info", result="ok")
             return {
                 "title": info.get("title"),
                 "description": info.get("description"),
@@ -85,6 +88,7 @@ def get_video_info(url: str, cookies_path: Optional[str] = None) -> Dict[str, An
                 "chapters": info.get("chapters", []),
             }
     except Exception as e:
+        metrics.inc("media_downloads_total", operation="info", result="error")
         print(f"Error getting video info: {e}")
         return {}
 
@@ -126,7 +130,12 @@ def download_video(
     }
 
     with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-        info = ydl.extract_info(url, download=True)
+        try:
+            info = ydl.extract_info(url, download=True)
+        except Exception:
+            metrics.inc("media_downloads_total", operation="download", result="error")
+            raise
+        metrics.inc("media_downloads_total", operation="download", result="ok")
         result["title"] = info.get("title")
         result["description"] = info.get("description")
 
@@ -157,6 +166,13 @@ def download_video(
                 if files:
                     result["video_path"] = str(files[0])
                     break
+        if result["video_path"]:
+            metrics.inc(
+                "media_bytes_total",
+                os.path.getsize(result["video_path"]),
+                direction="in",
+                kind="download",
+            )
 
         # Subtitles (JSON3)
         json3_files = list(output_dir.glob("*.json3"))
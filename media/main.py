@@ -1,13 +1,14 @@
 import os
 import uuid
+import asyncio
 import logging
 import shutil
+from contextlib import asynccontextmanager
 from pathlib import Path
 from typing import Optional
 from dotenv import load_dotenv
 from fastapi import (
     FastAPI,
-    BackgroundTasks,
     UploadFile,
     File,
     Form,
@@ -16,29 +17,68 @@ from fastapi import (
     Request,
 )
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 
 # Import core logic
 from core.db import (
-    get_supabase_client,
-    ensure_profile_exists,
-    create_source_record,
+    get_async_supabase_client,
+    async_ensure_profile_exists,
+    async_create_source_record,
+    async_update_source_status,
+    client_stats,
 )
-from core.pipeline import process_url_logic, process_file_logic
+from core.config import load_config
+from core.jobs import JobQueue, WorkerPool, JOB_DONE, JOB_FAILED
+from core.events import EventLog, EventHub, JOB_EVENT, format_sse
+from core.cache import ArtifactCache
+from core.ingest import UploadIngest, IngestError
+from core import metrics
 
 # Load environment variables
 load_dotenv()
+config = load_config()
 
 # Configure logging
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
 )
 
+event_log = EventLog(config["JOB_DB_PATH"])
+job_queue = JobQueue(config["JOB_DB_PATH"], events=event_log)
+event_hub = EventHub(event_log, config["EVENT_HISTORY"])
+metrics_store = metrics.MetricsStore(config["JOB_DB_PATH"])
+artifact_cache = (
+    ArtifactCache(config["ARTIFACT_CACHE_DB_PATH"])
+    if config["ARTIFACT_CACHE_DB_PATH"]
+    else None
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Requeue jobs interrupted by a previous shutdown before workers start
+    recovered = job_queue.recover()
+    if recovered:
+        logging.info(f"Recovered {recovered} unfinished jobs")
+    worker_pool = WorkerPool(
+        config["JOB_DB_PATH"],
+        config["JOB_WORKERS"],
+        config,
+        start_method=config["JOB_START_METHOD"],
+    )
+    worker_pool.start()
+    await event_hub.start()
+    yield
+    await event_hub.stop()
+    worker_pool.stop()
+
+
 app = FastAPI(
     title="HKS Media Server",
     description="API for processing videos via URL or file upload.",
     version="2.0.0",
+    lifespan=lifespan,
 )
 
 
@@ -71,51 +111,231 @@ async def health():
     return {"status": "healthy"}
 
 
-# --- Background Task Wrappers ---
+# --- Job Endpoints ---
+
+
+@app.get("/jobs", tags=["Jobs"])
+async def list_jobs(status: Optional[str] = None, limit: int = 100):
+    counts = await asyncio.to_thread(job_queue.counts)
+    jobs = await asyncio.to_thread(job_queue.list, status, limit)
+    return {"counts": counts, "jobs": jobs}
+
 
+@app.get("/jobs/{job_id}", tags=["Jobs"])
+async def get_job(job_id: str):
+    job = await asyncio.to_thread(job_queue.get, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
 
-def process_url_task(
-    source: str, profile_id: str, video_uuid: str, lat: float = None, lng: float = None
+
+@app.post("/jobs/{job_id}/retry", tags=["Jobs"])
+async def retry_job(job_id: str):
+    if not await asyncio.to_thread(job_queue.retry, job_id):
+        raise HTTPException(status_code=409, detail="Only failed jobs can be retried")
+    return await asyncio.to_thread(job_queue.get, job_id)
+
+
+@app.get("/jobs/{job_id}/events", tags=["Jobs"])
+async def job_events(
+    job_id: str,
+    request: Request,
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID"),
 ):
-    try:
-        process_url_logic(
-            source,
-            profile_id,
-            is_dry_run=False,
-            existing_video_uuid=video_uuid,
-            lat=lat,
-            lng=lng,
+    """
+    Server-sent events for a job: "job" (queued, running, done, failed),
+    "status" (the source's status), "stage" (pipeline stages starting and
+    finishing) and "progress" (encode, transcription and upload). The current
+    attempt's events, or those after Last-Event-ID, are replayed first; the
+    stream ends with the job.
+    """
+    job = await asyncio.to_thread(job_queue.get, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    after = int(last_event_id) if (last_event_id or "").isdigit() else 0
+
+    async def stream():
+        async for event in event_hub.subscribe(job_id, after):
+            if event is not None:
+                yield format_sse(event)
+                continue
+            if await request.is_disconnected():
+                return
+            # Jobs that finished without a final event (e.g. before events
+            # were recorded) would otherwise keep the stream open
+            job = await asyncio.to_thread(job_queue.get, job_id)
+            if job and job["status"] in (JOB_DONE, JOB_FAILED):
+                yield format_sse(
+                    {
+                        "seq": event_hub.seq,
+                        "type": JOB_EVENT,
+                        "data": {"status": job["status"], "error": job["error"]},
+                        "created_at": job["finished_at"],
+                    }
+                )
+                return
+            yield ": keep-alive\n\n"
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/clients", tags=["Jobs"])
+async def supabase_client_stats():
+    # Counters of this API process; workers log theirs after each job
+    return client_stats()
+
+
+@app.get("/metrics", tags=["Jobs"], response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """
+    Prometheus text format: totals recorded by every worker (flushed to the
+    job database after each job) and this process, plus queue gauges.
+    """
+
+    def collect():
+        metrics.track_process_stats()
+        metrics_store.flush()
+        return metrics_store.totals(), job_queue.counts()
+
+    totals, counts = await asyncio.to_thread(collect)
+    gauges = [
+        ("media_jobs", "Jobs in the queue, by status.", {"status": name}, n)
+        for name, n in counts.items()
+    ]
+    gauges.append(
+        (
+            "media_event_subscribers",
+            "Open job event streams in this API process.",
+            {},
+            event_hub.stats()["subscribers"],
         )
-    except Exception as e:
-        logging.error(f"Background task failed for {video_uuid}: {e}")
+    )
+    return PlainTextResponse(
+        metrics.render(totals, gauges),
+        media_type="text/plain; version=0.0.4; charset=utf-8",
+    )
 
 
-def process_file_task(
-    file_path: str,
-    profile_id: str,
+@app.get("/cache", tags=["Jobs"])
+async def cache_stats():
+    if not artifact_cache:
+        return {"enabled": False}
+    return {"enabled": True, **await asyncio.to_thread(artifact_cache.stats)}
+
+
+# --- API Endpoints ---
+
+
+async def _register_source(
     video_uuid: str,
-    lat: float = None,
-    lng: float = None,
+    profile_id: str,
+    title: str,
+    status: str,
+    lat: Optional[float],
+    lng: Optional[float],
+    description: str = "",
 ):
-    try:
-        process_file_logic(
-            Path(file_path),
+    """Create the sources row through the shared async client."""
+    supabase = await get_async_supabase_client()
+    if supabase:
+        await async_ensure_profile_exists(supabase, profile_id)
+        await async_create_source_record(
+            supabase,
+            video_uuid,
             profile_id,
-            is_dry_run=False,
-            existing_video_uuid=video_uuid,
+            title=title,
+            description=description,
+            status=status,
             lat=lat,
             lng=lng,
         )
-    except Exception as e:
-        logging.error(f"Background task failed for {video_uuid}: {e}")
+    return supabase
 
 
-# --- API Endpoints ---
+def _check_upload_size(size: Optional[int]):
+    """Reject a declared size over MAX_UPLOAD_BYTES before reading the body."""
+    limit = config["MAX_UPLOAD_BYTES"]
+    if limit and size and size > limit:
+        raise HTTPException(status_code=413, detail=f"Upload exceeds {limit} bytes")
+
+
+def _declared_size(content_length: Optional[str]) -> Optional[int]:
+    """Parse a Content-Length header; a malformed value is a 400, not a 500."""
+    if not content_length:
+        return None
+    try:
+        size = int(content_length)
+    except ValueError:
+        size = -1
+    if size < 0:
+        raise HTTPException(status_code=400, detail="Invalid Content-Length header")
+    return size
+
+
+async def _ingest_upload(
+    chunks,
+    supabase,
+    video_uuid: str,
+    profile_id: str,
+    filename: str,
+    lat: Optional[float],
+    lng: Optional[float],
+):
+    """
+    Write an upload to the job's temp dir through UploadIngest (disk I/O and
+    hashing off the event loop, size limit, early ffprobe) and enqueue it.
+    On failure the partial upload is removed and the source marked as error.
+    """
+    work_dir = Path(f"temp_videos/{profile_id}/{video_uuid}")
+    temp_dir = work_dir / "temp"
+    await asyncio.to_thread(temp_dir.mkdir, parents=True, exist_ok=True)
+    file_path = temp_dir / filename
+
+    ingest = UploadIngest(file_path, config["MAX_UPLOAD_BYTES"])
+    try:
+        async for chunk in chunks:
+            await ingest.write(chunk)
+        await ingest.finish()
+    except BaseException:
+        await ingest.abort()
+        await asyncio.to_thread(shutil.rmtree, work_dir, True)
+        if supabase:
+            await async_update_source_status(supabase, video_uuid, "error")
+        raise
+    metrics.inc("media_bytes_total", ingest.bytes, direction="in", kind="upload")
+
+    # Hashed while writing so identical uploads can reuse cached artifacts
+    await asyncio.to_thread(
+        job_queue.enqueue,
+        video_uuid,
+        "file",
+        {
+            "file_path": str(file_path),
+            "profile_id": profile_id,
+            "lat": lat,
+            "lng": lng,
+            "content_hash": ingest.content_hash,
+        },
+    )
+    return ingest
+
+
+def _upload_filename(name: Optional[str]) -> str:
+    # Client-supplied names must not escape the temp dir
+    return Path(name or "").name or f"upload_{uuid.uuid4()}.mp4"
+
+
+async def _file_chunks(file: UploadFile):
+    while chunk := await file.read(1024 * 1024):
+        yield chunk
 
 
 @app.post("/process/url", tags=["Processing"])
 async def process_url(
-    background_tasks: BackgroundTasks,
     url: str = Form(..., description="The video URL to process"),
     profile_id: Optional[str] = Form(None),
     x_profile_id: Optional[str] = Header(None, alias="X-Profile-ID"),
@@ -131,22 +351,20 @@ async def process_url(
     video_uuid = str(uuid.uuid4())
 
     try:
-        supabase = get_supabase_client()
-        if supabase:
-            ensure_profile_exists(supabase, effective_profile_id)
-            create_source_record(
-                supabase,
-                video_uuid,
-                effective_profile_id,
-                title="New Source",
-                description=url,
-                status="gathering meta data",
-                lat=lat,
-                lng=lng,
-            )
-
-        background_tasks.add_task(
-            process_url_task, url, effective_profile_id, video_uuid, lat, lng
+        await _register_source(
+            video_uuid,
+            effective_profile_id,
+            "New Source",
+            "gathering meta data",
+            lat,
+            lng,
+            url,
+        )
+        await asyncio.to_thread(
+            job_queue.enqueue,
+            video_uuid,
+            "url",
+            {"url": url, "profile_id": effective_profile_id, "lat": lat, "lng": lng},
         )
 
         return {
@@ -161,7 +379,6 @@ async def process_url(
 
 @app.post("/process/file", tags=["Processing"])
 async def process_file(
-    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     profile_id: Optional[str] = Form(None),
     x_profile_id: Optional[str] = Header(None, alias="X-Profile-ID"),
@@ -171,44 +388,30 @@ async def process_file(
     effective_profile_id = profile_id or x_profile_id
     if not effective_profile_id:
         raise HTTPException(status_code=400, detail="profile_id is required")
+    _check_upload_size(file.size)
 
     logging.info(
         f"Received file upload: {file.filename} for profile: {effective_profile_id}"
     )
 
     video_uuid = str(uuid.uuid4())
+    filename = _upload_filename(file.filename)
 
     try:
-        supabase = get_supabase_client()
-        if supabase:
-            ensure_profile_exists(supabase, effective_profile_id)
-            create_source_record(
-                supabase,
-                video_uuid,
-                effective_profile_id,
-                title=filename,
-                description="",
-                status="uploading",
-                lat=lat,
-                lng=lng,
-            )
-
-        # Save uploaded file to temp location
-        temp_dir = Path(f"temp_videos/{effective_profile_id}/{video_uuid}/temp")
-        temp_dir.mkdir(parents=True, exist_ok=True)
-
-        filename = file.filename or f"upload_{uuid.uuid4()}.mp4"
-        file_path = temp_dir / filename
-
-        with open(file_path, "wb") as f:
-            while chunk := await file.read(1024 * 1024):
-                f.write(chunk)
-
-        background_tasks.add_task(
-            process_file_task,
-            str(file_path),
+        supabase = await _register_source(
+            video_uuid,
             effective_profile_id,
+            filename,
+            "uploading",
+            lat,
+            lng,
+        )
+        ingest = await _ingest_upload(
+            _file_chunks(file),
+            supabase,
             video_uuid,
+            effective_profile_id,
+            filename,
             lat,
             lng,
         )
@@ -217,7 +420,12 @@ async def process_file(
             "message": "File upload successful, processing started",
             "video_id": video_uuid,
             "profile_id": effective_profile_id,
+            "bytes": ingest.bytes,
+            "sha256": ingest.content_hash,
         }
+    except IngestError as e:
+        logging.warning(f"Rejected upload {filename}: {e}")
+        raise HTTPException(status_code=e.status_code, detail=str(e))
     except Exception as e:
         logging.error(f"Error in process_file: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -226,48 +434,46 @@ async def process_file(
 @app.post("/process/stream", tags=["Processing"])
 async def process_stream(
     request: Request,
-    background_tasks: BackgroundTasks,
     x_profile_id: str = Header(..., alias="X-Profile-ID"),
     x_file_name: str = Header(..., alias="X-File-Name"),
     lat: Optional[float] = Header(None, alias="X-Lat"),
     lng: Optional[float] = Header(None, alias="X-Lng"),
 ):
     logging.info(f"Received stream upload: {x_file_name} for profile: {x_profile_id}")
+    _check_upload_size(_declared_size(request.headers.get("content-length")))
 
     video_uuid = str(uuid.uuid4())
+    filename = _upload_filename(x_file_name)
 
     try:
-        supabase = get_supabase_client()
-        if supabase:
-            ensure_profile_exists(supabase, x_profile_id)
-            create_source_record(
-                supabase,
-                video_uuid,
-                x_profile_id,
-                title=x_file_name,
-                description="",
-                status="uploading",
-                lat=lat,
-                lng=lng,
-            )
-
-        temp_dir = Path(f"temp_videos/{x_profile_id}/{video_uuid}/temp")
-        temp_dir.mkdir(parents=True, exist_ok=True)
-        file_path = temp_dir / x_file_name
-
-        with open(file_path, "wb") as f:
-            async for chunk in request.stream():
-                f.write(chunk)
-
-        background_tasks.add_task(
-            process_file_task, str(file_path), x_profile_id, video_uuid, lat, lng
+        supabase = await _register_source(
+            video_uuid,
+            x_profile_id,
+            filename,
+            "uploading",
+            lat,
+            lng,
+        )
+        ingest = await _ingest_upload(
+            request.stream(),
+            supabase,
+            video_uuid,
+            x_profile_id,
+            filename,
+            lat,
+            lng,
         )
 
         return {
             "message": "Stream upload successful, processing started",
             "video_id": video_uuid,
             "profile_id": x_profile_id,
+            "bytes": ingest.bytes,
+            "sha256": ingest.content_hash,
         }
+    except IngestError as e:
+        logging.warning(f"Rejected stream upload {filename}: {e}")
+        raise HTTPException(status_code=e.status_code, detail=str(e))
     except Exception as e:
         logging.error(f"Error in process_stream: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,70 @@
+import pytest
+
+from core.backends import LocalStorage
+from core.cache import ArtifactCache, restore_from_cache
+from core.storage import ARTIFACT_MANIFEST, copy_storage_prefix, upload_directory
+
+BUCKET = "sources"
+PREFIX = "profile/video"
+
+
+@pytest.fixture
+def storage(tmp_path):
+    return LocalStorage(tmp_path / "storage", hardlinks=False)
+
+
+@pytest.fixture
+def artifacts(tmp_path):
+    root = tmp_path / "video"
+    (root / "hls").mkdir(parents=True)
+    for i in range(3):
+        (root / "hls" / f"segment{i:03d}.ts").write_bytes(bytes([i]) * 1000)
+    (root / "hls" / "playlist.m3u8").write_text(
+        "#EXTM3U\n" + "".join(f"#EXTINF:10,\nsegment{i:03d}.ts\n" for i in range(3))
+    )
+    (root / "words.vtt").write_text("WEBVTT\n")
+    return root
+
+
+def test_copy_prefix_reports_failures(storage, artifacts, monkeypatch):
+    upload_directory(storage, BUCKET, artifacts, PREFIX)
+    copy = storage.copy
+
+    def failing_copy(bucket, src_path, dst_path):
+        if src_path.endswith("segment001.ts"):
+            raise OSError("copy failed")
+        copy(bucket, src_path, dst_path)
+
+    monkeypatch.setattr(storage, "copy", failing_copy)
+    copied, failed = copy_storage_prefix(storage, BUCKET, PREFIX, "other/video")
+
+    assert set(failed) == {
+        f"{PREFIX}/hls/segment001.ts",
+        f"{PREFIX}/{ARTIFACT_MANIFEST}",  # skipped: it lists the missing segment
+    }
+    assert len(copied) == 4
+    assert f"other/video/{ARTIFACT_MANIFEST}" not in copied
+
+
+def test_failed_cache_copy_falls_back(storage, artifacts, tmp_path, monkeypatch):
+    upload_directory(storage, BUCKET, artifacts, PREFIX)
+    cache = ArtifactCache(tmp_path / "artifacts.sqlite3")
+    cache.store("sha256:abc", PREFIX, {"duration": 30})
+
+    assert restore_from_cache(storage, cache, BUCKET, "sha256:abc", "a/b") == {
+        "duration": 30
+    }
+    assert len(storage.list(BUCKET, "a/b")) == 6
+
+    copy = storage.copy
+
+    def failing_copy(bucket, src_path, dst_path):
+        if src_path.endswith(".ts"):
+            raise OSError("copy failed")
+        copy(bucket, src_path, dst_path)
+
+    monkeypatch.setattr(storage, "copy", failing_copy)
+    assert restore_from_cache(storage, cache, BUCKET, "sha256:abc", "c/d") is None
+    assert storage.list(BUCKET, "c/d") == []
+    assert cache.lookup("sha256:abc") is None
+    assert cache.stats() == {"hits": 1, "misses": 1, "entries": 0}
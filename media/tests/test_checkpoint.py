@@ -0,0 +1,145 @@
+import os
+
+import pytest
+
+from core.checkpoint import StageManifest
+from core.graph import StageFallback, StageGraph
+
+
+@pytest.fixture
+def work_dir(tmp_path):
+    (tmp_path / "video.mp4").write_bytes(b"video")
+    return tmp_path
+
+
+def build(work_dir, calls):
+    """video -> audio -> transcript, and video -> hls."""
+
+    def audio(video):
+        calls.append("audio")
+        path = work_dir / "audio.wav"
+        path.write_bytes(b"wav:" + open(video, "rb").read())
+        return str(path)
+
+    def transcript(audio):
+        calls.append("transcript")
+        path = work_dir / "words.json"
+        path.write_bytes(b"words")
+        return str(path)
+
+    def hls(video):
+        calls.append("hls")
+        path = work_dir / "hls"
+        path.mkdir(exist_ok=True)
+        (path / "playlist.m3u8").write_text("#EXTM3U\n")
+        return str(path)
+
+    graph = StageGraph(checkpoint=StageManifest(work_dir / "stages.json"))
+    graph.add_stage("audio", audio, ["video"], ["audio"])
+    graph.add_stage("transcript", transcript, ["audio"], ["transcript"])
+    graph.add_stage("hls", hls, ["video"], ["hls"])
+    return graph
+
+
+def run(work_dir):
+    calls = []
+    graph = build(work_dir, calls)
+    graph.run({"video": str(work_dir / "video.mp4")})
+    return sorted(calls), sorted(graph.skipped)
+
+
+def touch(path, delta_ns=1_000_000_000):
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + delta_ns))
+
+
+def test_rerun_skips_everything(work_dir):
+    assert run(work_dir) == (["audio", "hls", "transcript"], [])
+    assert run(work_dir) == ([], ["audio", "hls", "transcript"])
+
+
+def test_changed_source_invalidates_all(work_dir):
+    run(work_dir)
+    (work_dir / "video.mp4").write_bytes(b"another video")
+    assert run(work_dir) == (["audio", "hls", "transcript"], [])
+
+
+def test_touched_source_invalidates_all(work_dir):
+    run(work_dir)
+    touch(work_dir / "video.mp4")
+    assert run(work_dir)[0] == ["audio", "hls", "transcript"]
+
+
+def test_damaged_output_reruns_only_its_stage(work_dir):
+    run(work_dir)
+    (work_dir / "words.json").write_bytes(b"truncated")
+    assert run(work_dir) == (["transcript"], ["audio", "hls"])
+
+
+def test_changed_directory_output_reruns_its_stage(work_dir):
+    run(work_dir)
+    (work_dir / "hls" / "segment000.ts").write_bytes(b"stray")
+    assert run(work_dir) == (["hls"], ["audio", "transcript"])
+
+
+def test_regenerated_scratch_input_keeps_downstream(work_dir):
+    # audio.wav is rebuilt with a new mtime; the transcript is keyed on the
+    # audio stage's key, not on the file, so it stays valid
+    run(work_dir)
+    (work_dir / "audio.wav").unlink()
+    assert run(work_dir) == (["audio"], ["hls", "transcript"])
+
+
+def test_manifest_survives_reload(work_dir):
+    run(work_dir)
+    manifest = StageManifest(work_dir / "stages.json")
+    assert set(manifest.entries) == {"audio", "hls", "transcript"}
+    assert manifest.entries["hls"]["outputs"] == {"hls": str(work_dir / "hls")}
+
+
+def test_unreadable_manifest_is_ignored(work_dir):
+    (work_dir / "stages.json").write_text("{not json")
+    assert StageManifest(work_dir / "stages.json").entries == {}
+    assert run(work_dir)[0] == ["audio", "hls", "transcript"]
+
+
+def test_stage_key_depends_on_upstream_keys(work_dir):
+    manifest = StageManifest(work_dir / "stages.json")
+    inputs = {"audio": str(work_dir / "missing.wav")}
+
+    first = manifest.stage_key("transcript", inputs, {"audio": "a"})
+    assert manifest.stage_key("transcript", inputs, {"audio": "a"}) == first
+    assert manifest.stage_key("transcript", inputs, {"audio": "b"}) != first
+    assert manifest.stage_key("vtt", inputs, {"audio": "a"}) != first
+
+
+def test_fallback_is_not_checkpointed(work_dir):
+    calls, seen = [], []
+
+    def transcribe(video):
+        calls.append("transcribe")
+        if len(calls) == 1:
+            raise StageFallback([], "vosk failed")
+        return ["hello"]
+
+    def vtt(words):
+        calls.append("vtt")
+        seen.append(words)
+        path = work_dir / "words.vtt"
+        path.write_text(f"WEBVTT {words}")
+        return str(path)
+
+    def run_graph():
+        graph = StageGraph(checkpoint=StageManifest(work_dir / "stages.json"))
+        graph.add_stage("transcribe", transcribe, ["video"], ["words"])
+        graph.add_stage("vtt", vtt, ["words"], ["vtt"])
+        graph.run({"video": str(work_dir / "video.mp4")})
+        return graph
+
+    run_graph()
+    assert "transcribe" not in StageManifest(work_dir / "stages.json").entries
+    # The retry transcribes again and rebuilds the subtitles from real words
+    run_graph()
+    assert calls == ["transcribe", "vtt", "transcribe", "vtt"]
+    assert seen == [[], ["hello"]]
+    assert run_graph().skipped == ["transcribe", "vtt"]
@@ -0,0 +1,87 @@
+from core.backends import LocalStorage
+from core.hls import rebase_playlist
+from core.storage import upload_directory
+
+BASE = "https://cdn.example.com/p/v/hls"
+
+MEDIA = """#EXTM3U
+#EXT-X-VERSION:3
+#EXT-X-TARGETDURATION:10
+#EXTINF:10.0,
+segment000.ts
+#EXTINF:4.2,
+segment001.ts
+#EXT-X-ENDLIST"""
+
+MASTER = """#EXTM3U
+#EXT-X-MEDIA:TYPE=AUDIO,GROUP-ID="aud",NAME="audio",URI="audio/playlist.m3u8"
+#EXT-X-STREAM-INF:BANDWIDTH=800000,RESOLUTION=640x360,AUDIO="aud"
+360p/playlist.m3u8
+#EXT-X-STREAM-INF:BANDWIDTH=2800000,RESOLUTION=1280x720,AUDIO="aud"
+720p/playlist.m3u8"""
+
+
+def test_media_playlist():
+    rebased = rebase_playlist(MEDIA, "", BASE + "/")
+
+    assert rebased.splitlines() == [
+        "#EXTM3U",
+        "#EXT-X-VERSION:3",
+        "#EXT-X-TARGETDURATION:10",
+        "#EXTINF:10.0,",
+        f"{BASE}/segment000.ts",
+        "#EXTINF:4.2,",
+        f"{BASE}/segment001.ts",
+        "#EXT-X-ENDLIST",
+    ]
+
+
+def test_variant_playlist_in_subdir():
+    rebased = rebase_playlist(MEDIA, "720p", BASE)
+    assert f"{BASE}/720p/segment000.ts" in rebased.splitlines()
+
+
+def test_master_playlist_and_uri_attributes():
+    lines = rebase_playlist(MASTER, "", BASE).splitlines()
+
+    assert f'URI="{BASE}/audio/playlist.m3u8"' in lines[1]
+    assert lines[3] == f"{BASE}/360p/playlist.m3u8"
+    assert lines[5] == f"{BASE}/720p/playlist.m3u8"
+    assert lines[2] == MASTER.splitlines()[2]
+
+
+def test_parent_references_are_normalized():
+    rebased = rebase_playlist("#EXTM3U\n../360p/segment000.ts", "720p", BASE)
+    assert rebased.splitlines()[1] == f"{BASE}/360p/segment000.ts"
+
+
+def test_absolute_urls_move_to_the_new_base():
+    # e.g. a playlist copied from another source's prefix by the artifact cache
+    old = rebase_playlist(MASTER, "", "https://old.example.com/a/b/hls")
+    assert rebase_playlist(old, "", BASE) == rebase_playlist(MASTER, "", BASE)
+
+    old_media = rebase_playlist(MEDIA, "720p", "https://old.example.com/a/b/hls")
+    assert rebase_playlist(old_media, "720p", BASE) == rebase_playlist(
+        MEDIA, "720p", BASE
+    )
+
+
+def test_rebase_is_idempotent():
+    once = rebase_playlist(MASTER, "", BASE)
+    assert rebase_playlist(once, "", BASE) == once
+
+
+def test_playlists_rebased_on_upload(tmp_path):
+    hls_dir = tmp_path / "video" / "hls"
+    hls_dir.mkdir(parents=True)
+    (hls_dir / "segment000.ts").write_bytes(b"ts")
+    (hls_dir / "playlist.m3u8").write_text(MEDIA)
+    storage = LocalStorage(tmp_path / "storage", hardlinks=False)
+
+    upload_directory(
+        storage, "sources", tmp_path / "video", "p/v", playlist_base_url=BASE
+    )
+    playlist = storage.get("sources", "p/v/hls/playlist.m3u8").decode()
+    assert playlist == rebase_playlist(MEDIA, "", BASE)
+    # The local file keeps its relative references
+    assert (hls_dir / "playlist.m3u8").read_text() == MEDIA
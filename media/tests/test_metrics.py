@@ -0,0 +1,119 @@
+import pytest
+
+from core import metrics
+
+
+@pytest.fixture(autouse=True)
+def clean():
+    metrics.take()
+    metrics._tracked.clear()
+    yield
+    metrics.take()
+    metrics._tracked.clear()
+
+
+def parse(text: str):
+    """{series line without value: value}, plus the # lines in order."""
+    samples, comments = {}, []
+    for line in text.splitlines():
+        if line.startswith("#"):
+            comments.append(line)
+        else:
+            series, _, value = line.rpartition(" ")
+            samples[series] = float(value)
+    return samples, comments
+
+
+def test_counter_with_labels():
+    text = metrics.render(
+        {
+            ("media_jobs_total", (("result", "ok"), ("source", "url"))): 3.0,
+            ("media_jobs_total", (("result", "failed"), ("source", "url"))): 1.0,
+        }
+    )
+    assert text == (
+        "# HELP media_jobs_total Ingest jobs finished, by source type and result.\n"
+        "# TYPE media_jobs_total counter\n"
+        'media_jobs_total{result="failed",source="url"} 1\n'
+        'media_jobs_total{result="ok",source="url"} 3\n'
+    )
+
+
+def test_histogram_buckets_are_cumulative_and_ordered():
+    for value in (0.05, 0.7, 3.0, 9999.0):
+        metrics.observe("media_first_playable_seconds", value, source="file")
+    text = metrics.render(metrics.take())
+    samples, comments = parse(text)
+
+    assert comments == [
+        "# HELP media_first_playable_seconds "
+        "Time from ingest start to the first published HLS segment.",
+        "# TYPE media_first_playable_seconds histogram",
+    ]
+    bucket = 'media_first_playable_seconds_bucket{{source="file",le="{}"}}'
+    assert samples[bucket.format("0.1")] == 1
+    assert samples[bucket.format("0.5")] == 1
+    assert samples[bucket.format("1")] == 2
+    assert samples[bucket.format("5")] == 3
+    assert samples[bucket.format("7200")] == 3
+    assert samples[bucket.format("+Inf")] == 4
+    assert samples['media_first_playable_seconds_count{source="file"}'] == 4
+    assert samples['media_first_playable_seconds_sum{source="file"}'] == 10002.75
+
+    # Every bound is exported, in increasing order, then _count and _sum
+    lines = [l for l in text.splitlines() if not l.startswith("#")]
+    les = [l.split('le="')[1].split('"')[0] for l in lines if "_bucket" in l]
+    assert les == [metrics._format(b) for b in metrics.SECONDS_BUCKETS] + ["+Inf"]
+    assert lines[-2].startswith("media_first_playable_seconds_count")
+    assert lines[-1].startswith("media_first_playable_seconds_sum")
+
+
+def test_nan_is_not_observed():
+    metrics.observe("media_first_playable_seconds", float("nan"))
+    assert metrics.take() == {}
+
+
+def test_gauges_and_escaping():
+    text = metrics.render(
+        {},
+        [
+            ("media_jobs", "Jobs in the queue, by status.", {"status": "queued"}, 2),
+            ("media_jobs", "Jobs in the queue, by status.", {"status": "failed"}, 0),
+            ("media_event_subscribers", "Open streams.", {"path": 'a"b\\c\n'}, 1),
+        ],
+    )
+    assert text.splitlines() == [
+        "# HELP media_jobs Jobs in the queue, by status.",
+        "# TYPE media_jobs gauge",
+        'media_jobs{status="queued"} 2',
+        'media_jobs{status="failed"} 0',
+        "# HELP media_event_subscribers Open streams.",
+        "# TYPE media_event_subscribers gauge",
+        'media_event_subscribers{path="a\\"b\\\\c\\n"} 1',
+    ]
+
+
+def test_unknown_series_is_untyped():
+    text = metrics.render({("something_else", ()): 0.25})
+    assert text == "# TYPE something_else untyped\nsomething_else 0.25\n"
+
+
+def test_track_adds_growth_only():
+    metrics.track("media_vosk_model_loads_total", 2)
+    metrics.track("media_vosk_model_loads_total", 2)
+    metrics.track("media_vosk_model_loads_total", 5)
+    assert metrics.take() == {("media_vosk_model_loads_total", ()): 5.0}
+
+
+def test_store_sums_flushes(tmp_path):
+    store = metrics.MetricsStore(tmp_path / "jobs.sqlite3")
+    metrics.inc("media_bytes_total", 100, direction="in", kind="upload")
+    store.flush()
+    metrics.inc("media_bytes_total", 50, direction="in", kind="upload")
+    metrics.inc("media_bytes_total", 7, direction="out", kind="hls")
+    store.flush()
+
+    assert metrics.MetricsStore(tmp_path / "jobs.sqlite3").totals() == {
+        ("media_bytes_total", (("direction", "in"), ("kind", "upload"))): 150.0,
+        ("media_bytes_total", (("direction", "out"), ("kind", "hls"))): 7.0,
+    }
@@ -0,0 +1,59 @@
+import pytest
+
+from core import processing
+from core.processing import plan_chunks
+
+
+@pytest.fixture
+def keyframes(monkeypatch):
+    """Serve keyframe_times from a fixed list of absolute timestamps."""
+    requests = []
+
+    def use(times):
+        def keyframe_times(video_file, around, window=20.0):
+            requests.append(around)
+            return [t for t in times if any(abs(t - a) <= window for a in around)]
+
+        monkeypatch.setattr(processing, "keyframe_times", keyframe_times)
+        return requests
+
+    return use
+
+
+def test_splits_at_nearest_keyframes(keyframes):
+    keyframes([t * 2.0 for t in range(31)])
+    assert plan_chunks("v.mp4", 60.0, 3) == [(0.0, 20.0), (20.0, 40.0), (40.0, None)]
+
+
+def test_nonzero_start_time_is_relative(keyframes):
+    requests = keyframes([5.0 + t * 2.0 for t in range(31)])
+    ranges = plan_chunks("v.mp4", 60.0, 3, start_time=5.0)
+
+    assert requests == [[25.0, 45.0]]
+    assert ranges == [(0.0, 20.0), (20.0, 40.0), (40.0, None)]
+
+
+def test_uneven_keyframes(keyframes):
+    keyframes([0.0, 8.0, 19.0, 23.0, 41.5, 50.0])
+    assert plan_chunks("v.mp4", 60.0, 3) == [(0.0, 19.0), (19.0, 41.5), (41.5, None)]
+
+
+def test_sparse_keyframes_merge_chunks(keyframes):
+    # Every split point is nearest to the same keyframe, or to the first one
+    keyframes([0.0, 30.0])
+    assert plan_chunks("v.mp4", 60.0, 4) == [(0.0, 30.0), (30.0, None)]
+
+
+def test_no_keyframes_is_one_chunk(keyframes):
+    keyframes([])
+    assert plan_chunks("v.mp4", 60.0, 4) == [(0.0, None)]
+
+
+def test_ranges_cover_the_source(keyframes):
+    keyframes([t * 2.5 for t in range(1000)])
+    ranges = plan_chunks("v.mp4", 2400.0, 8)
+
+    assert len(ranges) == 8
+    assert ranges[0][0] == 0.0 and ranges[-1][1] is None
+    for (_, end), (start, _) in zip(ranges, ranges[1:]):
+        assert end == start
@@ -0,0 +1,121 @@
+import json
+import os
+
+import pytest
+
+from core.resumable import (
+    UPLOADS_NAME,
+    LocalTusServer,
+    ResumableUploader,
+    ResumableUploadError,
+    UploadState,
+)
+
+CHUNK = 16 * 1024
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / "video.mp4"
+    path.write_bytes(os.urandom(10 * CHUNK + 123))
+    return path
+
+
+@pytest.fixture
+def server(tmp_path):
+    with LocalTusServer(tmp_path / "storage") as server:
+        yield server
+
+
+def uploader(server, state_path=None, retries=3):
+    return ResumableUploader(
+        server.endpoint,
+        state_path=state_path,
+        chunk_size=CHUNK,
+        retries=retries,
+        backoff=0,
+    )
+
+
+def stored(server):
+    return (server.root / "sources" / "p/v/video.mp4").read_bytes()
+
+
+def test_upload_completes(server, source):
+    reported = []
+    sent = uploader(server).upload(
+        source, "sources", "p/v/video.mp4", "video/mp4", on_bytes=reported.append
+    )
+
+    assert stored(server) == source.read_bytes()
+    assert sent == sum(reported) == source.stat().st_size
+    assert server.patches == 11
+
+
+def test_dropped_patch_continues_from_server_offset(server, source):
+    server.fail_every = 3
+    sent = uploader(server).upload(source, "sources", "p/v/video.mp4", "video/mp4")
+
+    assert stored(server) == source.read_bytes()
+    # Failed PATCHes kept half a chunk; only the rest was sent again
+    assert sent < source.stat().st_size
+    assert server.patches > 11
+    assert len(server.uploads) == 1
+
+
+def test_new_uploader_resumes_from_state(server, source, tmp_path):
+    state_path = tmp_path / UPLOADS_NAME
+    server.fail_every = 4
+    with pytest.raises(ResumableUploadError):
+        uploader(server, state_path, retries=0).upload(
+            source, "sources", "p/v/video.mp4", "video/mp4"
+        )
+    entry = json.loads(state_path.read_text())["sources/p/v/video.mp4"]
+    (upload,) = server.uploads.values()
+    offset = upload["offset"]
+    assert 0 < offset < source.stat().st_size
+
+    server.fail_every = 0
+    sent = uploader(server, state_path).upload(
+        source, "sources", "p/v/video.mp4", "video/mp4"
+    )
+
+    assert stored(server) == source.read_bytes()
+    assert sent == source.stat().st_size - offset
+    assert entry["url"].endswith(next(iter(server.uploads)))
+    assert len(server.uploads) == 1
+    assert json.loads(state_path.read_text()) == {}
+
+
+def test_expired_upload_restarts_from_zero(server, source, tmp_path):
+    state_path = tmp_path / UPLOADS_NAME
+    server.fail_every = 4
+    with pytest.raises(ResumableUploadError):
+        uploader(server, state_path, retries=0).upload(
+            source, "sources", "p/v/video.mp4", "video/mp4"
+        )
+    # The server forgot the upload: HEAD on the saved URL answers 404
+    server.uploads.clear()
+    server.fail_every = 0
+
+    sent = uploader(server, state_path).upload(
+        source, "sources", "p/v/video.mp4", "video/mp4"
+    )
+
+    assert sent == source.stat().st_size
+    assert stored(server) == source.read_bytes()
+
+
+def test_changed_file_does_not_resume(tmp_path, source):
+    state = UploadState(tmp_path / UPLOADS_NAME)
+    state.set("sources/p/v/video.mp4", "http://tus/1", source.stat())
+    reloaded = UploadState(tmp_path / UPLOADS_NAME)
+    assert reloaded.get("sources/p/v/video.mp4", source.stat()) == "http://tus/1"
+
+    source.write_bytes(b"re-encoded")
+    assert state.get("sources/p/v/video.mp4", source.stat()) is None
+
+
+def test_unreadable_state_is_ignored(tmp_path):
+    (tmp_path / UPLOADS_NAME).write_text("{not json")
+    assert UploadState(tmp_path / UPLOADS_NAME).entries == {}
@@ -0,0 +1,103 @@
+import pytest
+
+from core import status
+from core.status import StatusEmitter
+
+
+class Table:
+    """Records update payloads; rejects them while `missing` columns are in."""
+
+    def __init__(self, missing=()):
+        self.missing = set(missing)
+        self.writes = []
+
+    def table(self, name):
+        return self
+
+    def update(self, data):
+        self.data = data
+        return self
+
+    def eq(self, column, value):
+        return self
+
+    def execute(self):
+        self.writes.append(dict(self.data))
+        for column in self.missing & set(self.data):
+            raise Exception(
+                f"{{'code': 'PGRST204', 'message': \"Could not find the "
+                f"'{column}' column of 'sources' in the schema cache\"}}"
+            )
+
+
+@pytest.fixture(autouse=True)
+def progress_column():
+    status._progress_column = True
+    yield
+    status._progress_column = True
+
+
+def emitter(client):
+    return StatusEmitter(client, "video", interval=3600, progress_interval=3600)
+
+
+def test_writes_merge_into_one():
+    client = Table()
+    status_emitter = emitter(client)
+    status_emitter.update("processing")
+    status_emitter.progress("hls", 0.25)
+    status_emitter.progress("transcribe", 0.75)
+    status_emitter.update("processing", {"duration": 12.0})
+    status_emitter.flush()
+    status_emitter.close()
+
+    assert client.writes == [
+        {"status": "processing", "progress": 50.0, "duration": 12.0}
+    ]
+
+
+def test_completed_is_written_at_100():
+    client = Table()
+    status_emitter = emitter(client)
+    status_emitter.update("processing")
+    status_emitter.progress("hls", 0.5)
+    status_emitter.update("completed")
+    status_emitter.flush()
+    status_emitter.close()
+
+    assert client.writes[-1] == {"status": "completed", "progress": 100.0}
+
+
+def test_missing_progress_column_falls_back():
+    client = Table(missing={"progress"})
+    status_emitter = emitter(client)
+    status_emitter.update("processing")
+    status_emitter.progress("hls", 0.5)
+    status_emitter.flush()
+    status_emitter.progress("hls", 0.9)
+    status_emitter.update("completed", {"duration": 3.0})
+    status_emitter.flush()
+    status_emitter.close()
+
+    assert client.writes == [
+        {"status": "processing", "progress": 50.0},
+        {"status": "processing"},
+        {"status": "completed", "duration": 3.0},
+    ]
+
+
+def test_other_errors_are_raised_and_kept():
+    client = Table(missing={"duration"})
+    status_emitter = emitter(client)
+    status_emitter.update("completed", {"duration": 3.0})
+    with pytest.raises(Exception, match="duration"):
+        status_emitter.flush()
+
+    client.missing.clear()
+    status_emitter.flush()
+    status_emitter.close()
+    assert client.writes[-1] == {
+        "status": "completed",
+        "progress": 100.0,
+        "duration": 3.0,
+    }
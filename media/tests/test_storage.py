@@ -0,0 +1,159 @@
+import json
+
+import pytest
+
+from core import storage as storage_module
+from core.backends import LocalStorage
+from core.storage import (
+    ARTIFACT_MANIFEST,
+    build_manifest,
+    fetch_manifest,
+    file_sha256,
+    upload_directory,
+)
+
+BUCKET = "sources"
+PREFIX = "profile/video"
+
+
+@pytest.fixture
+def storage(tmp_path):
+    return LocalStorage(tmp_path / "storage", hardlinks=False)
+
+
+@pytest.fixture
+def artifacts(tmp_path):
+    root = tmp_path / "video"
+    (root / "hls").mkdir(parents=True)
+    for i in range(3):
+        (root / "hls" / f"segment{i:03d}.ts").write_bytes(bytes([i]) * 1000)
+    (root / "hls" / "playlist.m3u8").write_text(
+        "#EXTM3U\n" + "".join(f"#EXTINF:10,\nsegment{i:03d}.ts\n" for i in range(3))
+    )
+    (root / "words.vtt").write_text("WEBVTT\n")
+    return root
+
+
+@pytest.fixture
+def hashed(monkeypatch):
+    """Sources passed to file_sha256, in call order."""
+    calls = []
+
+    def record(source):
+        calls.append(source)
+        return file_sha256(source)
+
+    monkeypatch.setattr(storage_module, "file_sha256", record)
+    return calls
+
+
+def stored(storage):
+    return sorted(storage.list(BUCKET, PREFIX))
+
+
+def test_build_manifest(artifacts):
+    manifest = build_manifest(
+        {"words.vtt": artifacts / "words.vtt", "extra.json": b"{}"}
+    )
+    assert manifest["files"]["words.vtt"]["size"] == len("WEBVTT\n")
+    assert manifest["files"]["extra.json"] == {
+        "size": 2,
+        "sha256": "44136fa355b3678a1146ad16f7e8649e94fb4fc21fe77e8310c060f61caaff8a",
+    }
+
+
+def test_first_upload_sends_everything(storage, artifacts):
+    result = upload_directory(storage, BUCKET, artifacts, PREFIX, workers=2)
+
+    assert result.ok and result.unchanged == 0
+    assert len(result.uploaded) == 5
+    # Playlists go last
+    assert result.uploaded[-1] == f"{PREFIX}/hls/playlist.m3u8"
+    assert f"{PREFIX}/{ARTIFACT_MANIFEST}" in stored(storage)
+    remote = fetch_manifest(storage, BUCKET, PREFIX)["files"]
+    assert sorted(remote) == [
+        "hls/playlist.m3u8",
+        "hls/segment000.ts",
+        "hls/segment001.ts",
+        "hls/segment002.ts",
+        "words.vtt",
+    ]
+
+
+def test_reupload_sends_only_changes(storage, artifacts):
+    upload_directory(storage, BUCKET, artifacts, PREFIX)
+    (artifacts / "words.vtt").write_text("WEBVTT\n\n00:00.000 --> 00:01.000\nhi\n")
+
+    result = upload_directory(storage, BUCKET, artifacts, PREFIX)
+
+    assert result.uploaded == [f"{PREFIX}/words.vtt"]
+    assert result.unchanged == 4
+    assert result.deleted == []
+    assert storage.get(BUCKET, f"{PREFIX}/words.vtt").endswith(b"hi\n")
+
+
+def test_unchanged_reupload_sends_nothing(storage, artifacts):
+    upload_directory(storage, BUCKET, artifacts, PREFIX)
+    result = upload_directory(storage, BUCKET, artifacts, PREFIX)
+
+    assert result.uploaded == [] and result.unchanged == 5
+
+
+def test_removed_files_are_deleted(storage, artifacts):
+    upload_directory(storage, BUCKET, artifacts, PREFIX)
+    (artifacts / "hls" / "segment002.ts").unlink()
+
+    result = upload_directory(storage, BUCKET, artifacts, PREFIX)
+
+    assert result.deleted == [f"{PREFIX}/hls/segment002.ts"]
+    assert f"{PREFIX}/hls/segment002.ts" not in stored(storage)
+    manifest = json.loads(storage.get(BUCKET, f"{PREFIX}/{ARTIFACT_MANIFEST}"))
+    assert "hls/segment002.ts" not in manifest["files"]
+
+
+def test_build_manifest_reuses_known_digests(artifacts, hashed):
+    vtt = artifacts / "words.vtt"
+    manifest = build_manifest({"words.vtt": vtt}, known={"words.vtt": "abc"})
+    assert manifest["files"]["words.vtt"] == {
+        "size": vtt.stat().st_size,
+        "sha256": "abc",
+    }
+    assert hashed == []
+
+
+def test_each_file_is_hashed_once(storage, artifacts, hashed):
+    upload_directory(storage, BUCKET, artifacts, PREFIX)
+    assert len(hashed) == 5
+    hashed.clear()
+    (artifacts / "words.vtt").write_text("WEBVTT\n\n00:00.000 --> 00:01.000\nhi\n")
+
+    result = upload_directory(storage, BUCKET, artifacts, PREFIX)
+
+    assert result.uploaded == [f"{PREFIX}/words.vtt"]
+    # The size changed, so words.vtt is hashed only for the new manifest, last
+    assert len(hashed) == 5 and hashed[-1] == artifacts / "words.vtt"
+
+
+def test_failed_upload_hashes_only_size_matches(storage, artifacts, hashed):
+    def broken(*args, **kwargs):
+        raise OSError("offline")
+
+    storage.put = broken
+    result = upload_directory(storage, BUCKET, artifacts, PREFIX, retries=1)
+
+    assert not result.ok
+    assert hashed == []
+
+
+def test_known_hashes_are_not_recomputed(storage, artifacts, hashed):
+    vtt = artifacts / "words.vtt"
+    known = {"words.vtt": file_sha256(vtt)}
+    upload_directory(storage, BUCKET, artifacts, PREFIX, known_hashes=known)
+    hashed.clear()
+
+    result = upload_directory(storage, BUCKET, artifacts, PREFIX, known_hashes=known)
+
+    assert result.unchanged == 5
+    assert vtt not in hashed and len(hashed) == 4
+    remote = fetch_manifest(storage, BUCKET, PREFIX)["files"]
+    assert remote["words.vtt"]["sha256"] == known["words.vtt"]
@@ -0,0 +1,118 @@
+import numpy as np
+import pytest
+
+from core.waveform import PeakAccumulator, _quantize, pyramid_levels
+
+
+def naive_minmax(samples: np.ndarray, expected: int, buckets: int):
+    """Per-bucket min/max with a loop; samples past `expected` go to the last."""
+    mins, maxs = [], []
+    for i in range(buckets):
+        start = i * expected // buckets
+        end = len(samples) if i == buckets - 1 else (i + 1) * expected // buckets
+        chunk = samples[start:end]
+        mins.append(int(chunk.min()) if len(chunk) else 0)
+        maxs.append(int(chunk.max()) if len(chunk) else 0)
+    return np.array(mins), np.array(maxs)
+
+
+def accumulate(samples: np.ndarray, expected: int, buckets: int, chunks):
+    peaks = PeakAccumulator(expected, buckets)
+    position = 0
+    for size in chunks:
+        peaks.add(samples[position : position + size])
+        position += size
+    peaks.add(samples[position:])
+    return peaks
+
+
+def chunk_sizes(total: int, size: int):
+    return [size] * (total // size)
+
+
+@pytest.mark.parametrize(
+    "samples,buckets,chunk",
+    [
+        (100_000, 1000, 4096),
+        (99_991, 997, 333),
+        (5_003, 97, 1),
+        (12_345, 100, 12_345),
+        (50, 200, 7),  # fewer samples than buckets
+    ],
+)
+def test_matches_naive_minmax(samples, buckets, chunk):
+    rng = np.random.default_rng(samples)
+    pcm = rng.integers(-32768, 32768, samples, dtype=np.int16)
+    peaks = accumulate(pcm, samples, buckets, chunk_sizes(samples, chunk))
+
+    mins, maxs = naive_minmax(pcm, samples, buckets)
+    assert peaks.minmax() == {
+        "min": np.round(mins / 32768.0, 4).tolist(),
+        "max": np.round(maxs / 32768.0, 4).tolist(),
+    }
+    expected_peaks = np.maximum(np.abs(mins), np.abs(maxs)) / 32768.0
+    assert peaks.result() == np.round(expected_peaks, 4).tolist()
+
+
+def test_random_chunk_boundaries():
+    rng = np.random.default_rng(7)
+    pcm = rng.integers(-32768, 32768, 48_000, dtype=np.int16)
+    sizes = rng.integers(1, 3000, 40).tolist()
+    peaks = accumulate(pcm, len(pcm), 256, sizes)
+
+    mins, maxs = naive_minmax(pcm, len(pcm), 256)
+    assert peaks.filled.all()
+    assert (peaks.mins == mins).all()
+    assert (peaks.maxs == maxs).all()
+
+
+def test_bytes_input():
+    pcm = np.arange(-500, 500, dtype=np.int16)
+    peaks = PeakAccumulator(len(pcm), 10)
+    peaks.add(pcm[:321].tobytes())
+    peaks.add(pcm[321:].tobytes())
+
+    mins, maxs = naive_minmax(pcm, len(pcm), 10)
+    assert (peaks.mins == mins).all()
+    assert (peaks.maxs == maxs).all()
+
+
+def test_samples_past_estimate_fold_into_last_bucket():
+    rng = np.random.default_rng(3)
+    pcm = rng.integers(-32768, 32768, 1200, dtype=np.int16)
+    peaks = accumulate(pcm, 1000, 10, chunk_sizes(1200, 128))
+
+    mins, maxs = naive_minmax(pcm, 1000, 10)
+    assert (peaks.mins == mins).all()
+    assert (peaks.maxs == maxs).all()
+
+
+def test_short_audio_leaves_tail_buckets_empty():
+    pcm = np.full(500, 16384, dtype=np.int16)
+    peaks = accumulate(pcm, 1000, 10, [])
+
+    assert peaks.result() == [0.5] * 5 + [0.0] * 5
+    assert peaks.minmax()["min"] == [0.5] * 5 + [0.0] * 5
+
+
+def test_empty():
+    peaks = PeakAccumulator(1000, 10)
+    assert peaks.result() == []
+    assert peaks.minmax() == {"min": [], "max": []}
+
+
+def test_pyramid_levels_match_naive_minmax():
+    rng = np.random.default_rng(11)
+    pcm = rng.integers(-32768, 32768, 77_777, dtype=np.int16)
+    peaks = accumulate(pcm, len(pcm), 1024, chunk_sizes(len(pcm), 1000))
+
+    for buckets, pairs in pyramid_levels(peaks, (16, 256, 1024)):
+        mins, maxs = naive_minmax(pcm, len(pcm), buckets)
+        assert (pairs[0::2] == _quantize(mins)).all()
+        assert (pairs[1::2] == _quantize(maxs)).all()
+
+
+def test_pyramid_level_must_divide_buckets():
+    peaks = PeakAccumulator(1000, 1000)
+    with pytest.raises(ValueError):
+        pyramid_levels(peaks, (300,))